@@ -3,6 +3,7 @@ from .models import User, Profile
 import re
 from django.contrib.auth.password_validation import validate_password
 from interest.models import SubCategory
+from api.serializers import ImageVariantsField, ThumbnailURLField
 
 class UserSerializer(serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField(read_only=True)
@@ -78,6 +79,8 @@ class ProfileSerializer(serializers.ModelSerializer):
     can_edit = serializers.SerializerMethodField()
     posts_count = serializers.SerializerMethodField()
     interests = serializers.SerializerMethodField()  # Add this
+    avatar_variants = ImageVariantsField(source='avatar')
+    cover_photo_variants = ImageVariantsField(source='cover_photo')
     subcategories = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=SubCategory.objects.all(),
@@ -89,7 +92,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'user_id', 'username', 'email',
             'display_name', 'about', 'social_link', 'avatar', 
-            'cover_photo', 'subcategories', 'interests',  # Added interests
+            'cover_photo', 'avatar_variants', 'cover_photo_variants', 'subcategories', 'interests',  # Added interests
             'created_at', 'updated_at', 'can_edit', 'posts_count'
         ]
         read_only_fields = ['user', 'created_at', 'updated_at']
@@ -102,12 +105,15 @@ class ProfileSerializer(serializers.ModelSerializer):
 
     def get_posts_count(self, obj):
         """Get count of approved posts by this user"""
+        if hasattr(obj, 'approved_posts_count'):
+            return obj.approved_posts_count
         return obj.user.posts.filter(status='approved').count()
     
     def get_interests(self, obj):
         """Group interests by category for better display"""
         interests_by_category = {}
-        subcategories = obj.subcategories.select_related('category').all()
+        # Reuses the prefetched subcategories__category when the view loaded them
+        subcategories = obj.subcategories.all()
         
         for sub in subcategories:
             category_name = sub.category.name
@@ -126,6 +132,12 @@ class ProfileSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Social link must be a valid URL starting with http:// or https://")
         return value
 
+class ProfileListSerializer(ProfileSerializer):
+    """ProfileSerializer for list views: images as thumbnail URLs, not originals"""
+    avatar = ThumbnailURLField()
+    cover_photo = ThumbnailURLField()
+
+
 class ProfileUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating profile - includes interests"""
     subcategories = serializers.PrimaryKeyRelatedField(
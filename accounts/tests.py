@@ -1,3 +1,124 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from accounts.models import Profile
+from api.query_budget import QueryBudgetTestCase, budgeted_routes, route_budget, route_names
+from interest.models import Category, SubCategory
+from post.models import Post
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AccountsRouteBudgetTests(QueryBudgetTestCase):
+    """Query budgets for every route in accounts/urls.py, at N=1 and N=50 objects"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='pass12345', email_verified=True
+        )
+
+    def make_profiles(self, n):
+        """n users with a profile, an interest and an approved post each"""
+        category = Category.objects.create(name='Music')
+        subcategory = SubCategory.objects.create(category=category, name='Jazz')
+        users = User.objects.bulk_create([
+            User(username=f'member{i}', email=f'member{i}@example.com') for i in range(n)
+        ])
+        profiles = Profile.objects.bulk_create([Profile(user=user, display_name=f'Member {i}') for i, user in enumerate(users)])
+        Profile.subcategories.through.objects.bulk_create([
+            Profile.subcategories.through(profile_id=profile.id, subcategory_id=subcategory.id) for profile in profiles
+        ])
+        Post.objects.bulk_create([Post(user=user, title='Hi', post_type='text', content='Hi') for user in users])
+        self.user.profile.subcategories.add(subcategory)
+        return profiles
+
+    def get(self, route, *args, **params):
+        url = reverse(route, args=args)
+        return lambda: self.client.get(url, params)
+
+    def post(self, route, **data):
+        url = reverse(route)
+        return lambda: self.client.post(url, data, format='json')
+
+    # Profiles
+
+    @route_budget('profiles-list', 4)
+    def test_profiles_list(self, n):
+        self.make_profiles(n)
+        return self.get('profiles-list')
+
+    @route_budget('profiles-detail', 3)
+    def test_profiles_detail(self, n):
+        profile = self.make_profiles(n)[0]
+        return self.get('profiles-detail', profile.pk)
+
+    @route_budget('profiles-me', 3)
+    def test_profiles_me(self, n):
+        self.make_profiles(n)
+        self.client.force_authenticate(user=self.user)
+        return self.get('profiles-me')
+
+    @route_budget('profiles-search', 4)
+    def test_profiles_search(self, n):
+        self.make_profiles(n)
+        return self.get('profiles-search', q='member')
+
+    @route_budget('profiles-update-me', 7)
+    def test_profiles_update_me(self, n):
+        self.make_profiles(n)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('profiles-update-me')
+        return lambda: self.client.patch(url, {'display_name': 'Viewer'}, format='json')
+
+    # Registration and login
+
+    @route_budget('send-otp', 5)
+    def test_send_otp(self, n):
+        self.make_profiles(n)
+        return self.post('send-otp', email='viewer@example.com')
+
+    @route_budget('verify-otp', 4)
+    def test_verify_otp(self, n):
+        self.make_profiles(n)
+        User.objects.filter(pk=self.user.pk).update(verification_code='123456')
+        return self.post('verify-otp', email='viewer@example.com', code='123456')
+
+    @route_budget('set-credentials', 6)
+    def test_set_credentials(self, n):
+        self.make_profiles(n)
+        return self.post('set-credentials', email='viewer@example.com', username='viewer_new', password='Str0ng-pass!')
+
+    @route_budget('login', 2)
+    def test_login(self, n):
+        self.make_profiles(n)
+        return self.post('login', email_or_username='viewer', password='pass12345')
+
+    @route_budget('oauth-register', 7)
+    def test_oauth_register(self, n):
+        self.make_profiles(n)
+        patcher = mock.patch('accounts.views.get_google_user_info', return_value={'email': 'new@example.com'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return self.post('oauth-register', access_token='token', provider='google')
+
+    @route_budget('oauth-login', 1)
+    def test_oauth_login(self, n):
+        self.make_profiles(n)
+        User.objects.filter(pk=self.user.pk).update(is_oauth_user=True)
+        patcher = mock.patch('accounts.views.get_google_user_info', return_value={'email': 'viewer@example.com'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return self.post('oauth-login', access_token='token', provider='google')
+
+    @route_budget('api-root', 0)
+    def test_api_root(self, n):
+        self.make_profiles(n)
+        return lambda: self.client.get('/auth/')
+
+
+class AccountsRouteBudgetCoverageTests(SimpleTestCase):
+    def test_every_route_has_a_budget(self):
+        missing = route_names('accounts.urls') - budgeted_routes(AccountsRouteBudgetTests)
+        self.assertFalse(missing, f"Routes without a query budget: {sorted(missing)}")
@@ -19,6 +19,7 @@ from .utils import *
 import logging
 from interest.models import *
 from django.db import transaction
+from django.db.models import Count
 
 User = get_user_model()
 
@@ -223,11 +224,19 @@ class ProfileViewSet(viewsets.ModelViewSet):
         """Use different serializers for read and write operations"""
         if self.action in ['update', 'partial_update']:
             return ProfileUpdateSerializer
+        if self.action in ['list', 'search']:
+            return ProfileListSerializer
         return ProfileSerializer
 
     def get_queryset(self):
         """Return all profiles for list view"""
-        return Profile.objects.select_related('user').all().order_by('-created_at')
+        return self._with_serializer_data(Profile.objects.all()).order_by('-created_at')
+
+    def _with_serializer_data(self, queryset):
+        """Load everything ProfileSerializer reads up front (user, interests, approved posts count)"""
+        return queryset.select_related('user').prefetch_related('subcategories__category').annotate(
+            approved_posts_count=Count('user__posts', filter=models.Q(user__posts__status='approved'))
+        )
 
     def create(self, request, *args, **kwargs):
         """
@@ -285,7 +294,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        profile = get_object_or_404(Profile, user=request.user)
+        profile = get_object_or_404(self.get_queryset(), user=request.user)
         serializer = self.get_serializer(profile)
         return Response({
             "success": True,
@@ -315,6 +324,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             serializer.save()
             # Return full profile data
+            profile = self.get_queryset().get(pk=profile.pk)
             response_serializer = ProfileSerializer(profile, context={'request': request})
             return Response({
                 "success": True,
@@ -340,10 +350,10 @@ class ProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        profiles = Profile.objects.filter(
+        profiles = self._with_serializer_data(Profile.objects.filter(
             models.Q(user__username__icontains=query) |
             models.Q(display_name__icontains=query)
-        ).select_related('user').order_by('-created_at')
+        )).order_by('-created_at')
         
         page = self.paginate_queryset(profiles)
         
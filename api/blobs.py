@@ -0,0 +1,160 @@
+# api/blobs.py
+"""
+Content-addressed media store.
+
+Uploaded files are stored once per distinct content, at
+blobs/<aa>/<bb>/<sha256><ext>, with a MediaBlob row per file. Uploads are
+hashed chunk by chunk (never held in memory whole), and their bytes are
+only written when no blob has them yet, so the same photo posted ten times
+takes one file on disk (and gets one set of derivatives).
+
+Model fields keep holding storage paths; they just point at blob paths now.
+MediaBlob.ref_count counts the saved fields that point at each blob. It is
+maintained by the field-tracking hooks in api/media.py through retain() and
+release(). store() alone takes no reference, so an upload that never gets
+saved anywhere is left at zero. gc_media deletes zero-reference blobs once
+they have been untouched for a grace period, and can recount references
+from the tables if the counts ever drift (e.g. after bulk updates that skip
+signals). Files saved before the blob store existed are moved into it by
+the adopt_legacy_media command.
+"""
+import hashlib
+import logging
+import os
+from collections import Counter
+from datetime import timedelta
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs/'
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_path(digest, name=''):
+    extension = os.path.splitext(name or '')[1].lower()[:10]
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def is_blob_path(path):
+    return isinstance(path, str) and path.startswith(BLOB_PREFIX)
+
+
+def hash_file(f):
+    """(sha256 hex digest, size) of a file, read in chunks; the file is rewound afterwards"""
+    digest, size = hashlib.sha256(), 0
+    f.seek(0)
+    chunks = f.chunks(CHUNK_SIZE) if hasattr(f, 'chunks') else iter(lambda: f.read(CHUNK_SIZE), b'')
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+    f.seek(0)
+    return digest.hexdigest(), size
+
+
+def _write(path, f):
+    # Overwrite whatever a crashed upload or collected blob left at the path
+    default_storage.delete(path)
+    f.seek(0)
+    saved = default_storage.save(path, File(f))
+    if saved != path:
+        raise IOError(f"Storage saved blob {path} as {saved}")
+
+
+def store(f, name=None, digest=None, size=None):
+    """
+    The MediaBlob holding a file's bytes, writing them only if no blob has
+    them yet. Pass digest/size when the caller already hashed the bytes.
+    Takes no reference: save the blob's path on a tracked field for that.
+    """
+    if digest is None:
+        digest, size = hash_file(f)
+    name = name or getattr(f, 'name', '') or ''
+
+    # Touch first, so gc_media (which only takes untouched blobs) leaves it alone from here on
+    if MediaBlob.objects.filter(sha256=digest).update(touched_at=timezone.now()):
+        blob = MediaBlob.objects.get(sha256=digest)
+        if not default_storage.exists(blob.path):
+            _write(blob.path, f)
+        return blob
+
+    path = blob_path(digest, name)
+    _write(path, f)
+    try:
+        with transaction.atomic():
+            return MediaBlob.objects.create(sha256=digest, path=path, size=size)
+    except IntegrityError:
+        # Someone stored the same bytes under another extension meanwhile
+        blob = MediaBlob.objects.get(sha256=digest)
+        if blob.path != path:
+            default_storage.delete(path)
+        return blob
+
+
+def _adjust(paths, sign):
+    counts = Counter(path for path in paths if is_blob_path(path))
+    by_count = {}
+    for path, count in counts.items():
+        by_count.setdefault(count, []).append(path)
+    for count, group in by_count.items():
+        MediaBlob.objects.filter(path__in=group).update(
+            ref_count=F('ref_count') + sign * count, touched_at=timezone.now()
+        )
+
+
+def retain(paths):
+    """Count one more reference for every blob path in paths (repeats count repeatedly)"""
+    _adjust(paths, 1)
+
+
+def release(paths):
+    """Drop a reference for every blob path in paths; other paths are ignored"""
+    _adjust(paths, -1)
+
+
+def recount(referenced_paths):
+    """Reset every ref_count to the number of times its path occurs in referenced_paths; returns blobs fixed"""
+    counts = Counter(path for path in referenced_paths if is_blob_path(path))
+    fixed = 0
+    for blob in MediaBlob.objects.only('pk', 'path', 'ref_count').iterator():
+        actual = counts.get(blob.path, 0)
+        if blob.ref_count != actual:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=actual)
+            fixed += 1
+    return fixed
+
+
+def collect(grace=timedelta(hours=1), batch_size=500, dry_run=False):
+    """
+    Delete unreferenced blobs untouched for `grace`, batch_size rows at a
+    time, together with their files and derivatives. Yields (rows, bytes)
+    per batch.
+    """
+    from .images import delete_derivatives
+
+    cutoff = timezone.now() - grace
+    candidates = MediaBlob.objects.filter(ref_count__lte=0, touched_at__lt=cutoff).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(candidates.filter(pk__gt=last_pk).values_list('pk', 'path', 'size')[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        if dry_run:
+            yield len(batch), sum(size for _, _, size in batch)
+            continue
+
+        # Claim the rows first: a blob re-stored or re-referenced meanwhile no longer matches
+        deleted = []
+        for pk, path, size in batch:
+            if candidates.filter(pk=pk).delete()[0]:
+                deleted.append((path, size))
+        for path, _ in deleted:
+            default_storage.delete(path)
+        delete_derivatives([path for path, _ in deleted])
+        yield len(deleted), sum(size for _, size in deleted)
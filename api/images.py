@@ -0,0 +1,192 @@
+# api/images.py
+"""
+Image derivatives.
+
+Uploaded images are re-encoded off the request path into fixed-width
+variants (IMAGE_DERIVATIVE_SIZES, default 150/480/1080 px) in WebP and JPEG.
+The variants are stored under derivatives/<original path>/<size>.<format>.
+EXIF is dropped, after its orientation has been applied, and the original's
+width and height are recorded. Each original gets one ImageRendition row,
+keyed by its storage path, so the same pipeline serves post media (a list of
+paths) and model ImageFields alike.
+
+Paths are queued by the field-tracking hooks in api/media.py when they appear
+on a saved model, and rendered once the transaction commits, on a small
+thread pool (IMAGE_DERIVATIVE_WORKERS) or inline when
+IMAGE_DERIVATIVES_ASYNC = False. Content-addressed blob paths never change
+content, so a blob that is already rendered isn't rendered again. The
+generate_image_derivatives command backfills images uploaded before this
+existed and retries failures.
+"""
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from .blobs import is_blob_path
+from .models import ImageRendition
+
+logger = logging.getLogger(__name__)
+
+SIZES = tuple(getattr(settings, 'IMAGE_DERIVATIVE_SIZES', (150, 480, 1080)))
+FORMATS = ('webp', 'jpeg')
+QUALITY = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 82)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2), thread_name_prefix='derivatives'
+                )
+    return _executor
+
+
+def _shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+
+
+atexit.register(_shutdown)
+
+
+def image_sources(value):
+    """Storage paths held by a field value: a FieldFile, a path, or a list of paths"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [path for path in value if isinstance(path, str) and path]
+    name = getattr(value, 'name', value)
+    return [name] if isinstance(name, str) and name else []
+
+
+def derivative_path(source, size, fmt):
+    return f'derivatives/{source}/{size}.{fmt}'
+
+
+def enqueue(sources):
+    """Mark stored images pending and render them once the current transaction commits"""
+    sources = list(dict.fromkeys(sources))
+    blobs = [source for source in sources if is_blob_path(source)]
+    if blobs:
+        rendered = set(ImageRendition.objects.filter(
+            source__in=blobs, status__in=['ready', 'unsupported']
+        ).values_list('source', flat=True))
+        sources = [source for source in sources if source not in rendered]
+    if not sources:
+        return
+    # Re-queue other known paths: a replaced upload can land on the same path
+    ImageRendition.objects.bulk_create(
+        [ImageRendition(source=source) for source in sources],
+        update_conflicts=True, unique_fields=['source'], update_fields=['status']
+    )
+    transaction.on_commit(lambda: dispatch(sources))
+
+
+def dispatch(sources):
+    for source in sources:
+        if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+            get_executor().submit(_run, source)
+        else:
+            generate(source)
+
+
+def _run(source):
+    try:
+        generate(source)
+    except Exception:
+        logger.exception("Derivatives for %s crashed", source)
+    finally:
+        close_old_connections()
+
+
+def _flatten(image, fmt):
+    """The image in a mode the format can store; JPEG loses transparency to a white background"""
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if not has_alpha:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if fmt == 'webp':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        image.save(buffer, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def generate(source):
+    """Render every variant of one stored image; returns its ImageRendition"""
+    rendition, _ = ImageRendition.objects.get_or_create(source=source)
+    try:
+        with default_storage.open(source, 'rb') as f, Image.open(f) as original:
+            # Bake the EXIF orientation into the pixels, since EXIF itself isn't kept
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except UnidentifiedImageError:
+        rendition.status, rendition.error = 'unsupported', ''
+        rendition.save(update_fields=['status', 'error', 'updated_at'])
+        return rendition
+    except Exception as e:
+        logger.warning("Can't open %s for derivatives: %s", source, e)
+        rendition.status, rendition.error = 'failed', str(e)[:255]
+        rendition.save(update_fields=['status', 'error', 'updated_at'])
+        return rendition
+
+    width, height = image.size
+    variants = {}
+    try:
+        for size in sorted(SIZES):
+            # Never upscale: past the original's width only the smallest variant is made
+            if size > width and variants:
+                break
+            target = min(size, width)
+            resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+            variant = {'width': resized.width, 'height': resized.height}
+            for fmt in FORMATS:
+                path = derivative_path(source, size, fmt)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                variant[fmt] = default_storage.save(path, ContentFile(_encode(_flatten(resized, fmt), fmt)))
+            variants[str(size)] = variant
+    except Exception as e:
+        logger.warning("Derivatives for %s failed: %s", source, e)
+        rendition.status, rendition.error = 'failed', str(e)[:255]
+        rendition.save(update_fields=['status', 'error', 'updated_at'])
+        return rendition
+
+    rendition.status, rendition.error = 'ready', ''
+    rendition.width, rendition.height, rendition.variants = width, height, variants
+    rendition.save()
+    return rendition
+
+
+def delete_derivatives(sources):
+    """Remove the variant files and ImageRendition rows of deleted originals"""
+    sources = list(sources)
+    if not sources:
+        return
+    renditions = ImageRendition.objects.filter(source__in=sources)
+    for variants in renditions.values_list('variants', flat=True):
+        for variant in (variants or {}).values():
+            for fmt in FORMATS:
+                if variant.get(fmt):
+                    default_storage.delete(variant[fmt])
+    renditions.delete()
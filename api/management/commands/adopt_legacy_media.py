@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from api.media import adopt_legacy_media
+
+
+class Command(BaseCommand):
+    help = "Move media saved before the blob store into it and take references for it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Leave the old files (and their derivatives) in storage'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved')
+
+    def handle(self, *args, **options):
+        rows, moved, missing = adopt_legacy_media(
+            delete_originals=not options['keep_originals'],
+            dry_run=options['dry_run'],
+        )
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} paths point at files that no longer exist, left as they are"))
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} files on {rows} fields into the blob store"))
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from api import blobs, uploads
+from api.media import referenced_paths
+
+
+class Command(BaseCommand):
+    help = "Discard expired upload sessions, then delete media blobs that nothing references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Keep unreferenced blobs touched more recently than this (uploads not saved yet)'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Recompute reference counts from the tables first (after bulk edits that skip signals)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            expired = uploads.expire_sessions()
+            self.stdout.write(f"Discarded {expired} expired upload sessions")
+
+        if options['recount'] and not options['dry_run']:
+            fixed = blobs.recount(referenced_paths())
+            self.stdout.write(f"Recounted references, {fixed} blobs corrected")
+
+        deleted = freed = 0
+        for rows, size in blobs.collect(
+            grace=timedelta(minutes=options['grace_minutes']),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        ):
+            deleted += rows
+            freed += size
+            self.stdout.write(f"  batch: {rows} blobs, {size / 1e6:.1f} MB")
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} blobs, {freed / 1e6:.1f} MB"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from api.images import generate
+from api.media import referenced_paths
+from api.models import ImageRendition
+
+
+class Command(BaseCommand):
+    help = "Render image derivatives for stored images that don't have them yet (or --all of them)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render images that already have derivatives')
+        parser.add_argument(
+            '--retry-failed', action='store_true', help="Also retry images whose last render failed"
+        )
+
+    def handle(self, *args, **options):
+        sources = list(dict.fromkeys(referenced_paths()))
+
+        if not options['all']:
+            done = ['ready', 'unsupported'] + ([] if options['retry_failed'] else ['failed'])
+            finished = set(ImageRendition.objects.filter(status__in=done).values_list('source', flat=True))
+            sources = [source for source in sources if source not in finished]
+
+        counts = {}
+        for source in sources:
+            status = generate(source).status
+            counts[status] = counts.get(status, 0) + 1
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(f"Rendered {len(sources)} images: {summary}"))
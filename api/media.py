@@ -0,0 +1,153 @@
+# api/media.py
+"""
+Model fields that hold stored media, and the hooks that follow them.
+
+MEDIA_FIELDS lists the fields: ImageFields, or JSON lists of storage paths
+(Post.media_file). Each instance remembers its paths when it's loaded.
+When it's saved:
+
+- a fresh upload on an ImageField is stored as a content-addressed blob
+  (api/blobs.py), and the field gets the blob's path
+- paths that appeared take a blob reference and are queued for image
+  derivatives (api/images.py)
+- paths that went away drop their reference
+
+Deleting an instance drops the references it held. A save that leaves its
+media alone runs no extra queries.
+"""
+from collections import Counter
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from . import blobs, images
+from .models import UploadSession
+
+MEDIA_FIELDS = {
+    'post.Post': ('media_file',),
+    'accounts.Profile': ('avatar', 'cover_photo'),
+    'community.Community': ('profile_image', 'cover_image'),
+    'marketplace.Product': ('image',),
+}
+
+
+def _paths(instance, name):
+    # Read the raw value from __dict__: deferred fields stay unloaded
+    return images.image_sources(instance.__dict__.get(name))
+
+
+def _remember(sender, instance, **kwargs):
+    instance._media_paths = {name: _paths(instance, name) for name in MEDIA_FIELDS[sender._meta.label]}
+
+
+def _store_uploads(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for name in MEDIA_FIELDS[sender._meta.label]:
+        if name not in instance.__dict__:
+            continue
+        value = getattr(instance, name)
+        if isinstance(value, FieldFile) and value and not value._committed:
+            blob = blobs.store(value.file, name=value.name)
+            # FileField.pre_save then leaves the already-stored file alone
+            value.name = blob.path
+            value._committed = True
+
+
+def _track(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    seen = {} if created else getattr(instance, '_media_paths', {})
+    added, removed = Counter(), Counter()
+    for name in MEDIA_FIELDS[sender._meta.label]:
+        current = _paths(instance, name)
+        before = Counter(seen.get(name, ()))
+        added += Counter(current) - before
+        removed += before - Counter(current)
+        seen[name] = current
+    instance._media_paths = seen
+
+    if added:
+        blobs.retain(added.elements())
+        images.enqueue(list(added))
+    if removed:
+        blobs.release(removed.elements())
+
+
+def _forget(sender, instance, **kwargs):
+    held = [path for name in MEDIA_FIELDS[sender._meta.label] for path in _paths(instance, name)]
+    if held:
+        blobs.release(held)
+
+
+def referenced_paths():
+    """Every path currently saved on a MEDIA_FIELDS field or held by a finalized upload, once per reference"""
+    for label, names in MEDIA_FIELDS.items():
+        for values in apps.get_model(label).objects.values_list(*names).iterator():
+            for value in values:
+                yield from images.image_sources(value)
+    yield from UploadSession.objects.filter(
+        status='complete', blob__isnull=False
+    ).values_list('blob__path', flat=True).iterator()
+
+
+def adopt_legacy_media(delete_originals=True, dry_run=False):
+    """
+    Move files saved before the blob store (posts/<id>/..., profile/..., etc.)
+    into it: store each one as a blob, point the field at the blob path and
+    take the reference. Writes go through queryset updates, so the hooks
+    above don't run and a row edited meanwhile is left for the next run.
+    Returns (rows updated, files moved, paths whose file is missing).
+    """
+    rows = moved = missing = 0
+    for label, names in MEDIA_FIELDS.items():
+        model = apps.get_model(label)
+        for pk, *values in model.objects.values_list('pk', *names).iterator():
+            for name, value in zip(names, values):
+                sources = images.image_sources(value)
+                mapping = {}
+                for path in dict.fromkeys(sources):
+                    if blobs.is_blob_path(path):
+                        continue
+                    if not default_storage.exists(path):
+                        missing += 1
+                    elif dry_run:
+                        mapping[path] = path
+                    else:
+                        with default_storage.open(path, 'rb') as f:
+                            mapping[path] = blobs.store(f, name=path).path
+                if not mapping:
+                    continue
+                if dry_run:
+                    rows += 1
+                    moved += len(mapping)
+                    continue
+
+                new = [mapping.get(path, path) for path in sources]
+                with transaction.atomic():
+                    updated = model.objects.filter(pk=pk, **{name: value}).update(
+                        **{name: new if isinstance(value, list) else new[0]}
+                    )
+                    if updated:
+                        blobs.retain(path for old, path in zip(sources, new) if old in mapping)
+                if not updated:
+                    continue
+                rows += 1
+                moved += len(mapping)
+                images.enqueue(list(mapping.values()))
+                if delete_originals:
+                    for path in mapping:
+                        default_storage.delete(path)
+                    images.delete_derivatives(mapping)
+    return rows, moved, missing
+
+
+def track_media_fields():
+    """Connect the hooks for MEDIA_FIELDS (called from ApiConfig.ready)"""
+    for label in MEDIA_FIELDS:
+        model = apps.get_model(label)
+        post_init.connect(_remember, sender=model, dispatch_uid=f'media_paths:{label}')
+        pre_save.connect(_store_uploads, sender=model, dispatch_uid=f'media_uploads:{label}')
+        post_save.connect(_track, sender=model, dispatch_uid=f'media_track:{label}')
+        post_delete.connect(_forget, sender=model, dispatch_uid=f'media_forget:{label}')
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Storage path of the original', max_length=500, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('variants', models.JSONField(blank=True, default=dict, help_text='{"<size>": {"width": .., "height": .., "webp": <path>, "jpeg": <path>}}')),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status'], name='api_imagere_status_9c3582_idx')],
+            },
+        ),
+    ]
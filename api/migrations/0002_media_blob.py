@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_image_rendition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('path', models.CharField(help_text='blobs/<aa>/<bb>/<sha256><ext>', max_length=500, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.IntegerField(default=0, help_text='Saved model fields pointing at this blob')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('touched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'touched_at'], name='api_mediabl_ref_cou_f403a0_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,93 @@
+import math
+import uuid
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
+
+
+class ImageRendition(models.Model):
+    """ Resized/re-encoded variants of one stored image, keyed by its storage path """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('unsupported', 'Unsupported'),  # not an image Pillow can read, e.g. a video
+        ('failed', 'Failed'),
+    ]
+
+    source = models.CharField(max_length=500, unique=True, help_text='Storage path of the original')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(
+        default=dict, blank=True,
+        help_text='{"<size>": {"width": .., "height": .., "webp": <path>, "jpeg": <path>}}'
+    )
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
+class MediaBlob(models.Model):
+    """ One stored file, addressed by the SHA-256 of its bytes and shared by every field that references it """
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=500, unique=True, help_text='blobs/<aa>/<bb>/<sha256><ext>')
+    size = models.PositiveBigIntegerField()
+    ref_count = models.IntegerField(default=0, help_text='Saved model fields pointing at this blob')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last stored or released; gc_media leaves a blob alone for a grace period after this
+    touched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'touched_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} refs)"
+
+
+class UploadSession(models.Model):
+    """ A chunked, resumable upload; chunks sit on local disk until it is finalized into a MediaBlob """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, help_text='Digest the client expects; checked on finalize')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    # Held (with one blob reference) until a post claims the upload or the session expires
+    blob = models.ForeignKey(MediaBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+    @property
+    def total_chunks(self):
+        return max(1, math.ceil(self.size / self.chunk_size))
+
+    def chunk_length(self, index):
+        """Bytes chunk `index` must have: chunk_size, except for the last chunk"""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
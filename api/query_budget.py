@@ -0,0 +1,137 @@
+# api/query_budget.py
+"""
+Per-endpoint query budgets for the test suite.
+
+query_budget(n) is a context manager (and decorator) that fails when the
+wrapped block runs more than n queries.
+
+route_budget(route, max_queries) turns a QueryBudgetTestCase method into the
+budget test for one URL name. The method is a scenario: it receives n,
+creates n objects for the route and returns a zero-argument callable that
+makes the request. The scenario is run once per size in BUDGET_SIZES, each
+in its own rolled-back savepoint, and the test fails when
+
+- a run is over its budget (an int applies to every size, or pass {n: max}), or
+- the largest size runs more queries than the smallest, i.e. the count grows with N.
+
+A route with a known N+1 that is not fixed yet can pass growth="why"; it may
+grow within its budgets, and fails as soon as it stops growing so the
+marker and budgets get tightened.
+"""
+import functools
+from contextlib import ContextDecorator
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APITestCase
+
+BUDGET_SIZES = (1, 50)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def format_queries(captured):
+    return '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(captured, start=1))
+
+
+class query_budget(ContextDecorator):
+    """Fail when the block runs more than max_queries queries"""
+
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS, label='block'):
+        self.max_queries = max_queries
+        self.using = using
+        self.label = label
+        self.context = None
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        return self.context.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.context) > self.max_queries:
+            raise QueryBudgetExceeded(
+                f"{self.label} ran {len(self.context)} queries, budget is {self.max_queries}:\n"
+                f"{format_queries(self.context.captured_queries)}"
+            )
+        return False
+
+
+def route_budget(route, max_queries, growth=None):
+    """Mark a scenario method as the query budget test for a URL name"""
+    def decorator(scenario):
+        @functools.wraps(scenario)
+        def test(self):
+            self.check_route_budget(route, scenario, max_queries, growth)
+        test.budget_route = route
+        return test
+    return decorator
+
+
+def budgeted_routes(*test_cases):
+    """URL names covered by route_budget tests on the given test cases"""
+    return {
+        getattr(test_case, attr).budget_route
+        for test_case in test_cases
+        for attr in dir(test_case)
+        if hasattr(getattr(test_case, attr), 'budget_route')
+    }
+
+
+def route_names(urlconf):
+    """Every named URL pattern reachable from a urlconf module"""
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+
+    walk(get_resolver(urlconf).url_patterns)
+    return names
+
+
+class QueryBudgetTestCase(APITestCase):
+    """Runs route_budget scenarios at each of BUDGET_SIZES"""
+
+    def measure_scenario(self, scenario, n):
+        cache.clear()
+        with transaction.atomic():
+            make_request = scenario(self, n)
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+                response = make_request()
+            transaction.set_rollback(True)
+
+        self.assertLess(
+            response.status_code, 400,
+            f"{scenario.__name__} at N={n} returned {response.status_code}: {getattr(response, 'data', '')}"
+        )
+        return context.captured_queries
+
+    def check_route_budget(self, route, scenario, max_queries, growth=None):
+        budgets = max_queries if isinstance(max_queries, dict) else dict.fromkeys(BUDGET_SIZES, max_queries)
+        counts = {}
+
+        for n in BUDGET_SIZES:
+            captured = self.measure_scenario(scenario, n)
+            counts[n] = len(captured)
+            if counts[n] > budgets[n]:
+                raise QueryBudgetExceeded(
+                    f"{route} ran {counts[n]} queries at N={n}, budget is {budgets[n]}:\n{format_queries(captured)}"
+                )
+
+        smallest, largest = counts[BUDGET_SIZES[0]], counts[BUDGET_SIZES[-1]]
+        if growth is None and largest > smallest:
+            raise QueryBudgetExceeded(
+                f"{route} query count grows with N: {counts}. Batch the per-object queries "
+                f"(select_related/prefetch_related/annotations) instead of raising the budget."
+            )
+        if growth is not None and largest <= smallest:
+            raise QueryBudgetExceeded(
+                f"{route} no longer grows with N ({counts}); drop growth={growth!r} and tighten its budget."
+            )
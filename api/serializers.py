@@ -0,0 +1,202 @@
+# api/serializers.py
+"""
+Serializer helpers shared across apps.
+
+SparseFieldsetMixin lets the client shape a response through the query string:
+
+- ?fields=id,title,likes_count returns only the listed fields
+- ?expand=comments adds fields the serializer leaves out by default, named
+  in Meta.expandable_fields (typically expensive nested data)
+
+Fields that are neither listed nor expanded are never evaluated, so their
+queries are skipped too, not just their output. Only the top-level
+serializer of a response reads the query string; nested serializers
+render in full.
+
+ImageVariantsField renders the derivatives of an image (see api/images.py)
+as a srcset map, loading the renditions of a whole page in one query.
+ThumbnailURLField is its single-URL form for list cards.
+
+UploadSessionSerializer opens chunked uploads (see api/uploads.py).
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from .images import image_sources
+from .models import ImageRendition, UploadSession
+from .uploads import received_chunks
+
+
+def _query_list(request, param):
+    value = request.query_params.get(param, '') if request is not None else ''
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """?fields= / ?expand= support for a ModelSerializer"""
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def _query_fields(self, param):
+        if not self._is_root():
+            return set()
+        return _query_list(self.context.get('request'), param)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self._query_fields('expand')
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+        return fields
+
+    @property
+    def _readable_fields(self):
+        # Only narrow the output; writable fields still accept input
+        only = self._query_fields('fields')
+        if only:
+            only |= self._query_fields('expand')
+        for field in super()._readable_fields:
+            if not only or field.field_name in only:
+                yield field
+
+
+def rendition_data(source, rendition, max_size=None):
+    """
+    {"url", "width", "height", "variants", "srcset"} for one stored image.
+    With max_size, larger variants are left out, and so is the original
+    unless no variant is ready yet.
+    """
+    ready = rendition is not None and rendition.status == 'ready'
+    variants = {
+        size: variant for size, variant in (rendition.variants.items() if ready else ())
+        if max_size is None or int(size) <= max_size or size == min(rendition.variants, key=int)
+    }
+    ordered = sorted(variants.items(), key=lambda item: int(item[0]))
+    return {
+        'url': default_storage.url(source) if max_size is None or not variants else None,
+        'width': rendition.width if rendition is not None else None,
+        'height': rendition.height if rendition is not None else None,
+        'variants': {
+            size: {
+                'width': variant['width'],
+                'height': variant['height'],
+                **{fmt: default_storage.url(variant[fmt]) for fmt in ('webp', 'jpeg') if fmt in variant},
+            }
+            for size, variant in ordered
+        },
+        'srcset': {
+            fmt: ', '.join(f"{default_storage.url(variant[fmt])} {variant['width']}w" for _, variant in ordered)
+            for fmt in ('webp', 'jpeg') if ordered
+        },
+    }
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only srcset map of an ImageField, or list of maps for a list of
+    storage paths (Post.media_file). Under a many=True serializer only
+    variants up to IMAGE_LIST_MAX_SIZE are listed.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def _page(self):
+        """The list serializer this field's row is part of, if any"""
+        page = getattr(self.parent, 'parent', None)
+        return page if isinstance(page, serializers.ListSerializer) else None
+
+    def _max_size(self):
+        return getattr(settings, 'IMAGE_LIST_MAX_SIZE', 480) if self._page() is not None else None
+
+    def _renditions(self, sources):
+        cache = self.root.__dict__.setdefault('_image_renditions', {})
+        if any(source not in cache for source in sources):
+            wanted = set(sources)
+            page = self._page()
+            if page is not None and page.instance is not None:
+                # Load the whole page's images at once, for every image field of the row
+                fields = [field for field in self.parent.fields.values() if isinstance(field, ImageVariantsField)]
+                for obj in page.instance:
+                    for field in fields:
+                        try:
+                            wanted.update(image_sources(field.get_attribute(obj)))
+                        except serializers.SkipField:
+                            pass
+            wanted -= cache.keys()
+            found = {rendition.source: rendition for rendition in ImageRendition.objects.filter(source__in=wanted)}
+            cache.update({source: found.get(source) for source in wanted})
+        return cache
+
+    def to_representation(self, value):
+        sources = image_sources(value)
+        renditions = self._renditions(sources) if sources else {}
+        data = [rendition_data(source, renditions.get(source), self._max_size()) for source in sources]
+        if isinstance(value, (list, tuple)):
+            return data
+        return data[0] if data else None
+
+
+class ThumbnailURLField(ImageVariantsField):
+    """URL of an image's smallest variant (WebP), or of the original until variants are ready"""
+
+    def to_representation(self, value):
+        sources = image_sources(value)
+        if not sources:
+            return None
+        rendition = self._renditions(sources).get(sources[0])
+        if rendition is not None and rendition.status == 'ready' and rendition.variants:
+            smallest = rendition.variants[min(rendition.variants, key=int)]
+            return default_storage.url(smallest['webp'])
+        return default_storage.url(sources[0])
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """ Chunked upload session: opened with the file's size, then filled chunk by chunk """
+    chunk_size = serializers.IntegerField(required=False)
+    total_chunks = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+    path = serializers.CharField(source='blob.path', read_only=True, default=None)
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'content_type', 'size', 'chunk_size', 'total_chunks', 'sha256',
+            'status', 'received_chunks', 'path', 'url', 'created_at', 'expires_at',
+        ]
+        read_only_fields = ['status', 'created_at', 'expires_at']
+
+    def validate_size(self, value):
+        max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(f"Size must be between 1 and {max_size} bytes.")
+        return value
+
+    def validate_chunk_size(self, value):
+        low = getattr(settings, 'UPLOAD_MIN_CHUNK_SIZE', 256 * 1024)
+        high = getattr(settings, 'UPLOAD_MAX_CHUNK_SIZE', 32 * 1024 ** 2)
+        if not low <= value <= high:
+            raise serializers.ValidationError(f"Chunk size must be between {low} and {high} bytes.")
+        return value
+
+    def validate_sha256(self, value):
+        if value and (len(value) != 64 or any(char not in '0123456789abcdef' for char in value.lower())):
+            raise serializers.ValidationError("sha256 must be 64 hex characters.")
+        return value.lower()
+
+    def validate(self, attrs):
+        attrs.setdefault('chunk_size', getattr(settings, 'UPLOAD_CHUNK_SIZE', 5 * 1024 ** 2))
+        return attrs
+
+    def get_received_chunks(self, obj):
+        return received_chunks(obj)
+
+    def get_url(self, obj):
+        return default_storage.url(obj.blob.path) if obj.blob_id else None
@@ -1,3 +1,869 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from accounts.models import Profile
+from api import blobs, uploads
+from api.images import generate
+from api.media import referenced_paths
+from api.models import ImageRendition, MediaBlob, UploadSession
+from api.serializers import rendition_data
+from api.query_budget import QueryBudgetTestCase, budgeted_routes, route_budget, route_names
+from community.models import Community, CommunityMember, CommunityJoinRequest
+from interest.models import Category, SubCategory
+from marketplace.models import (
+    Category as MarketplaceCategory,
+    SubCategory as MarketplaceSubCategory,
+    Product,
+)
+from post.models import Post, Like, Comment, Share, Follow, Notification, ModerationJob
+from post.serializers import PostSerializer
+from post import timeline
+from post.trending import refresh_scores
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(
+    IMPRESSION_BUFFER_ENABLED=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class ApiRouteBudgetTests(QueryBudgetTestCase):
+    """Query budgets for every route in api/urls.py, at N=1 and N=50 objects"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass12345')
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+
+    # Fixtures
+
+    def make_users(self, n, prefix='member'):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com') for i in range(n)
+        ])
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+        return users
+
+    def make_posts(self, n, user=None, community=None):
+        return Post.objects.bulk_create([
+            Post(user=user or self.author, community=community, title=f'Post {i}', post_type='text', content='Hello')
+            for i in range(n)
+        ])
+
+    def make_community(self, name='budgets', visibility='public', admin=None):
+        community = Community.objects.create(name=name, title='Budgets', visibility=visibility, created_by=admin or self.user)
+        CommunityMember.objects.create(user=admin or self.user, community=community, role='admin', is_approved=True)
+        return community
+
+    def get(self, route, *args, **params):
+        url = reverse(route, args=args)
+        return lambda: self.client.get(url, params)
+
+    def post(self, route, *args, query='', **data):
+        url = reverse(route, args=args) + query
+        return lambda: self.client.post(url, data, format='json')
+
+    # Interests
+
+    @route_budget('category-list', 2)
+    def test_category_list(self, n):
+        for i in range(n):
+            SubCategory.objects.create(category=Category.objects.create(name=f'Category {i}'), name='Sub')
+        return self.get('category-list')
+
+    @route_budget('category-detail', 2)
+    def test_category_detail(self, n):
+        category = Category.objects.create(name='Music')
+        SubCategory.objects.bulk_create([SubCategory(category=category, name=f'Sub {i}') for i in range(n)])
+        return self.get('category-detail', category.pk)
+
+    @route_budget('subcategory-list', 1)
+    def test_subcategory_list(self, n):
+        category = Category.objects.create(name='Music')
+        SubCategory.objects.bulk_create([SubCategory(category=category, name=f'Sub {i}') for i in range(n)])
+        return self.get('subcategory-list')
+
+    @route_budget('subcategory-detail', 1)
+    def test_subcategory_detail(self, n):
+        category = Category.objects.create(name='Music')
+        subcategories = SubCategory.objects.bulk_create([SubCategory(category=category, name=f'Sub {i}') for i in range(n)])
+        return self.get('subcategory-detail', subcategories[0].pk)
+
+    # Posts
+
+    @route_budget('post-list', 4)
+    def test_post_list(self, n):
+        self.make_posts(n)
+        return self.get('post-list')
+
+    @route_budget('post-community-posts', 5)
+    def test_post_community_posts(self, n):
+        community = self.make_community()
+        self.make_posts(n, user=self.user, community=community)
+        return self.get('post-community-posts', community=community.name)
+
+    @route_budget('post-impression-stats', 0)
+    def test_post_impression_stats(self, n):
+        self.user.role = 'admin'
+        self.make_posts(n)
+        return self.get('post-impression-stats')
+
+    @route_budget('post-moderation-stats', 1)
+    def test_post_moderation_stats(self, n):
+        self.user.role = 'admin'
+        for post in self.make_posts(n):
+            ModerationJob.objects.create(post=post)
+        return self.get('post-moderation-stats')
+
+    @route_budget('post-my-posts', 4)
+    def test_post_my_posts(self, n):
+        self.make_posts(n, user=self.user)
+        return self.get('post-my-posts')
+
+    @route_budget('post-news-feed', 23)
+    def test_post_news_feed(self, n):
+        Follow.objects.create(follower=self.user, following=self.author)
+        # Budget the steady state: the one-off first-read build is already done
+        timeline.ensure_timeline(self.user)
+        self.make_posts(n)
+        return self.get('post-news-feed')
+
+    @route_budget('post-profile-posts', 4)
+    def test_post_profile_posts(self, n):
+        self.make_posts(n, user=self.user)
+        return self.get('post-profile-posts')
+
+    @route_budget('post-trending', 5)
+    def test_post_trending(self, n):
+        self.make_posts(n)
+        refresh_scores(full=True)
+        return self.get('post-trending')
+
+    @route_budget('post-user-posts', 4)
+    def test_post_user_posts(self, n):
+        self.make_posts(n)
+        return self.get('post-user-posts', user_id=self.author.id)
+
+    @route_budget('post-detail', 3)
+    def test_post_detail(self, n):
+        post = self.make_posts(1)[0]
+        Comment.objects.bulk_create([Comment(user=self.author, post=post, content=f'Comment {i}') for i in range(n)])
+        return self.get('post-detail', post.pk)
+
+    @route_budget('post-pin', 5)
+    def test_post_pin(self, n):
+        community = self.make_community()
+        post = self.make_posts(n, user=self.user, community=community)[0]
+        return self.post('post-pin', post.pk)
+
+    @route_budget('post-unpin', 5)
+    def test_post_unpin(self, n):
+        community = self.make_community()
+        post = self.make_posts(n, user=self.user, community=community)[0]
+        Post.objects.filter(pk=post.pk).update(is_pinned=True)
+        return self.post('post-unpin', post.pk)
+
+    # Likes, comments, shares
+
+    @route_budget('like-list', 2)
+    def test_like_list(self, n):
+        Like.objects.bulk_create([Like(user=self.user, post=post) for post in self.make_posts(n)])
+        return self.get('like-list')
+
+    @route_budget('like-detail', 1)
+    def test_like_detail(self, n):
+        likes = Like.objects.bulk_create([Like(user=self.user, post=post) for post in self.make_posts(n)])
+        return self.get('like-detail', likes[0].pk)
+
+    @route_budget('comment-list', 3)
+    def test_comment_list(self, n):
+        post = self.make_posts(1)[0]
+        Comment.objects.bulk_create([Comment(user=self.author, post=post, content=f'Comment {i}') for i in range(n)])
+        return self.get('comment-list', post=post.pk)
+
+    @route_budget('comment-detail', 2)
+    def test_comment_detail(self, n):
+        post = self.make_posts(1)[0]
+        comment = Comment.objects.create(user=self.author, post=post, content='Root')
+        Comment.objects.bulk_create([
+            Comment(user=self.author, post=post, parent=comment, content=f'Reply {i}') for i in range(n)
+        ])
+        return self.get('comment-detail', comment.pk)
+
+    @route_budget('comment-thread', 1)
+    def test_comment_thread(self, n):
+        post = self.make_posts(1)[0]
+        comments = Comment.objects.bulk_create([Comment(user=self.author, post=post, content=f'Comment {i}') for i in range(n)])
+        Comment.fill_thread_fields(comments)
+        return self.get('comment-thread', post=post.pk)
+
+    @route_budget('share-list', 2)
+    def test_share_list(self, n):
+        Share.objects.bulk_create([Share(user=self.user, post=post) for post in self.make_posts(n)])
+        return self.get('share-list')
+
+    @route_budget('share-detail', 1)
+    def test_share_detail(self, n):
+        shares = Share.objects.bulk_create([Share(user=self.user, post=post) for post in self.make_posts(n)])
+        return self.get('share-detail', shares[0].pk)
+
+    # Follows
+
+    @route_budget('follow-list', 2)
+    def test_follow_list(self, n):
+        Follow.objects.bulk_create([Follow(follower=self.user, following=user) for user in self.make_users(n)])
+        return self.get('follow-list')
+
+    @route_budget('follow-detail', 1)
+    def test_follow_detail(self, n):
+        follows = Follow.objects.bulk_create([Follow(follower=self.user, following=user) for user in self.make_users(n)])
+        return self.get('follow-detail', follows[0].pk)
+
+    @route_budget('follow-toggle-follow', 7)
+    def test_follow_toggle_follow(self, n):
+        self.make_posts(n)
+        return self.post('follow-toggle-follow', following_id=self.author.id)
+
+    @route_budget('follow-user-profile', 5)
+    def test_follow_user_profile(self, n):
+        Follow.objects.bulk_create([Follow(follower=user, following=self.author) for user in self.make_users(n)])
+        self.make_posts(n)
+        return self.get('follow-user-profile', user_id=self.author.id)
+
+    # Notifications
+
+    def make_notifications(self, n):
+        post = self.make_posts(1)[0]
+        return Notification.objects.bulk_create([
+            Notification(recipient=self.user, sender=user, notification_type='like', post=post)
+            for user in self.make_users(n)
+        ])
+
+    @route_budget('notification-list', 2)
+    def test_notification_list(self, n):
+        self.make_notifications(n)
+        return self.get('notification-list')
+
+    @route_budget('notification-unread', 2)
+    def test_notification_unread(self, n):
+        self.make_notifications(n)
+        return self.get('notification-unread')
+
+    @route_budget('notification-unread-count', 1)
+    def test_notification_unread_count(self, n):
+        self.make_notifications(n)
+        return self.get('notification-unread-count')
+
+    @route_budget('notification-mark-all-read', 1)
+    def test_notification_mark_all_read(self, n):
+        self.make_notifications(n)
+        return self.post('notification-mark-all-read')
+
+    @route_budget('notification-detail', 1)
+    def test_notification_detail(self, n):
+        notification = self.make_notifications(n)[0]
+        return self.get('notification-detail', notification.pk)
+
+    @route_budget('notification-mark-read', 3)
+    def test_notification_mark_read(self, n):
+        notification = self.make_notifications(n)[0]
+        return self.post('notification-mark-read', notification.pk)
+
+    # Marketplace
+
+    def make_products(self, n, user=None):
+        category = MarketplaceCategory.objects.create(name='Electronics')
+        subcategory = MarketplaceSubCategory.objects.create(category=category, name='Phones')
+        Product.objects.bulk_create([
+            Product(user=user or self.author, name=f'Phone {i}', image='products/phone.jpg', price=10,
+                    status='published', sub_category=subcategory)
+            for i in range(n)
+        ])
+        return category
+
+    @route_budget('marketplace-category-list', 2)
+    def test_marketplace_category_list(self, n):
+        for i in range(n):
+            category = MarketplaceCategory.objects.create(name=f'Category {i}')
+            MarketplaceSubCategory.objects.create(category=category, name=f'Sub {i}')
+        return self.get('marketplace-category-list')
+
+    @route_budget('marketplace-category-detail', 2)
+    def test_marketplace_category_detail(self, n):
+        category = MarketplaceCategory.objects.create(name='Electronics')
+        for i in range(n):
+            MarketplaceSubCategory.objects.create(category=category, name=f'Sub {i}')
+        return self.get('marketplace-category-detail', category.pk)
+
+    @route_budget('marketplace-subcategory-list', 1)
+    def test_marketplace_subcategory_list(self, n):
+        category = MarketplaceCategory.objects.create(name='Electronics')
+        for i in range(n):
+            MarketplaceSubCategory.objects.create(category=category, name=f'Sub {i}')
+        return self.get('marketplace-subcategory-list')
+
+    @route_budget('marketplace-subcategory-detail', 1)
+    def test_marketplace_subcategory_detail(self, n):
+        category = MarketplaceCategory.objects.create(name='Electronics')
+        subcategory = MarketplaceSubCategory.objects.create(category=category, name='Phones')
+        for i in range(n):
+            MarketplaceSubCategory.objects.create(category=category, name=f'Sub {i}')
+        return self.get('marketplace-subcategory-detail', subcategory.pk)
+
+    @route_budget('marketplace-item-list', 2)
+    def test_marketplace_item_list(self, n):
+        self.make_products(n)
+        return self.get('marketplace-item-list')
+
+    @route_budget('marketplace-item-by-category', 3)
+    def test_marketplace_item_by_category(self, n):
+        category = self.make_products(n)
+        return self.get('marketplace-item-by-category', category_id=category.pk)
+
+    @route_budget('marketplace-item-my-products', 3)
+    def test_marketplace_item_my_products(self, n):
+        self.make_products(n, user=self.user)
+        return self.get('marketplace-item-my-products')
+
+    @route_budget('marketplace-item-detail', 2)
+    def test_marketplace_item_detail(self, n):
+        self.make_products(n)
+        return self.get('marketplace-item-detail', Product.objects.first().pk)
+
+    # Communities
+
+    def make_communities(self, n, created_by=None, join=True):
+        communities = Community.objects.bulk_create([
+            Community(name=f'community{i}', title=f'Community {i}', created_by=created_by or self.author)
+            for i in range(n)
+        ])
+        if join:
+            CommunityMember.objects.bulk_create([
+                CommunityMember(user=self.user, community=community, is_approved=True) for community in communities
+            ])
+        return communities
+
+    def make_members(self, community, n, role='member'):
+        CommunityMember.objects.bulk_create([
+            CommunityMember(user=user, community=community, role=role, is_approved=True)
+            for user in self.make_users(n)
+        ])
+
+    @route_budget('community-list', 2)
+    def test_community_list(self, n):
+        self.make_communities(n)
+        return self.get('community-list')
+
+    @route_budget('community-created-by-me', 2)
+    def test_community_created_by_me(self, n):
+        self.make_communities(n, created_by=self.user)
+        return self.get('community-created-by-me')
+
+    @route_budget('community-my-communities', 2)
+    def test_community_my_communities(self, n):
+        self.make_communities(n)
+        return self.get('community-my-communities')
+
+    @route_budget('community-popular', 2)
+    def test_community_popular(self, n):
+        self.make_communities(n, join=False)
+        return self.get('community-popular')
+
+    @route_budget('community-detail', 4)
+    def test_community_detail(self, n):
+        community = self.make_community()
+        self.make_members(community, n)
+        return self.get('community-detail', community.name)
+
+    @route_budget('community-members', 3)
+    def test_community_members(self, n):
+        community = self.make_community()
+        self.make_members(community, n)
+        return self.get('community-members', community.name)
+
+    @route_budget('community-join', 5)
+    def test_community_join(self, n):
+        community = self.make_community(visibility='private', admin=self.author)
+        self.make_members(community, n, role='moderator')
+        return self.post('community-join', community.name)
+
+    @route_budget('community-leave', 6)
+    def test_community_leave(self, n):
+        community = self.make_community(admin=self.author)
+        self.make_members(community, n)
+        CommunityMember.objects.create(user=self.user, community=community, is_approved=True)
+        return self.post('community-leave', community.name)
+
+    @route_budget('community-update-member-role', 7)
+    def test_community_update_member_role(self, n):
+        community = self.make_community()
+        self.make_members(community, n)
+        member = CommunityMember.objects.filter(community=community, role='member').first()
+        return self.post('community-update-member-role', community.name, user_id=member.user_id, role='moderator')
+
+    @route_budget('community-remove-member', 7)
+    def test_community_remove_member(self, n):
+        community = self.make_community()
+        self.make_members(community, n)
+        member = CommunityMember.objects.filter(community=community, role='member').first()
+        return self.post('community-remove-member', community.name, user_id=member.user_id)
+
+    # Join requests
+
+    def make_join_requests(self, community, n):
+        return CommunityJoinRequest.objects.bulk_create([
+            CommunityJoinRequest(user=user, community=community) for user in self.make_users(n)
+        ])
+
+    @route_budget('join-request-list', 4)
+    def test_join_request_list(self, n):
+        community = self.make_community(visibility='private')
+        self.make_join_requests(community, n)
+        return self.get('join-request-list', community=community.name)
+
+    @route_budget('join-request-detail', 1)
+    def test_join_request_detail(self, n):
+        community = self.make_community(visibility='private', admin=self.author)
+        self.make_join_requests(community, n)
+        join_request = CommunityJoinRequest.objects.create(user=self.user, community=community)
+        return self.get('join-request-detail', join_request.pk)
+
+    @route_budget('join-request-approve', 10)
+    def test_join_request_approve(self, n):
+        community = self.make_community(visibility='private')
+        CommunityJoinRequest.objects.create(user=self.user, community=community)
+        join_request = self.make_join_requests(community, n)[0]
+        self.make_posts(n, user=self.user, community=community)
+        return self.post('join-request-approve', join_request.pk, query=f'?community={community.name}')
+
+    @route_budget('join-request-reject', 5)
+    def test_join_request_reject(self, n):
+        community = self.make_community(visibility='private')
+        CommunityJoinRequest.objects.create(user=self.user, community=community)
+        join_request = self.make_join_requests(community, n)[0]
+        return self.post('join-request-reject', join_request.pk, query=f'?community={community.name}')
+
+    # Uploads
+
+    def make_uploads(self, n, size=1000):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root, UPLOAD_CHUNK_DIR=os.path.join(media_root, 'chunks'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        return UploadSession.objects.bulk_create([
+            UploadSession(user=self.user, filename=f'clip{i}.mp4', size=size, chunk_size=size,
+                          expires_at=timezone.now() + timedelta(days=1))
+            for i in range(n)
+        ])
+
+    @route_budget('upload-list', 1)
+    def test_upload_list(self, n):
+        self.make_uploads(n)
+        return self.post('upload-list', filename='clip.mp4', size=10 * 1024 ** 2)
+
+    @route_budget('upload-detail', 1)
+    def test_upload_detail(self, n):
+        session = self.make_uploads(n)[0]
+        return self.get('upload-detail', session.pk)
+
+    @route_budget('upload-chunk', 1)
+    def test_upload_chunk(self, n):
+        session = self.make_uploads(n)[0]
+        url = reverse('upload-chunk', args=[session.pk, 0])
+        return lambda: self.client.put(url, b'x' * 1000, content_type='application/octet-stream')
+
+    @route_budget('upload-finalize', 9)
+    def test_upload_finalize(self, n):
+        session = self.make_uploads(n)[0]
+        uploads.write_chunk(session, 0, BytesIO(b'x' * 1000), 1000)
+        return self.post('upload-finalize', session.pk)
+
+    @route_budget('api-root', 0)
+    def test_api_root(self, n):
+        self.make_posts(n)
+        return lambda: self.client.get('/api/')
+
+
+class ApiRouteBudgetCoverageTests(SimpleTestCase):
+    def test_every_route_has_a_budget(self):
+        missing = route_names('api.urls') - budgeted_routes(ApiRouteBudgetTests)
+        self.assertFalse(missing, f"Routes without a query budget: {sorted(missing)}")
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False, IMAGE_DERIVATIVES_ASYNC=False)
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user(username='photographer', email='photo@example.com', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+
+    def store(self, name, size=(1200, 800), orientation=None):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        if orientation:
+            exif[0x0112] = orientation
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_variants_are_resized_and_stripped(self):
+        # Orientation 6: stored landscape, displayed portrait
+        rendition = generate(self.store('photos/big.jpg', orientation=6))
+        self.assertEqual(rendition.status, 'ready')
+        self.assertEqual((rendition.width, rendition.height), (800, 1200))
+        # No 1080 variant: the image is only 800 px wide
+        self.assertEqual(sorted(rendition.variants, key=int), ['150', '480'])
+        for variant in rendition.variants.values():
+            for fmt in ('webp', 'jpeg'):
+                with default_storage.open(variant[fmt]) as f, Image.open(f) as image:
+                    self.assertEqual(image.format, fmt.upper())
+                    self.assertEqual(image.size, (variant['width'], variant['height']))
+                    self.assertFalse(image.getexif())
+        self.assertEqual(rendition.variants['150']['height'], 225)
+
+    def test_small_and_unreadable_files(self):
+        rendition = generate(self.store('photos/small.jpg', size=(100, 50)))
+        self.assertEqual(list(rendition.variants), ['150'])
+        self.assertEqual(rendition.variants['150']['width'], 100)
+        video = default_storage.save('posts/clip.mp4', ContentFile(b'not an image'))
+        self.assertEqual(generate(video).status, 'unsupported')
+
+    def test_changed_image_fields_are_queued(self):
+        profile = self.user.profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.avatar = self.store('avatars/me.jpg')
+            profile.save()
+        self.assertEqual(ImageRendition.objects.get(source=profile.avatar.name).status, 'ready')
+
+        # Saving without touching the image costs no extra queries
+        profile = Profile.objects.get(pk=profile.pk)
+        with self.assertNumQueries(1):
+            profile.save()
+
+    def test_lists_reference_thumbnails_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            posts = [
+                Post.objects.create(
+                    user=self.user, title=f'Album {i}', post_type='media', content='', status='approved',
+                    media_file=[self.store(f'posts/{i}/a.jpg', size=(1600, 900)), self.store(f'posts/{i}/b.jpg')]
+                )
+                for i in range(3)
+            ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(sum('api_imagerendition' in query['sql'] for query in queries.captured_queries), 1)
+        card = response.data['results'][0]
+        self.assertNotIn('media_file', card)
+        self.assertEqual([list(image['variants']) for image in card['media']], [['150', '480'], ['150', '480']])
+        self.assertIsNone(card['media'][0]['url'])
+        self.assertIn(' 480w', card['media'][0]['srcset']['webp'])
+
+        detail = self.client.get(reverse('post-detail', args=[posts[0].pk])).data
+        self.assertEqual(list(detail['media'][0]['variants']), ['150', '480', '1080'])
+        self.assertEqual(detail['media'][0]['url'], default_storage.url(posts[0].media_file[0]))
+        self.assertEqual((detail['media'][0]['width'], detail['media'][0]['height']), (1600, 900))
+
+    def test_profile_and_community_lists_serve_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.user.profile
+            profile.avatar = self.store('avatars/me.jpg')
+            profile.save()
+            community = Community.objects.create(
+                name='photos', title='Photos', created_by=self.user, profile_image=self.store('communities/logo.jpg')
+            )
+        thumbnail = lambda path: default_storage.url(ImageRendition.objects.get(source=path).variants['150']['webp'])
+
+        profiles = self.client.get(reverse('profiles-list')).data['results']
+        self.assertEqual(profiles[0]['avatar'], thumbnail(profile.avatar.name))
+        self.assertIsNone(profiles[0]['cover_photo'])
+        communities = self.client.get(reverse('community-list')).data['results']['data']
+        self.assertEqual(communities[0]['profile_image'], thumbnail(community.profile_image.name))
+
+        # Single objects still point at the original
+        detail = self.client.get(reverse('community-detail', args=[community.name])).data['data']
+        self.assertTrue(detail['profile_image'].endswith(community.profile_image.name))
+
+    def test_pending_images_fall_back_to_the_original(self):
+        path = self.store('products/lamp.jpg')
+        ImageRendition.objects.create(source=path)
+        data = rendition_data(path, ImageRendition.objects.get(source=path), max_size=480)
+        self.assertEqual(data['url'], default_storage.url(path))
+        self.assertEqual(data['variants'], {})
+
+
+@override_settings(
+    IMPRESSION_BUFFER_ENABLED=False,
+    MODERATION_ASYNC=False,
+    IMAGE_DERIVATIVES_ASYNC=False,
+    MODERATION_IMAGE_CLASSIFIER='post.moderation.stub_image_classifier',
+)
+class MediaBlobTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user(username='uploader', email='up@example.com', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+
+    def photo(self, name='photo.jpg', color=(10, 120, 200)):
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def create_post(self, *media):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', {
+                'title': 'Photos', 'post_type': 'media', 'content': 'Look', 'media_files': list(media),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Post.objects.get(pk=response.data['data']['id'])
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.create_post(self.photo('a.jpg'))
+        second = self.create_post(self.photo('b.JPG'), self.photo('a.jpg'))
+        self.assertEqual(second.media_file, first.media_file * 2)
+        self.assertTrue(blobs.is_blob_path(first.media_file[0]))
+
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 3)
+        self.assertTrue(default_storage.exists(blob.path))
+        self.assertEqual(ImageRendition.objects.get(source=blob.path).status, 'ready')
+
+    def test_replaced_and_deleted_media_are_collected(self):
+        post = self.create_post(self.photo())
+        other = self.create_post(self.photo(color=(0, 0, 0)))
+        old_path, kept_path = post.media_file[0], other.media_file[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/posts/{post.pk}/', {'media_files': [self.photo(color=(255, 0, 0))]}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(MediaBlob.objects.get(path=old_path).ref_count, 0)
+
+        Post.objects.get(pk=post.pk).delete()
+        self.assertFalse(MediaBlob.objects.filter(ref_count__gt=0).exclude(path=kept_path).exists())
+
+        call_command('gc_media', '--grace-minutes', '0', stdout=StringIO())
+        self.assertEqual(list(MediaBlob.objects.values_list('path', flat=True)), [kept_path])
+        self.assertFalse(default_storage.exists(old_path))
+        self.assertFalse(ImageRendition.objects.filter(source=old_path).exists())
+        self.assertTrue(default_storage.exists(kept_path))
+
+    def test_grace_period_keeps_fresh_uploads(self):
+        blob = blobs.store(self.photo())
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(MediaBlob.objects.filter(pk=blob.pk).exists())
+
+    def test_image_fields_reference_blobs(self):
+        profile = self.user.profile
+        profile.avatar = self.photo('me.jpg')
+        profile.save()
+        first = profile.avatar.name
+        self.assertTrue(blobs.is_blob_path(first))
+        self.assertEqual(MediaBlob.objects.get(path=first).ref_count, 1)
+
+        profile.avatar = self.photo('me-again.jpg', color=(1, 2, 3))
+        profile.save()
+        self.assertEqual(MediaBlob.objects.get(path=first).ref_count, 0)
+        self.assertEqual(MediaBlob.objects.get(path=profile.avatar.name).ref_count, 1)
+
+    def test_recount_repairs_drift(self):
+        post = self.create_post(self.photo())
+        MediaBlob.objects.update(ref_count=7)
+        self.assertEqual(blobs.recount(referenced_paths()), 1)
+        self.assertEqual(MediaBlob.objects.get(path=post.media_file[0]).ref_count, 1)
+
+    def test_legacy_media_is_adopted(self):
+        post = self.create_post(self.photo())
+        kept = post.media_file[0]
+        legacy = self.photo('old.jpg', color=(200, 0, 0)).read()
+        default_storage.save(f'posts/{post.pk}/old.jpg', ContentFile(legacy))
+        default_storage.save('profile/avatars/old.jpg', ContentFile(legacy))
+        Post.objects.filter(pk=post.pk).update(media_file=[f'posts/{post.pk}/old.jpg', kept])
+        Profile.objects.filter(pk=self.user.profile.pk).update(avatar='profile/avatars/old.jpg')
+        Profile.objects.filter(pk=self.user.profile.pk).update(cover_photo='profile/covers/gone.jpg')
+
+        out = StringIO()
+        call_command('adopt_legacy_media', '--dry-run', stdout=out)
+        self.assertIn('Would move 2 files on 2 fields', out.getvalue())
+        self.assertTrue(default_storage.exists(f'posts/{post.pk}/old.jpg'))
+
+        call_command('adopt_legacy_media', stdout=out)
+        post.refresh_from_db()
+        profile = Profile.objects.get(pk=self.user.profile.pk)
+        self.assertTrue(blobs.is_blob_path(post.media_file[0]))
+        self.assertEqual(post.media_file[1], kept)
+        self.assertEqual(profile.avatar.name, post.media_file[0])
+        self.assertEqual(profile.cover_photo.name, 'profile/covers/gone.jpg')
+        self.assertEqual(MediaBlob.objects.get(path=post.media_file[0]).ref_count, 2)
+        self.assertEqual(MediaBlob.objects.get(path=kept).ref_count, 1)
+        self.assertFalse(default_storage.exists(f'posts/{post.pk}/old.jpg'))
+        with default_storage.open(post.media_file[0]) as f:
+            self.assertEqual(f.read(), legacy)
+
+        call_command('adopt_legacy_media', stdout=out)
+        self.assertIn('Moved 0 files', out.getvalue().splitlines()[-1])
+
+
+@override_settings(
+    IMPRESSION_BUFFER_ENABLED=False,
+    MODERATION_ASYNC=False,
+    IMAGE_DERIVATIVES_ASYNC=False,
+    MODERATION_IMAGE_CLASSIFIER='post.moderation.stub_image_classifier',
+    UPLOAD_MIN_CHUNK_SIZE=1024,
+)
+class UploadSessionTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root, UPLOAD_CHUNK_DIR=os.path.join(media_root, 'chunks'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user(username='mobile', email='mobile@example.com', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+        self.content = bytes(range(256)) * 10  # 2560 bytes: chunks of 1024, 1024, 512
+
+    def open_upload(self, **data):
+        response = self.client.post('/api/uploads/', {
+            'filename': 'clip.MP4', 'size': len(self.content), 'chunk_size': 1024, **data
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['data']
+
+    def put_chunk(self, upload_id, index, body=None):
+        body = self.content[index * 1024:(index + 1) * 1024] if body is None else body
+        return self.client.put(f'/api/uploads/{upload_id}/chunks/{index}/', body, content_type='application/octet-stream')
+
+    def test_resumed_upload_becomes_post_media(self):
+        upload = self.open_upload()
+        self.assertEqual(upload['total_chunks'], 3)
+        self.assertEqual(self.put_chunk(upload['id'], 2).status_code, 200)
+        self.assertEqual(self.put_chunk(upload['id'], 0).status_code, 200)
+
+        # The connection dropped: ask what arrived, then send the rest
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').data['received_chunks'], [0, 2])
+        response = self.client.post(f'/api/uploads/{upload["id"]}/finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing_chunks'], ['1'])
+
+        self.put_chunk(upload['id'], 1)
+        response = self.client.post(f'/api/uploads/{upload["id"]}/finalize/')
+        self.assertEqual(response.status_code, 200, response.data)
+        path = response.data['data']['path']
+        with default_storage.open(path) as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertTrue(path.endswith('.mp4'))
+        self.assertEqual(MediaBlob.objects.get(path=path).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', {
+                'title': 'Clip', 'post_type': 'media', 'content': 'Watch', 'upload_ids': [upload['id']],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Post.objects.get(pk=response.data['data']['id']).media_file, [path])
+        self.assertEqual(MediaBlob.objects.get(path=path).ref_count, 1)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_bad_chunks_are_rejected(self):
+        upload = self.open_upload(sha256='0' * 64)
+        self.assertEqual(self.put_chunk(upload['id'], 0, b'short').status_code, 400)
+        self.assertEqual(self.put_chunk(upload['id'], 3, b'').status_code, 400)
+        for index in range(3):
+            self.put_chunk(upload['id'], index)
+        response = self.client.post(f'/api/uploads/{upload["id"]}/finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_post_only_takes_own_finished_uploads(self):
+        unfinished = self.open_upload()
+        stranger = User.objects.create_user(username='stranger', email='s@example.com', password='pass12345')
+        foreign = UploadSession.objects.create(
+            user=stranger, filename='x.mp4', size=10, chunk_size=1024, status='complete',
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        for upload_id in (unfinished['id'], str(foreign.pk)):
+            response = self.client.post('/api/posts/', {
+                'title': 'Clip', 'post_type': 'media', 'content': 'Watch', 'upload_ids': [upload_id],
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('upload_ids', response.data)
+
+    def finished_upload(self):
+        upload = self.open_upload()
+        for index in range(3):
+            self.put_chunk(upload['id'], index)
+        return UploadSession.objects.get(pk=upload['id'])
+
+    def test_racing_finalizes_take_one_reference(self):
+        upload = self.open_upload()
+        for index in range(3):
+            self.put_chunk(upload['id'], index)
+        first, second = UploadSession.objects.get(pk=upload['id']), UploadSession.objects.get(pk=upload['id'])
+
+        uploads.finalize(first)
+        # The loser finds the parts gone and picks up the winner's result
+        self.assertEqual(uploads.finalize(second).status, 'complete')
+        self.assertEqual(second.blob_id, first.blob_id)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+    def test_upload_is_claimed_once(self):
+        session = uploads.finalize(self.finished_upload())
+        stale = UploadSession.objects.select_related('blob').get(pk=session.pk)
+        uploads.claim([session])
+        with self.assertRaises(ValidationError):
+            uploads.claim([stale])
+        uploads.discard(stale)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 0)
+
+    def test_post_with_claimed_upload_rolls_back(self):
+        session = uploads.finalize(self.finished_upload())
+        request = Request(APIRequestFactory().post('/'))
+        request.user = self.user
+        serializer = PostSerializer(
+            data={'title': 'Clip', 'post_type': 'media', 'content': 'Watch', 'upload_ids': [session.pk]},
+            context={'request': request},
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Another request claims it between validation and save
+        uploads.claim([session])
+        with self.assertRaises(ValidationError):
+            serializer.save(user=self.user)
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(MediaBlob.objects.get().ref_count, 0)
+
+    def test_expired_uploads_are_discarded(self):
+        upload = self.open_upload()
+        for index in range(3):
+            self.put_chunk(upload['id'], index)
+        path = self.client.post(f'/api/uploads/{upload["id"]}/finalize/').data['data']['path']
+        UploadSession.objects.update(expires_at=timezone.now())
+
+        call_command('gc_media', '--grace-minutes', '0', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(default_storage.exists(path))
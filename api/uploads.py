@@ -0,0 +1,171 @@
+# api/uploads.py
+"""
+Chunked, resumable uploads.
+
+A client opens an UploadSession with the file's name and size, PUTs its
+numbered chunks (in any order, retrying any of them) and finalizes it. Each
+chunk streams from the request body straight into a part file under
+UPLOAD_CHUNK_DIR, so no one ever holds a whole file in memory. The part
+files on disk are the session's progress: a client that lost its
+connection asks which chunks arrived and sends only the rest. Chunk
+uploads touch no database rows.
+
+Finalizing stitches the parts together while hashing them and hands the
+result to the content-addressed blob store (api/blobs.py). The session
+keeps one reference on its blob until a post claims the upload
+(PostSerializer.upload_ids) or the session expires (gc_media).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from . import blobs
+from .models import UploadSession
+
+COPY_BUFFER = 64 * 1024
+
+
+def chunk_dir():
+    return getattr(settings, 'UPLOAD_CHUNK_DIR', None) or os.path.join(tempfile.gettempdir(), 'upload-chunks')
+
+
+def session_dir(session):
+    return os.path.join(chunk_dir(), str(session.pk))
+
+
+def part_path(session, index):
+    return os.path.join(session_dir(session), f'{index}.part')
+
+
+def received_chunks(session):
+    """Indexes of the chunks already on disk with their full length"""
+    if session.status != 'open':
+        return list(range(session.total_chunks))
+    try:
+        names = os.listdir(session_dir(session))
+    except FileNotFoundError:
+        return []
+    received = []
+    for name in names:
+        index, _, extension = name.partition('.')
+        if extension == 'part' and index.isdigit() and int(index) < session.total_chunks:
+            if os.path.getsize(os.path.join(session_dir(session), name)) == session.chunk_length(int(index)):
+                received.append(int(index))
+    return sorted(received)
+
+
+def write_chunk(session, index, stream, length):
+    """Copy one chunk from a request stream to its part file; re-sending a chunk replaces it"""
+    if session.status != 'open':
+        raise ValidationError("Upload is already finalized.")
+    if not 0 <= index < session.total_chunks:
+        raise ValidationError(f"Chunk index must be between 0 and {session.total_chunks - 1}.")
+    expected = session.chunk_length(index)
+    if length != expected:
+        raise ValidationError(f"Chunk {index} must be exactly {expected} bytes, got {length}.")
+
+    os.makedirs(session_dir(session), exist_ok=True)
+    # Write under a temporary name so a dropped connection never leaves a short part behind
+    fd, temp_path = tempfile.mkstemp(dir=session_dir(session), suffix='.tmp')
+    try:
+        written = 0
+        with os.fdopen(fd, 'wb') as part:
+            while written < expected:
+                block = stream.read(min(COPY_BUFFER, expected - written))
+                if not block:
+                    break
+                part.write(block)
+                written += len(block)
+        if written != expected:
+            raise ValidationError(f"Chunk {index} was cut off after {written} of {expected} bytes.")
+        os.replace(temp_path, part_path(session, index))
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def finalize(session):
+    """Assemble the chunks into a blob; finalizing twice (even concurrently) is harmless"""
+    if session.status == 'complete':
+        return session
+    try:
+        missing = sorted(set(range(session.total_chunks)) - set(received_chunks(session)))
+        if missing:
+            raise ValidationError({'missing_chunks': missing[:100]})
+        blob = _assemble(session)
+    except (ValidationError, FileNotFoundError):
+        # A concurrent finalize may have won and cleaned up the parts
+        session.refresh_from_db()
+        if session.status == 'complete':
+            return session
+        raise
+
+    # Only the request that flips the session to complete takes its reference
+    with transaction.atomic():
+        won = UploadSession.objects.filter(pk=session.pk, status='open').update(blob=blob, status='complete')
+        if won:
+            blobs.retain([blob.path])
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    if won:
+        session.blob, session.status = blob, 'complete'
+    else:
+        session.refresh_from_db()
+    return session
+
+
+def _assemble(session):
+    digest = hashlib.sha256()
+    with tempfile.TemporaryFile(dir=session_dir(session)) as assembled:
+        for index in range(session.total_chunks):
+            with open(part_path(session, index), 'rb') as part:
+                for block in iter(lambda: part.read(COPY_BUFFER), b''):
+                    digest.update(block)
+                    assembled.write(block)
+        if session.sha256 and session.sha256.lower() != digest.hexdigest():
+            raise ValidationError("Assembled file doesn't match the sha256 given when the upload was opened.")
+        return blobs.store(assembled, name=session.filename, digest=digest.hexdigest(), size=session.size)
+
+
+def claim(sessions):
+    """
+    Close finalized uploads a post now references; their blobs stay referenced
+    by the post. Call it inside the transaction that saves the post: if another
+    request claimed or discarded one of the uploads first, it raises
+    ValidationError and the whole save rolls back.
+    """
+    ids = [session.pk for session in sessions]
+    if not ids:
+        return
+    locked = UploadSession.objects.select_for_update(of=('self',)).filter(pk__in=ids, status='complete')
+    claimed = [
+        session for session in locked.select_related('blob')
+        if UploadSession.objects.filter(pk=session.pk).delete()[0]
+    ]
+    if len(claimed) != len(ids):
+        raise ValidationError({'upload_ids': "Some of these uploads were already used or discarded."})
+    blobs.release([session.blob.path for session in claimed])
+
+
+def discard(session):
+    """Abort an upload: drop its chunks, its blob reference and the session"""
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    with transaction.atomic():
+        # Re-read under lock: only whoever deletes the row drops the reference it held
+        current = UploadSession.objects.select_for_update(of=('self',)).select_related('blob').filter(pk=session.pk).first()
+        if current and UploadSession.objects.filter(pk=current.pk).delete()[0] and current.blob_id:
+            if current.status == 'complete':
+                blobs.release([current.blob.path])
+
+
+def expire_sessions(now=None):
+    """Discard sessions past their expiry; returns how many"""
+    expired = UploadSession.objects.filter(expires_at__lte=now or timezone.now()).select_related('blob')
+    count = 0
+    for session in expired.iterator():
+        discard(session)
+        count += 1
+    return count
@@ -5,6 +5,7 @@ from post.views import *
 from chats.views import *
 from marketplace.views import *
 from community.views import *
+from .views import UploadSessionViewSet
 
 router = DefaultRouter()
 
@@ -29,6 +30,9 @@ router.register(r'marketplace/items', MarketplaceProductViewSet, basename="marke
 router.register(r'communities', CommunityViewSet, basename='community')
 router.register(r'join-requests', CommunityJoinRequestViewSet, basename='join-request')
 
+""" Upload Section """
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+
 """ Chat Section """
 # router.register(r'chat/rooms', RoomViewSet)
 
@@ -1,3 +1,69 @@
-from django.shortcuts import render
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+from . import uploads
 
-# Create your views here.
+
+""" Viewset for chunked uploads """
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable uploads: POST opens a session, PUT chunks/<n>/ sends chunk n as
+    the raw request body, GET shows which chunks arrived, POST finalize/
+    assembles them. Pass the finalized session IDs as upload_ids when creating a post.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user).select_related('blob')
+
+    def perform_create(self, serializer):
+        ttl = getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600)
+        serializer.save(user=self.request.user, expires_at=timezone.now() + timedelta(seconds=ttl))
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response({
+            "success": True,
+            "message": "Upload session created",
+            "data": serializer.data
+        }, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>[0-9]+)', url_name='chunk')
+    def chunk(self, request, pk=None, index=None):
+        """Store one chunk; the body is read as a stream, never through request.data"""
+        session = self.get_object()
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        uploads.write_chunk(session, int(index), request.stream, length)
+        return Response({
+            "success": True,
+            "message": "Chunk received",
+            "data": {
+                "index": int(index),
+                "received_chunks": len(uploads.received_chunks(session)),
+                "total_chunks": session.total_chunks,
+            }
+        })
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        session = uploads.finalize(self.get_object())
+        return Response({
+            "success": True,
+            "message": "Upload complete",
+            "data": self.get_serializer(session).data
+        })
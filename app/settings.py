@@ -167,6 +167,26 @@ CHANNEL_LAYERS = {
 #     },
 # }
 
+# Feed snapshots (post/snapshots.py) and seen filters (post/seen.py) live in the cache and must be
+# shared by every worker process: set CACHE_URL (e.g. redis://127.0.0.1:6379/1, next to channels)
+# in any deployment with more than one worker. Without it the cache is per-process memory, which
+# is fine for a single runserver, tests and the management commands.
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'social',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
 
 DATABASES = {
     'default': {
@@ -221,3 +241,73 @@ CKEDITOR_UPLOAD_PATH = "uploads/"
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Home timelines: authors above this follower count are pulled on read instead of fanned out
+TIMELINE_FANOUT_FOLLOWER_LIMIT = 5000
+TIMELINE_WINDOW_DAYS = 30
+
+# Seconds a ranked news feed snapshot stays pageable
+FEED_SNAPSHOT_TTL = 60 * 30
+
+# Trending: posts older than the window drop out of PostScore; decay is seconds of age per 10x engagement
+TRENDING_WINDOW_DAYS = 30
+TRENDING_DECAY_SECONDS = 45000
+
+# Max scored candidates kept for news feed tier sampling
+FEED_CANDIDATE_LIMIT = 500
+
+# Per-user "seen posts" bloom filters: a post stays seen for 1-2 rotations
+SEEN_FILTER_ROTATION_SECONDS = 6 * 60 * 60
+SEEN_FILTER_BITS = 16384
+
+# Buffered PostView writes: flushed from a background thread by size or time
+IMPRESSION_BUFFER_ENABLED = True
+IMPRESSION_FLUSH_SIZE = 500
+IMPRESSION_FLUSH_INTERVAL = 5.0
+IMPRESSION_MAX_QUEUE = 50000
+
+# Comment threads: reply levels rendered below a comment, and replies shown per comment
+COMMENT_TREE_MAX_DEPTH = 8
+COMMENT_TREE_MAX_REPLIES = 100
+# Top-level comments shown under each post card in lists and feeds
+COMMENT_PREVIEW_SIZE = 3
+
+# Post moderation: jobs run on a background thread pool; MODERATION_ASYNC = False runs them inline on commit
+MODERATION_ASYNC = True
+MODERATION_WORKERS = 4
+MODERATION_MAX_ATTEMPTS = 3
+# A failed attempt is retried after this many seconds, doubling each time (async mode only; with
+# MODERATION_ASYNC = False run process_moderation_queue --interval to retry)
+MODERATION_RETRY_BACKOFF = 30
+# Image classifier backend: a function, or a post.classifiers class built with MODERATION_IMAGE_CLASSIFIER_OPTIONS,
+# e.g. 'post.classifiers.FakeClassifier' with {'latency': 0.2} for offline development
+MODERATION_IMAGE_CLASSIFIER = 'post.moderation.check_image_content'
+MODERATION_IMAGE_CLASSIFIER_OPTIONS = {}
+# A post's image checks run in parallel on this many threads, and must all finish within MODERATION_DEADLINE seconds
+MODERATION_IMAGE_WORKERS = 10
+MODERATION_DEADLINE = 30
+
+# Moderation verdict cache: per-process LRU in front of the ModerationVerdict table
+MODERATION_CACHE_MEMORY_SIZE = 10000
+MODERATION_CACHE_MEMORY_TTL = 600
+MODERATION_CACHE_TTL = 30 * 24 * 3600
+MODERATION_CACHE_MAX_ENTRIES = 100000
+MODERATION_CACHE_PHASH = True
+# Table hits are tallied in memory; a row's hits/last_used_at are written at most this often (seconds)
+MODERATION_CACHE_TOUCH_INTERVAL = 3600
+
+# Image derivatives: variant widths (px) rendered in WebP and JPEG for uploaded images, off the request path
+IMAGE_DERIVATIVE_SIZES = (150, 480, 1080)
+IMAGE_DERIVATIVE_QUALITY = 82
+IMAGE_DERIVATIVES_ASYNC = True
+IMAGE_DERIVATIVE_WORKERS = 2
+# Largest variant list endpoints reference; the original is only linked from detail responses
+IMAGE_LIST_MAX_SIZE = 480
+
+# Chunked uploads: chunks are kept on local disk (UPLOAD_CHUNK_DIR, default <tmp>/upload-chunks) until finalized
+UPLOAD_CHUNK_DIR = None
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+UPLOAD_MIN_CHUNK_SIZE = 256 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 32 * 1024 * 1024
+UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 3600
@@ -110,17 +110,19 @@ class CommunityMember(models.Model):
             self.is_approved = True
             super().save(update_fields=['is_approved'])
 
-        # Update members count
-        if is_new and self.is_approved:
-            Community.objects.filter(pk=self.community.pk).update(members_count=F('members_count') + 1)
-        elif old_approved is False and self.is_approved is True:
+        # Update members count and backfill the new member's home timeline
+        if (is_new and self.is_approved) or (old_approved is False and self.is_approved is True):
             Community.objects.filter(pk=self.community.pk).update(members_count=F('members_count') + 1)
+            from post.timeline import backfill_community
+            backfill_community(self.user_id, self.community_id)
 
     def delete(self, *args, **kwargs):
         """Decrease members_count when approved member leaves"""
         if self.is_approved:
             Community.objects.filter(pk=self.community.pk).update(members_count=F('members_count') - 1)
         super().delete(*args, **kwargs)
+        from post.timeline import remove_community
+        remove_community(self.user_id, self.community_id)
 
 class CommunityRule(models.Model):
     """Rules for community behavior"""
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import *
 from django.contrib.auth import get_user_model
+from api.serializers import ImageVariantsField, ThumbnailURLField
 
 User = get_user_model()
 
@@ -11,62 +12,62 @@ class CommunitySerializer(serializers.ModelSerializer):
     user_role = serializers.SerializerMethodField()
     can_post = serializers.SerializerMethodField()
     can_manage = serializers.SerializerMethodField()
+    profile_image_variants = ImageVariantsField(source='profile_image')
+    cover_image_variants = ImageVariantsField(source='cover_image')
     
     class Meta:
         model = Community
         fields = [
             'id', 'name', 'title', 'description', 'profile_image', 'cover_image',
+            'profile_image_variants', 'cover_image_variants',
             'visibility', 'created_at', 'created_by', 'created_by_username',
             'updated_at', 'members_count', 'posts_count', 'is_member', 
             'user_role', 'can_post', 'can_manage'
         ]
         read_only_fields = ['created_by', 'members_count', 'posts_count', 'created_at', 'updated_at']
     
+    def _viewer_role(self, obj):
+        """Viewer's approved membership role, read from the viewer_role annotation when present"""
+        if not hasattr(obj, 'viewer_role'):
+            request = self.context.get('request')
+            membership = None
+            if request and request.user.is_authenticated:
+                membership = CommunityMember.objects.filter(
+                    user=request.user, 
+                    community=obj, 
+                    is_approved=True
+                ).first()
+            # Cache on the instance so the other fields reuse it
+            obj.viewer_role = membership.role if membership else None
+        return obj.viewer_role
+
     def get_is_member(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return CommunityMember.objects.filter(
-                user=request.user, 
-                community=obj, 
-                is_approved=True
-            ).exists()
+            return self._viewer_role(obj) is not None
         return False
     
     def get_user_role(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            membership = CommunityMember.objects.filter(
-                user=request.user, 
-                community=obj, 
-                is_approved=True
-            ).first()
-            return membership.role if membership else None
+            return self._viewer_role(obj)
         return None
     
     def get_can_post(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            if obj.created_by == request.user:
+            if obj.created_by_id == request.user.id:
                 return True
-            membership = CommunityMember.objects.filter(
-                user=request.user, 
-                community=obj, 
-                is_approved=True
-            ).first()
-            return membership is not None
+            return self._viewer_role(obj) is not None
         return False
     
     def get_can_manage(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            if obj.created_by == request.user:
+            if obj.created_by_id == request.user.id:
                 return True
-            membership = CommunityMember.objects.filter(
-                user=request.user, 
-                community=obj, 
-                is_approved=True
-            ).first()
-            return membership and membership.role in ['admin', 'moderator']
+            role = self._viewer_role(obj)
+            return role and role in ['admin', 'moderator']
         return False
     
     def create(self, validated_data):
@@ -84,6 +85,12 @@ class CommunitySerializer(serializers.ModelSerializer):
         return community
 
 
+class CommunityListSerializer(CommunitySerializer):
+    """CommunitySerializer for list views: images as thumbnail URLs, not originals"""
+    profile_image = ThumbnailURLField()
+    cover_image = ThumbnailURLField()
+
+
 class CommunityMemberSerializer(serializers.ModelSerializer):
     """Serializer for Community Members"""
     username = serializers.CharField(source='user.username', read_only=True)
@@ -192,20 +199,14 @@ class CommunityDetailSerializer(CommunitySerializer):
         members = CommunityMember.objects.filter(
             community=obj, 
             is_approved=True
-        ).select_related('user').order_by('-joined_at')[:10]
+        ).select_related('user', 'community').order_by('-joined_at')[:10]
         return CommunityMemberSerializer(members, many=True).data
     
     def get_pending_requests_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             # Only show to admins/moderators
-            membership = CommunityMember.objects.filter(
-                user=request.user,
-                community=obj,
-                is_approved=True
-            ).first()
-            
-            if membership and membership.role in ['admin', 'moderator']:
+            if self._viewer_role(obj) in ['admin', 'moderator']:
                 return CommunityJoinRequest.objects.filter(
                     community=obj,
                     status='pending'
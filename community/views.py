@@ -2,7 +2,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
-from django.db.models import Q, Count, Exists, OuterRef
+from django.db.models import Q, Count, Exists, OuterRef, Subquery
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
@@ -23,6 +23,8 @@ class CommunityViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return CommunityDetailSerializer
+        if self.action in ['list', 'popular', 'my_communities', 'created_by_me']:
+            return CommunityListSerializer
         return CommunitySerializer
     
     def get_queryset(self):
@@ -30,19 +32,23 @@ class CommunityViewSet(viewsets.ModelViewSet):
         
         if self.action == 'list':
             # Show public communities and communities user is member of
-            return Community.objects.filter(
+            return self._with_viewer_role(Community.objects.filter(
                 Q(visibility='public') | Q(members__user=user, members__is_approved=True)
-            ).distinct().annotate(
-                user_is_member=Exists(
-                    CommunityMember.objects.filter(
-                        community=OuterRef('pk'),
-                        user=user,
-                        is_approved=True
-                    )
-                )
-            ).order_by('-members_count', '-created_at')
+            ).distinct()).order_by('-members_count', '-created_at')
         
-        return Community.objects.all()
+        return self._with_viewer_role(Community.objects.all())
+
+    def _with_viewer_role(self, queryset):
+        """Annotate the viewer's approved membership role so the serializer needs no per-community queries"""
+        return queryset.select_related('created_by').annotate(
+            viewer_role=Subquery(
+                CommunityMember.objects.filter(
+                    community=OuterRef('pk'),
+                    user=self.request.user,
+                    is_approved=True
+                ).values('role')[:1]
+            )
+        )
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -116,9 +122,9 @@ class CommunityViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """Get popular communities based on members count"""
-        communities = Community.objects.filter(
+        communities = self._with_viewer_role(Community.objects.filter(
             visibility='public'
-        ).order_by('-members_count', '-posts_count')[:20]
+        )).order_by('-members_count', '-posts_count')[:20]
         
         page = self.paginate_queryset(communities)
         if page is not None:
@@ -139,10 +145,10 @@ class CommunityViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_communities(self, request):
         """Get communities the user is a member of"""
-        communities = Community.objects.filter(
+        communities = self._with_viewer_role(Community.objects.filter(
             members__user=request.user,
             members__is_approved=True
-        ).distinct().order_by('-created_at')
+        ).distinct()).order_by('-created_at')
         
         page = self.paginate_queryset(communities)
         if page is not None:
@@ -163,9 +169,9 @@ class CommunityViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def created_by_me(self, request):
         """Get communities created by the user"""
-        communities = Community.objects.filter(
+        communities = self._with_viewer_role(Community.objects.filter(
             created_by=request.user
-        ).order_by('-created_at')
+        )).order_by('-created_at')
         
         page = self.paginate_queryset(communities)
         if page is not None:
@@ -191,7 +197,7 @@ class CommunityViewSet(viewsets.ModelViewSet):
         members = CommunityMember.objects.filter(
             community=community,
             is_approved=True
-        ).select_related('user').order_by('-joined_at')
+        ).select_related('user', 'community').order_by('-joined_at')
         
         page = self.paginate_queryset(members)
         if page is not None:
@@ -262,14 +268,15 @@ class CommunityViewSet(viewsets.ModelViewSet):
                 is_approved=True
             ).select_related('user')
             
-            for admin in admins:
-                Notification.objects.create(
+            Notification.objects.bulk_create([
+                Notification(
                     recipient=admin.user,
                     sender=user,
                     notification_type='community_join_request',
-                    community=community,
-                    message=f"wants to join {community.title}"
+                    community=community
                 )
+                for admin in admins
+            ])
             
             return Response({
                 "success": True,
@@ -353,8 +360,7 @@ class CommunityViewSet(viewsets.ModelViewSet):
             recipient=member.user,
             sender=request.user,
             notification_type='community_role_changed',
-            community=community,
-            message=f"changed your role from {old_role} to {new_role} in {community.title}"
+            community=community
         )
         
         return Response({
@@ -443,12 +449,14 @@ class CommunityJoinRequestViewSet(viewsets.ModelViewSet):
                 if membership and membership.role in ['admin', 'moderator']:
                     return CommunityJoinRequest.objects.filter(
                         community=community
-                    ).order_by('-created_at')
+                    ).select_related('user', 'community', 'reviewed_by').order_by('-created_at')
             except Community.DoesNotExist:
                 pass
         
         # Users see their own requests
-        return CommunityJoinRequest.objects.filter(user=user).order_by('-created_at')
+        return CommunityJoinRequest.objects.filter(
+            user=user
+        ).select_related('user', 'community', 'reviewed_by').order_by('-created_at')
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -484,8 +492,7 @@ class CommunityJoinRequestViewSet(viewsets.ModelViewSet):
             recipient=join_request.user,
             sender=request.user,
             notification_type='community_join_approved',
-            community=community,
-            message=f"approved your request to join {community.title}"
+            community=community
         )
         
         return Response({
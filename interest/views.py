@@ -21,7 +21,7 @@ def error_response(message, code=status.HTTP_400_BAD_REQUEST):
 """ Viewset for Interest """
 class CategoryViewSet(viewsets.ModelViewSet):
     """ Viewset for Category """
-    queryset = Category.objects.all()
+    queryset = Category.objects.prefetch_related('subcategories')
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
 
@@ -1,6 +1,7 @@
 from .models import *
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from api.serializers import ImageVariantsField, ThumbnailURLField
 
 user = get_user_model()
 
@@ -28,10 +29,11 @@ class ProductSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     category_name = serializers.CharField(source='sub_category.category.name', read_only=True)
     subcategory_name = serializers.CharField(source='sub_category.name', read_only=True)
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'image', 'price', 'condition', 'status', 'user_name', 'category_name', 'subcategory_name', 'color', 'description', 'location', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'image', 'image_variants', 'price', 'condition', 'status', 'user_name', 'category_name', 'subcategory_name', 'color', 'description', 'location', 'created_at', 'updated_at']
 
         read_only_fields = ['id', 'created_at', 'updated_at']
 
@@ -46,6 +48,7 @@ class ProductListSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     category_name = serializers.CharField(source='sub_category.category.name', read_only=True)
     sub_category_name = serializers.CharField(source='sub_category.name', read_only=True)
+    image = ThumbnailURLField()
     
     class Meta:
         model = Product
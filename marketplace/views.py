@@ -9,7 +9,7 @@ from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import Q, Count
 from rest_framework import filters
 from rest_framework.decorators import action
 
@@ -31,7 +31,7 @@ def error_response(message, code=status.HTTP_400_BAD_REQUEST):
     }, status=code)
 
 class MarketplaceCategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    queryset = Category.objects.annotate(subcategory_count=Count('subcategories')).prefetch_related('subcategories')
     serializer_class = CategorySerializer
 
     permission_classes = [IsOwnerOrReadOnly]
@@ -41,7 +41,7 @@ class MarketplaceCategoryViewSet(viewsets.ModelViewSet):
         return success_response("Category list retrieved successfully.", serializer.data)
 
     def retrieve(self, request, pk=None, *args, **kwargs):
-        category = get_object_or_404(Category, pk=pk)
+        category = get_object_or_404(self.get_queryset(), pk=pk)
         serializer = self.get_serializer(category)
         return success_response("Category retrieved successfully.", serializer.data)
 
@@ -79,7 +79,7 @@ class MarketplaceSubCategoryViewSet(viewsets.ModelViewSet):
         return success_response("SubCategory list retrieved successfully.", serializer.data)
     
     def retrieve(self, request, pk=None, *args, **kwargs):
-        subcategory = get_object_or_404(SubCategory, pk=kwargs['pk'])
+        subcategory = get_object_or_404(SubCategory, pk=pk)
         serializer = self.get_serializer(subcategory)
         return success_response("SubCategory retrieved successfully.", serializer.data)
     
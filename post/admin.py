@@ -8,4 +8,5 @@ admin.site.register(Comment)
 admin.site.register(Share)
 admin.site.register(Follow)
 admin.site.register(Notification)
-admin.site.register(PostView)
\ No newline at end of file
+admin.site.register(PostView)
+admin.site.register(ModerationJob)
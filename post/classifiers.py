@@ -0,0 +1,192 @@
+# post/classifiers.py
+"""
+Image classifier backends for post moderation.
+
+A backend is any callable taking (image_file, timeout=None) and returning
+(is_safe, reason); it raises ModerationUnavailable when it can't reach a
+verdict. MODERATION_IMAGE_CLASSIFIER names the backend by dotted path: a
+function is used as is, a class is instantiated once with
+MODERATION_IMAGE_CLASSIFIER_OPTIONS as keyword arguments.
+
+- RemoteClassifier: the Hugging Face NSFW model over HTTP (the default)
+- LocalServerClassifier: the same HTTP client against a stub server started
+  in this process, which answers in the Hugging Face format after a set latency
+- FakeClassifier: no HTTP at all, just the latency and the verdict
+
+The stand-ins decide from a hash of the image bytes, flagging about
+unsafe_rate of all images, so benchmark and test runs are repeatable.
+"""
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+NSFW_API_URL = "https://api-inference.huggingface.co/models/Falconsai/nsfw_image_detection"
+UNSAFE_REASON = "Image contains inappropriate content"
+
+_session = None
+_lock = threading.Lock()
+
+
+class ModerationUnavailable(Exception):
+    """Raised by a classifier that couldn't reach a verdict (service down, timeout...)"""
+
+
+def get_session():
+    """Process-wide keep-alive session, with a connection pool sized for the image workers"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=getattr(settings, 'MODERATION_IMAGE_WORKERS', 10))
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def read_image(image_file):
+    """Bytes of an uploaded/storage file (rewound afterwards) or of a path"""
+    if hasattr(image_file, 'read'):
+        data = image_file.read()
+        image_file.seek(0)
+        return data
+    with open(image_file, 'rb') as f:
+        return f.read()
+
+
+def simulated_scores(data, unsafe_rate):
+    """Hugging Face style scores for the stand-ins: nsfw for about unsafe_rate of all byte strings"""
+    position = int.from_bytes(hashlib.sha256(data).digest()[:4], 'big') / 2 ** 32
+    nsfw = 0.99 if position < unsafe_rate else 0.01
+    return [{"label": "nsfw", "score": nsfw}, {"label": "normal", "score": round(1 - nsfw, 2)}]
+
+
+class ImageClassifier(ABC):
+    """Base backend: reads the image and passes its bytes to classify()"""
+
+    def __call__(self, image_file, timeout=None):
+        if not image_file:
+            return True, None
+        return self.classify(read_image(image_file), timeout)
+
+    @abstractmethod
+    def classify(self, data, timeout=None):
+        """(is_safe, reason) for the image bytes; raise ModerationUnavailable when there's no verdict"""
+
+
+class RemoteClassifier(ImageClassifier):
+    """NSFW image classification over HTTP, Hugging Face Inference API format"""
+
+    def __init__(self, url=NSFW_API_URL, threshold=0.7):
+        self.url = url
+        self.threshold = threshold
+
+    def classify(self, data, timeout=None):
+        try:
+            response = get_session().post(
+                self.url,
+                data=data,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=timeout
+            )
+        except requests.RequestException as e:
+            raise ModerationUnavailable(f"NSFW detection error: {e}") from e
+
+        if response.status_code != 200:
+            # API loading or failing; moderate_post lets the post through uncached
+            raise ModerationUnavailable(f"NSFW API response: {response.status_code}")
+
+        try:
+            results = response.json()
+        except ValueError as e:
+            raise ModerationUnavailable(f"NSFW detection error: {e}") from e
+
+        # Results format: [{"label": "nsfw", "score": 0.99}, {"label": "normal", "score": 0.01}]
+        for result in results:
+            if result.get('label') == 'nsfw' and result.get('score', 0) > self.threshold:
+                return False, UNSAFE_REASON
+        return True, None
+
+
+class StubServer:
+    """Local HTTP server answering like the NSFW model after `latency` seconds"""
+
+    def __init__(self, latency=0.05, unsafe_rate=0.0):
+        self.latency = latency
+        self.unsafe_rate = unsafe_rate
+        self._server = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://%s:%d/' % self.start().server_address[:2]
+
+    def start(self):
+        with self._lock:
+            if self._server is None:
+                stub = self
+
+                class Handler(BaseHTTPRequestHandler):
+                    protocol_version = 'HTTP/1.1'
+
+                    def do_POST(self):
+                        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                        time.sleep(stub.latency)
+                        body = json.dumps(simulated_scores(data, stub.unsafe_rate)).encode()
+                        self.send_response(200)
+                        self.send_header('Content-Type', 'application/json')
+                        self.send_header('Content-Length', str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+
+                    def log_message(self, format, *args):
+                        pass
+
+                self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+                self._server.daemon_threads = True
+                threading.Thread(target=self._server.serve_forever, name='classifier-stub', daemon=True).start()
+            return self._server
+
+    def stop(self):
+        with self._lock:
+            server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+class LocalServerClassifier(RemoteClassifier):
+    """RemoteClassifier against a StubServer it starts on first use"""
+
+    def __init__(self, latency=0.05, unsafe_rate=0.0, threshold=0.7):
+        super().__init__(url=None, threshold=threshold)
+        self.server = StubServer(latency, unsafe_rate)
+
+    def classify(self, data, timeout=None):
+        if self.url is None:
+            self.url = self.server.url
+        return super().classify(data, timeout)
+
+
+class FakeClassifier(ImageClassifier):
+    """In-process stand-in: waits `latency` seconds (or gives up at the timeout) and decides by hash"""
+
+    def __init__(self, latency=0.0, unsafe_rate=0.0):
+        self.latency = latency
+        self.unsafe_rate = unsafe_rate
+
+    def classify(self, data, timeout=None):
+        if timeout is not None and timeout < self.latency:
+            time.sleep(max(0, timeout))
+            raise ModerationUnavailable("NSFW detection error: timed out")
+        if self.latency:
+            time.sleep(self.latency)
+        nsfw = simulated_scores(data, self.unsafe_rate)[0]['score']
+        return (False, UNSAFE_REASON) if nsfw > 0.7 else (True, None)
@@ -0,0 +1,149 @@
+# post/comment_tree.py
+"""
+Comment threads rendered from one query.
+
+CommentTree.for_posts loads every comment of the given posts in a single
+query (author and profile joined in); CommentTree.for_comment loads a single
+comment's subtree by its thread path. Either way, parents are linked to
+children in one O(n) pass and nodes render straight to dicts in
+CommentSerializer's format. No serializer is instantiated per reply, and replies_count comes from the
+assembled tree instead of a COUNT per comment.
+
+Rendering stops COMMENT_TREE_MAX_DEPTH levels below the node asked for, and
+each node shows at most COMMENT_TREE_MAX_REPLIES replies. replies_count still
+reports the full number, so clients can tell a thread was cut short.
+
+comment_previews is the light version for feed cards: the first
+COMMENT_PREVIEW_SIZE top-level comments of each post on a page, picked with
+ROW_NUMBER() OVER (PARTITION BY post_id) in a single query.
+"""
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+from rest_framework import serializers
+from .models import Comment
+
+MAX_DEPTH = getattr(settings, 'COMMENT_TREE_MAX_DEPTH', 8)
+MAX_REPLIES = getattr(settings, 'COMMENT_TREE_MAX_REPLIES', 100)
+PREVIEW_SIZE = getattr(settings, 'COMMENT_PREVIEW_SIZE', 3)
+
+_datetime = serializers.DateTimeField()
+
+
+class CommentTree:
+    """Comments of one or more posts, linked parent to child in memory"""
+
+    def __init__(self, comments, post_ids=(), viewer=None, max_depth=MAX_DEPTH, max_replies=MAX_REPLIES):
+        self.post_ids = set(post_ids)
+        self.viewer_id = viewer.id if viewer is not None and viewer.is_authenticated else None
+        self.max_depth = max_depth
+        self.max_replies = max_replies
+        self.comments = {}
+        self.children = defaultdict(list)
+        self.roots = defaultdict(list)
+
+        # comments arrive oldest first, so each list keeps thread order
+        for comment in comments:
+            self.comments[comment.id] = comment
+            if comment.parent_id is None:
+                self.roots[comment.post_id].append(comment.id)
+            else:
+                self.children[comment.parent_id].append(comment.id)
+
+    @classmethod
+    def for_posts(cls, post_ids, viewer=None, **limits):
+        post_ids = set(post_ids)
+        comments = Comment.objects.filter(
+            post_id__in=post_ids
+        ).select_related('user__profile').annotate(
+            post_owner_id=F('post__user_id')
+        ).order_by('created_at', 'id')
+        return cls(comments, post_ids, viewer, **limits)
+
+    @classmethod
+    def for_comment(cls, comment, viewer=None, **limits):
+        """Just one comment and its replies, found by thread path instead of loading the whole post"""
+        if not comment.path:
+            return cls.for_posts([comment.post_id], viewer, **limits)
+        # One level past the rendered depth, so the deepest nodes still report replies_count
+        deepest = comment.depth + limits.get('max_depth', MAX_DEPTH) + 1
+        comments = Comment.objects.filter(
+            Q(pk=comment.pk) | Q(post_id=comment.post_id, path__startswith=f"{comment.path}/", depth__lte=deepest)
+        ).select_related('user__profile').annotate(
+            post_owner_id=F('post__user_id')
+        ).order_by('created_at', 'id')
+        return cls(comments, (), viewer, **limits)
+
+    def covers(self, post_id):
+        return post_id in self.post_ids
+
+    def render_post(self, post_id):
+        """Top-level comments of a post with their replies"""
+        return [self.render(comment_id) for comment_id in self.roots.get(post_id, [])]
+
+    def render(self, comment_id, depth=0):
+        """One comment and up to max_depth levels of its replies"""
+        comment = self.comments[comment_id]
+        children = self.children.get(comment_id, [])
+        replies = []
+        if depth < self.max_depth:
+            replies = [self.render(child_id, depth + 1) for child_id in children[:self.max_replies]]
+        return comment_data(comment, self.viewer_id, replies, len(children))
+
+
+def with_render_fields(comments):
+    """Load what comment_data needs for comments rendered outside a tree, replies_total included"""
+    replies_count = Comment.objects.filter(
+        parent=OuterRef('pk')
+    ).order_by().values('parent').annotate(c=Count('pk')).values('c')
+    return comments.select_related('user__profile').annotate(
+        post_owner_id=F('post__user_id'),
+        replies_total=Coalesce(Subquery(replies_count, output_field=IntegerField()), 0),
+    )
+
+
+def comment_previews(post_ids, viewer=None, size=PREVIEW_SIZE):
+    """First `size` top-level comments of each post, without replies, as {post_id: [comment dicts]}"""
+    post_ids = set(post_ids)
+    previews = {post_id: [] for post_id in post_ids}
+    if not post_ids or size <= 0:
+        return previews
+
+    comments = with_render_fields(
+        Comment.objects.filter(post_id__in=post_ids, parent__isnull=True)
+    ).annotate(
+        position=Window(RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').asc(), F('id').asc()]),
+    ).filter(position__lte=size).order_by('post_id', 'position')
+
+    viewer_id = viewer.id if viewer is not None and viewer.is_authenticated else None
+    for comment in comments:
+        previews[comment.post_id].append(comment_data(comment, viewer_id, [], comment.replies_total))
+    return previews
+
+
+def comment_data(comment, viewer_id, replies, replies_count):
+    """A comment as CommentSerializer outputs it; comment needs user__profile and post_owner_id loaded"""
+    is_author = viewer_id is not None and comment.user_id == viewer_id
+    return {
+        'id': comment.id,
+        'user': comment.user_id,
+        'user_name': comment.user.username,
+        'avatar': _avatar(comment.user),
+        'post': comment.post_id,
+        'parent': comment.parent_id,
+        'root': comment.root_id,
+        'depth': comment.depth,
+        'content': comment.content,
+        'created_at': _datetime.to_representation(comment.created_at),
+        'updated_at': _datetime.to_representation(comment.updated_at),
+        'replies': replies,
+        'replies_count': replies_count,
+        'can_edit': is_author,
+        'can_delete': is_author or (viewer_id is not None and comment.post_owner_id == viewer_id),
+    }
+
+
+def _avatar(user):
+    profile = getattr(user, 'profile', None)
+    return profile.avatar.url if profile is not None and profile.avatar else None
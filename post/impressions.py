@@ -0,0 +1,145 @@
+# post/impressions.py
+"""
+Buffered PostView (impression) writes.
+
+Feed requests append (user_id, post_id, viewed_at) to an in-process buffer
+instead of inserting PostView rows inline. A daemon thread flushes the
+buffer with one bulk_create when it reaches IMPRESSION_FLUSH_SIZE rows or
+every IMPRESSION_FLUSH_INTERVAL seconds, and whatever is left is drained at
+interpreter shutdown. Set IMPRESSION_BUFFER_ENABLED = False to write inline.
+"""
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import PostView
+
+logger = logging.getLogger(__name__)
+
+
+class ImpressionBuffer:
+    """Thread-safe impression queue with a background flusher"""
+
+    def __init__(self, flush_size=500, flush_interval=5.0, max_queue=50000):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._items = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopping = False
+
+        # Metrics
+        self.flushed_total = 0
+        self.flush_count = 0
+        self.dropped_total = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def record(self, user_id, post_ids):
+        viewed_at = timezone.now()
+        with self._lock:
+            self._items.extend((user_id, post_id, viewed_at) for post_id in post_ids)
+            overflow = len(self._items) - self.max_queue
+            if overflow > 0:
+                # Impressions are best-effort; shed the oldest instead of growing without bound
+                del self._items[:overflow]
+                self.dropped_total += overflow
+            depth = len(self._items)
+
+        self._ensure_started()
+        if depth >= self.flush_size:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='impression-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+            if not items:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                PostView.objects.bulk_create(
+                    [PostView(user_id=user_id, post_id=post_id, viewed_at=viewed_at)
+                     for user_id, post_id, viewed_at in items],
+                    batch_size=500,
+                    ignore_conflicts=True
+                )
+            except Exception:
+                logger.exception("Failed to flush %d impressions", len(items))
+                self.dropped_total += len(items)
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flush_count += 1
+            self.flushed_total += len(items)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return len(items)
+
+    def drain(self, timeout=5.0):
+        """Stop the flusher thread and write out anything still queued"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._items)
+        return {
+            'queue_depth': depth,
+            'flushed_total': self.flushed_total,
+            'flush_count': self.flush_count,
+            'dropped_total': self.dropped_total,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+            'avg_flush_ms': round(self._total_flush_ms / self.flush_count, 2) if self.flush_count else 0.0,
+        }
+
+
+buffer = ImpressionBuffer(
+    flush_size=getattr(settings, 'IMPRESSION_FLUSH_SIZE', 500),
+    flush_interval=getattr(settings, 'IMPRESSION_FLUSH_INTERVAL', 5.0),
+    max_queue=getattr(settings, 'IMPRESSION_MAX_QUEUE', 50000),
+)
+atexit.register(buffer.drain)
+
+
+def record_impressions(user_id, post_ids):
+    """Queue PostView rows for the posts a user was shown"""
+    if not post_ids:
+        return
+    if getattr(settings, 'IMPRESSION_BUFFER_ENABLED', True):
+        buffer.record(user_id, post_ids)
+    else:
+        PostView.objects.bulk_create(
+            [PostView(user_id=user_id, post_id=post_id) for post_id in post_ids],
+            ignore_conflicts=True
+        )
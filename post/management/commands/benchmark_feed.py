@@ -0,0 +1,142 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from community.models import Community
+from post.models import Post, Like, Comment, Share, Follow, Notification
+
+User = get_user_model()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "Time the feed endpoints against the current database and write a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of viewers to sample')
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per viewer per endpoint')
+        parser.add_argument('--output', default='benchmark_feed.json', help='Where to write the JSON report')
+        parser.add_argument('--compare', help='Previous report to diff against')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for viewer sampling')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_ids = list(User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        if not user_ids:
+            self.stderr.write("No users to benchmark with; run seed_social_graph first")
+            return
+        viewers = User.objects.filter(id__in=rng.sample(user_ids, min(options['users'], len(user_ids))))
+
+        samples = {}
+        for viewer in viewers:
+            client = APIClient()
+            client.force_authenticate(user=viewer)
+            for name, url in self._endpoints(rng, viewer):
+                for _ in range(options['repeat']):
+                    samples.setdefault(name, []).append(self._measure(client, url))
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'git_commit': self._git_commit(),
+            'database': connection.vendor,
+            'dataset': {
+                'users': len(user_ids),
+                'follows': Follow.objects.count(),
+                'communities': Community.objects.count(),
+                'posts': Post.objects.count(),
+                'likes': Like.objects.count(),
+                'comments': Comment.objects.count(),
+                'shares': Share.objects.count(),
+                'notifications': Notification.objects.count(),
+            },
+            'options': {'users': options['users'], 'repeat': options['repeat'], 'seed': options['seed']},
+            'results': {name: self._summarize(runs) for name, runs in samples.items()},
+        }
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<16} p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+                f"queries {result['queries_mean']:>6.1f} (max {result['queries_max']})"
+            )
+        if options['compare']:
+            self._compare(options['compare'], report)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def _endpoints(self, rng, viewer):
+        """(name, url) pairs for one viewer"""
+        endpoints = [
+            ('news_feed', '/api/posts/news_feed/'),
+            ('notifications', '/api/notifications/'),
+        ]
+
+        community = Community.objects.filter(
+            members__user=viewer, members__is_approved=True
+        ).values_list('name', flat=True).first()
+        if community is None:
+            community = Community.objects.filter(visibility='public').order_by('?').values_list('name', flat=True).first()
+        if community is not None:
+            endpoints.append(('community_posts', f'/api/posts/community_posts/?community={community}'))
+
+        author_ids = list(Follow.objects.filter(follower=viewer).values_list('following_id', flat=True)[:50])
+        author_id = rng.choice(author_ids) if author_ids else viewer.id
+        endpoints.append(('user_posts', f'/api/posts/user_posts/?user_id={author_id}'))
+        return endpoints
+
+    def _measure(self, client, url):
+        # The debug query log is capped; start each request with an empty one so counts stay exact
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            self.stderr.write(f"{url} returned {response.status_code}")
+        return elapsed_ms, len(queries)
+
+    def _summarize(self, runs):
+        timings = [elapsed for elapsed, _ in runs]
+        queries = [count for _, count in runs]
+        return {
+            'requests': len(runs),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'max_ms': round(max(timings), 2),
+            'queries_mean': round(statistics.mean(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, path, report):
+        with open(path) as f:
+            previous = json.load(f)
+        self.stdout.write(f"\nCompared with {previous.get('git_commit') or path}:")
+        for name, result in report['results'].items():
+            before = previous.get('results', {}).get(name)
+            if not before:
+                continue
+            p50_delta = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            query_delta = result['queries_mean'] - before['queries_mean']
+            self.stdout.write(f"{name:<16} p50 {p50_delta:+7.1f}%  queries {query_delta:+7.1f}")
@@ -0,0 +1,117 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from post.classifiers import FakeClassifier, LocalServerClassifier, RemoteClassifier
+from post.models import ModerationVerdict
+from post.moderation import moderate_post
+from post.verdict_cache import image_key, perceptual_key, text_key
+from .benchmark_feed import percentile
+
+BACKENDS = {
+    'fake': lambda options: FakeClassifier(latency=options['latency'], unsafe_rate=options['unsafe_rate']),
+    'stub-server': lambda options: LocalServerClassifier(latency=options['latency'], unsafe_rate=options['unsafe_rate']),
+    'remote': lambda options: RemoteClassifier(),
+}
+
+
+class Command(BaseCommand):
+    help = "Push generated posts through moderate_post and report latency and throughput per concurrency setting"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help='Posts per concurrency setting')
+        parser.add_argument('--images', type=int, default=4, help='Images per post')
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='stub-server')
+        parser.add_argument('--latency', type=float, default=0.1, help='Seconds per image check (fake and stub-server)')
+        parser.add_argument('--unsafe-rate', type=float, default=0.0, help='Share of images the stand-ins flag')
+        parser.add_argument('--concurrency', default='1,4,10', help='Comma-separated image worker counts to try')
+        parser.add_argument('--post-workers', type=int, default=1, help='Posts moderated at once (like MODERATION_WORKERS)')
+        parser.add_argument('--output', help='Also write the results as JSON here')
+        parser.add_argument('--keep-verdicts', action='store_true', help="Don't delete the cached verdicts the run creates")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError("--concurrency takes comma-separated integers, e.g. 1,4,10")
+        rng = random.Random(options['seed'])
+        classifier = BACKENDS[options['backend']](options)
+
+        results, keys = [], set()
+        for level in levels:
+            # Fresh content for every level, so nothing is answered from the verdict cache
+            posts = [self._post(rng, level, i, options['images']) for i in range(options['posts'])]
+            for title, content, images in posts:
+                keys.update([text_key(title), text_key(content)])
+                for data in images:
+                    keys.update(filter(None, [image_key(data), perceptual_key(data)]))
+            results.append(self._run(classifier, posts, level, options['post_workers']))
+
+        if not options['keep_verdicts']:
+            ModerationVerdict.objects.filter(key__in=keys).delete()
+        if hasattr(classifier, 'server'):
+            classifier.server.stop()
+
+        self.stdout.write(
+            f"{options['posts']} posts x {options['images']} images, backend {options['backend']}"
+            + (f", {options['latency'] * 1000:.0f} ms per image" if options['backend'] != 'remote' else '')
+            + f", {options['post_workers']} post worker(s)"
+        )
+        self.stdout.write(f"{'image workers':>14}{'p50 ms':>10}{'p95 ms':>10}{'posts/s':>10}{'rejected':>10}")
+        for result in results:
+            self.stdout.write(
+                f"{result['image_workers']:>14}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                f"{result['posts_per_second']:>10.2f}{result['rejected']:>10}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {
+                    name: options[name] for name in ('posts', 'images', 'backend', 'latency', 'unsafe_rate', 'post_workers')
+                }, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def _post(self, rng, level, index, images):
+        title = f"Benchmark post {level}-{index}-{rng.getrandbits(32):08x}"
+        content = f"Moderation benchmark run {rng.getrandbits(64):016x}, checking how long a post waits for review"
+        return title, content, [self._image(rng) for _ in range(images)]
+
+    def _image(self, rng):
+        buffer = BytesIO()
+        Image.frombytes('RGB', (64, 64), rng.randbytes(64 * 64 * 3)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def _run(self, classifier, posts, image_workers, post_workers):
+        def moderate(post):
+            title, content, images = post
+            files = [ContentFile(data, name=f'image{i}.png') for i, data in enumerate(images)]
+            started = time.perf_counter()
+            try:
+                is_approved, _ = moderate_post(title, content, files, classifier=classifier, executor=executor)
+            finally:
+                close_old_connections()
+            return (time.perf_counter() - started) * 1000, is_approved
+
+        with ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix='bench-image') as executor:
+            started = time.perf_counter()
+            if post_workers > 1:
+                with ThreadPoolExecutor(max_workers=post_workers, thread_name_prefix='bench-post') as posts_pool:
+                    runs = list(posts_pool.map(moderate, posts))
+            else:
+                runs = [moderate(post) for post in posts]
+            elapsed = time.perf_counter() - started
+
+        timings = [timing for timing, _ in runs]
+        return {
+            'image_workers': image_workers,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'posts_per_second': round(len(posts) / elapsed, 2),
+            'rejected': sum(1 for _, is_approved in runs if not is_approved),
+        }
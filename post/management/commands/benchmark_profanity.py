@@ -0,0 +1,79 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+from post.profanity import ProfanityMatcher
+
+FILLER = (
+    "the a to and of in is it you that was for on are with as be this have from at or one had by word "
+    "but not what all were we when your can said there use an each which she do how their if will up "
+    "other about out many then them these so some her would make like him into time has look two more "
+    "post photo today weekend music class assassin scunthorpe bass glass cocktail analysis grape"
+).split()
+SEPARATORS = [' '] * 12 + [', ', '. ', '\n', ' - ', '!', '?']
+LEET = {'a': '@4', 'i': '1!', 'o': '0', 'e': '3', 's': '$5', 't': '7'}
+
+
+class Command(BaseCommand):
+    help = "Compare profanity check throughput (MB/s) of better_profanity and the compiled matcher"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--texts', type=int, default=200, help='Number of post-sized texts in the corpus')
+        parser.add_argument('--profane-rate', type=float, default=0.02, help='Share of words taken from the wordlist')
+        parser.add_argument('--repeat', type=int, default=1, help='Timed passes per implementation (best is kept)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = list(read_wordlist(get_complete_path_of_file('profanity_wordlist.txt')))
+        texts = [self._text(rng, words, options['profane_rate']) for _ in range(options['texts'])]
+        megabytes = sum(len(text.encode('utf-8')) for text in texts) / 1e6
+
+        started = time.perf_counter()
+        from better_profanity import profanity
+        profanity.load_censor_words()
+        baseline_build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matcher = ProfanityMatcher(words)
+        compiled_build = time.perf_counter() - started
+
+        baseline, baseline_results = self._time(profanity.contains_profanity, texts, options['repeat'])
+        compiled, compiled_results = self._time(matcher.contains_profanity, texts, options['repeat'])
+
+        mismatches = [text for text, a, b in zip(texts, baseline_results, compiled_results) if a != b]
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} texts disagree, e.g. {mismatches[0]!r}")
+
+        self.stdout.write(
+            f"Corpus: {len(texts)} texts, {megabytes:.2f} MB, {sum(compiled_results)} profane"
+        )
+        self.stdout.write(f"{'implementation':<18}{'build s':>10}{'check s':>10}{'MB/s':>10}")
+        for name, build, elapsed in (
+            ('better_profanity', baseline_build, baseline),
+            ('compiled', compiled_build, compiled),
+        ):
+            self.stdout.write(f"{name:<18}{build:>10.3f}{elapsed:>10.3f}{megabytes / elapsed:>10.3f}")
+        self.stdout.write(self.style.SUCCESS(f"Results identical; compiled matcher is {baseline / compiled:.0f}x faster"))
+
+    def _text(self, rng, words, profane_rate):
+        parts = []
+        for _ in range(rng.randint(10, 80)):
+            if rng.random() < profane_rate:
+                word = rng.choice(words)
+                if rng.random() < 0.5:
+                    word = ''.join(rng.choice(LEET[c]) if c in LEET and rng.random() < 0.5 else c for c in word)
+            else:
+                word = rng.choice(FILLER)
+            parts.append(word.capitalize() if rng.random() < 0.1 else word)
+            parts.append(rng.choice(SEPARATORS))
+        return ''.join(parts).strip()
+
+    def _time(self, check, texts, repeat):
+        best, results = None, None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            results = [check(text) for text in texts]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, results
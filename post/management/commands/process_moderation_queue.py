@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from post.models import ModerationJob
+from post.moderation_queue import process_job, requeue_stale, retry_failed
+
+
+class Command(BaseCommand):
+    help = "Run queued post moderation jobs (e.g. ones left behind by a restarted web process)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=10,
+            help="Requeue jobs that have been 'running' longer than this"
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Queue jobs that used up their attempts again (e.g. after a classifier outage)'
+        )
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running, polling the queue every N seconds'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f"Queued {retry_failed()} failed jobs again")
+        while True:
+            requeued = requeue_stale(timedelta(minutes=options['stale_minutes']))
+            job_ids = list(ModerationJob.objects.filter(
+                status='queued'
+            ).order_by('created_at').values_list('id', flat=True)[:options['batch_size']])
+
+            processed = sum(1 for job_id in job_ids if process_job(job_id) is not None)
+            self.stdout.write(self.style.SUCCESS(f"Moderated {processed} posts, requeued {requeued} stale jobs"))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
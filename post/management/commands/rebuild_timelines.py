@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from post.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from follows and community memberships"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, action='append', help='Only rebuild these users (repeatable)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['user_id']:
+            users = users.filter(id__in=options['user_id'])
+
+        rebuilt = 0
+        for user in users.iterator(chunk_size=500):
+            rebuild_timeline(user)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from post.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recount likes/comments/shares and fix drifted Post engagement counters in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        fields = ['likes_count', 'comments_count', 'shares_count', 'engagement_score']
+
+        checked = 0
+        fixed = 0
+        last_id = 0
+        while True:
+            # One query per batch: stored counters next to live subquery counts
+            posts = list(
+                Post.objects.filter(id__gt=last_id).order_by('id').only('id', *fields).with_engagement()[:batch_size]
+            )
+            if not posts:
+                break
+            last_id = posts[-1].id
+
+            drifted = []
+            for post in posts:
+                actual = (post.live_likes, post.live_comments, post.live_shares, post.live_engagement)
+                stored = (post.likes_count, post.comments_count, post.shares_count, post.engagement_score)
+                if stored != actual:
+                    post.likes_count, post.comments_count, post.shares_count, post.engagement_score = actual
+                    drifted.append(post)
+
+            if drifted and not dry_run:
+                Post.objects.bulk_update(drifted, fields)
+
+            checked += len(posts)
+            fixed += len(drifted)
+
+        verb = "would fix" if dry_run else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, {verb} {fixed}"))
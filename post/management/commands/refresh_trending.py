@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from post.trending import refresh_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute hot scores for recently touched posts into the PostScore table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rescore every post in the trending window')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running, refreshing every N seconds (for deployments without cron)'
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            updated, pruned = refresh_scores(full=full, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Scored {updated} posts, pruned {pruned}"))
+            if not options['interval']:
+                break
+            full = False
+            time.sleep(options['interval'])
@@ -0,0 +1,223 @@
+import random
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import Profile
+from community.models import Community, CommunityMember
+from post.models import Post, Like, Comment, Share, Follow, PostView, Notification
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic social graph (users, follows, communities, posts and interactions) for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--avg-follows', type=int, default=30, help='Average follows per user')
+        parser.add_argument('--follow-skew', type=float, default=1.2, help='Power-law exponent for who gets followed')
+        parser.add_argument('--communities', type=int, default=50)
+        parser.add_argument('--avg-memberships', type=int, default=5, help='Average communities joined per user')
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--community-post-ratio', type=float, default=0.4)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--shares', type=int, default=5000)
+        parser.add_argument('--views', type=int, default=50000)
+        parser.add_argument('--notifications', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=30, help='Spread post creation times over this many days')
+        parser.add_argument('--prefix', default='seed', help='Username/community name prefix')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible graphs')
+        parser.add_argument('--skip-timelines', action='store_true', help="Don't materialize home timelines afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        now = timezone.now()
+
+        with transaction.atomic():
+            user_ids = self._create_users(options['users'], prefix)
+            self._create_follows(rng, user_ids, options['avg_follows'], options['follow_skew'])
+            community_ids = self._create_communities(rng, user_ids, options['communities'], prefix)
+            memberships = self._create_memberships(rng, user_ids, community_ids, options['avg_memberships'])
+            post_ids = self._create_posts(
+                rng, user_ids, memberships, options['posts'], options['community_post_ratio'], options['days'], now
+            )
+            # Popular posts draw most of the interactions
+            weights = self._zipf_weights(len(post_ids), 1.0)
+            self._create_pairs(rng, Like, user_ids, post_ids, weights, options['likes'], unique=True)
+            self._create_comments(rng, user_ids, post_ids, weights, options['comments'])
+            self._create_pairs(rng, Share, user_ids, post_ids, weights, options['shares'], unique=False)
+            self._create_pairs(rng, PostView, user_ids, post_ids, weights, options['views'], unique=True)
+            self._create_notifications(rng, user_ids, post_ids, weights, options['notifications'])
+
+        self.stdout.write("Reconciling counters, trending scores and timelines...")
+        call_command('reconcile_post_counters', stdout=self.stdout)
+        call_command('refresh_trending', full=True, stdout=self.stdout)
+        if not options['skip_timelines']:
+            call_command('rebuild_timelines', user_id=user_ids, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Seeding complete"))
+
+    def _zipf_weights(self, n, skew):
+        return [1 / (rank ** skew) for rank in range(1, n + 1)]
+
+    def _create_users(self, count, prefix):
+        password = make_password(None)
+        start = User.objects.filter(username__startswith=f'{prefix}_user_').count()
+        users = [
+            User(username=f'{prefix}_user_{i}', email=f'{prefix}_user_{i}@example.com', password=password, username_set=True)
+            for i in range(start, start + count)
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        user_ids = list(User.objects.filter(
+            username__in=[u.username for u in users]
+        ).values_list('id', flat=True))
+        # bulk_create skips the post_save signal that normally creates profiles
+        Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], batch_size=BATCH_SIZE)
+        self.stdout.write(f"Created {len(user_ids)} users")
+        return user_ids
+
+    def _create_follows(self, rng, user_ids, avg_follows, skew):
+        # Shuffle so "celebrities" are spread across IDs, then follow with power-law popularity
+        popularity = user_ids[:]
+        rng.shuffle(popularity)
+        weights = self._zipf_weights(len(popularity), skew)
+        follows = set()
+        for follower in user_ids:
+            count = min(len(user_ids) - 1, max(0, int(rng.expovariate(1 / avg_follows)))) if avg_follows else 0
+            for following in rng.choices(popularity, weights=weights, k=count):
+                if following != follower:
+                    follows.add((follower, following))
+        Follow.objects.bulk_create(
+            [Follow(follower_id=a, following_id=b) for a, b in follows],
+            batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        self.stdout.write(f"Created {len(follows)} follows")
+
+    def _create_communities(self, rng, user_ids, count, prefix):
+        start = Community.objects.filter(name__startswith=f'{prefix}_c').count()
+        communities = [
+            Community(
+                name=f'{prefix}_c{i}',
+                title=f'Community {i}',
+                visibility=rng.choices(['public', 'restricted', 'private'], weights=[8, 1, 1])[0],
+                created_by_id=rng.choice(user_ids),
+                members_count=0,
+            )
+            for i in range(start, start + count)
+        ]
+        Community.objects.bulk_create(communities, batch_size=BATCH_SIZE)
+        community_ids = list(Community.objects.filter(
+            name__in=[c.name for c in communities]
+        ).values_list('id', flat=True))
+        self.stdout.write(f"Created {len(community_ids)} communities")
+        return community_ids
+
+    def _create_memberships(self, rng, user_ids, community_ids, avg_memberships):
+        if not community_ids:
+            return {}
+        weights = self._zipf_weights(len(community_ids), 1.0)
+        memberships = {}
+        for user_id in user_ids:
+            count = min(len(community_ids), int(rng.expovariate(1 / avg_memberships))) if avg_memberships else 0
+            joined = set(rng.choices(community_ids, weights=weights, k=count))
+            if joined:
+                memberships[user_id] = list(joined)
+
+        rows = [
+            CommunityMember(user_id=user_id, community_id=community_id, is_approved=True)
+            for user_id, joined in memberships.items()
+            for community_id in joined
+        ]
+        CommunityMember.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+        # bulk_create skips CommunityMember.save(), so set members_count directly
+        counts = {}
+        for row in rows:
+            counts[row.community_id] = counts.get(row.community_id, 0) + 1
+        for community_id, members in counts.items():
+            Community.objects.filter(pk=community_id).update(members_count=members)
+        self.stdout.write(f"Created {len(rows)} community memberships")
+        return memberships
+
+    def _create_posts(self, rng, user_ids, memberships, count, community_ratio, days, now):
+        posts = []
+        for i in range(count):
+            user_id = rng.choice(user_ids)
+            community_id = None
+            if memberships.get(user_id) and rng.random() < community_ratio:
+                community_id = rng.choice(memberships[user_id])
+            posts.append(Post(
+                user_id=user_id,
+                community_id=community_id,
+                title=f'Seeded post {i}',
+                post_type='text',
+                content=f'Synthetic content for post {i}',
+                status='approved',
+            ))
+        Post.objects.bulk_create(posts, batch_size=BATCH_SIZE)
+
+        # created_at is auto_now_add, so spread the timestamps afterwards
+        created = list(Post.objects.filter(
+            title__startswith='Seeded post ', created_at__gte=now
+        ).only('id', 'created_at'))
+        for post in created:
+            post.created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        Post.objects.bulk_update(created, ['created_at'], batch_size=BATCH_SIZE)
+        self.stdout.write(f"Created {len(created)} posts")
+        return [post.id for post in created]
+
+    def _create_pairs(self, rng, model, user_ids, post_ids, weights, count, unique):
+        if not post_ids or not count:
+            return
+        pairs = zip(
+            rng.choices(user_ids, k=count),
+            rng.choices(post_ids, weights=weights, k=count)
+        )
+        if unique:
+            pairs = set(pairs)
+        rows = [model(user_id=user_id, post_id=post_id) for user_id, post_id in pairs]
+        model.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=unique)
+        self.stdout.write(f"Created {len(rows)} {model._meta.verbose_name_plural}")
+
+    def _create_comments(self, rng, user_ids, post_ids, weights, count):
+        if not post_ids or not count:
+            return
+        comments = [
+            Comment(user_id=user_id, post_id=post_id, content='Synthetic comment')
+            for user_id, post_id in zip(
+                rng.choices(user_ids, k=count),
+                rng.choices(post_ids, weights=weights, k=count)
+            )
+        ]
+        Comment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+        # bulk_create skips Comment.save, which sets the thread fields
+        Comment.fill_thread_fields(Comment.objects.filter(path='').only('id', 'parent_id'))
+        self.stdout.write(f"Created {len(comments)} comments")
+
+    def _create_notifications(self, rng, user_ids, post_ids, weights, count):
+        if not post_ids or not count:
+            return
+        authors = dict(Post.objects.filter(id__in=post_ids).values_list('id', 'user_id'))
+        notifications = [
+            Notification(
+                recipient_id=authors[post_id],
+                sender_id=sender_id,
+                notification_type=rng.choice(['like', 'comment', 'share']),
+                post_id=post_id,
+                is_read=rng.random() < 0.5,
+            )
+            for sender_id, post_id in zip(
+                rng.choices(user_ids, k=count),
+                rng.choices(post_ids, weights=weights, k=count)
+            )
+            if authors[post_id] != sender_id
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+        self.stdout.write(f"Created {len(notifications)} notifications")
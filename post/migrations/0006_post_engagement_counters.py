@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:51
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+
+    def count_of(model_name):
+        model = apps.get_model('post', model_name)
+        counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(c=Count('pk')).values('c')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Post.objects.update(
+        likes_count=count_of('Like'),
+        comments_count=count_of('Comment'),
+        shares_count=count_of('Share'),
+    )
+    Post.objects.update(
+        engagement_score=models.F('likes_count') + models.F('comments_count') * 2 + models.F('shares_count') * 3
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0005_post_is_pinned'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='engagement_score',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='shares_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
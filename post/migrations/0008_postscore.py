@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0002_communityinvitation_communityjoinrequest_and_more'),
+        ('post', '0007_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='post.post')),
+                ('created_at', models.DateTimeField(help_text='Creation time of the post')),
+                ('engagement_score', models.PositiveIntegerField(default=0)),
+                ('hot_score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Start time of the refresh that wrote this row')),
+                ('community', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='community.community')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-hot_score'], name='post_postsc_hot_sco_6e2c15_idx'), models.Index(fields=['community', '-hot_score'], name='post_postsc_communi_7201f5_idx'), models.Index(fields=['created_at'], name='post_postsc_created_a7c73e_idx'), models.Index(fields=['updated_at'], name='post_postsc_updated_b822dd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_postscore'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
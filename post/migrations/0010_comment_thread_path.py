@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+PATH_SEGMENT_WIDTH = 10
+
+
+def backfill_threads(apps, schema_editor):
+    Comment = apps.get_model('post', 'Comment')
+    # (root_id, depth, path) by comment ID; parents have lower IDs, so they're filled first
+    threads = {}
+    batch = []
+    for comment in Comment.objects.order_by('id').only('id', 'parent_id').iterator(chunk_size=2000):
+        segment = str(comment.id).zfill(PATH_SEGMENT_WIDTH)
+        if comment.parent_id is None:
+            threads[comment.id] = (comment.id, 0, segment)
+        else:
+            root_id, depth, path = threads[comment.parent_id]
+            threads[comment.id] = (root_id, depth + 1, f"{path}/{segment}")
+        comment.root_id, comment.depth, comment.path = threads[comment.id]
+        batch.append(comment)
+        if len(batch) >= 2000:
+            Comment.objects.bulk_update(batch, ['root', 'depth', 'path'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['root', 'depth', 'path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0009_alter_postview_viewed_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='post.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='post_commen_post_id_c2d916_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'path'], name='post_commen_parent__eec5d6_idx'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0010_comment_thread_path'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('like', 'Like'), ('comment', 'Comment'), ('share', 'Share'), ('follow', 'Follow'), ('community_invite', 'Community Invitation'), ('community_join_request', 'Join Request'), ('community_join_approved', 'Join Approved'), ('community_post', 'New Community Post'), ('community_role_changed', 'Role Changed'), ('post_approved', 'Post Approved'), ('post_rejected', 'Post Rejected')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='ModerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('approved_status', models.CharField(default='approved', help_text='Post status to set when the content passes (private community posts stay pending)', max_length=10)),
+                ('verdict', models.CharField(blank=True, choices=[('approved', 'Approved'), ('rejected', 'Rejected')], max_length=10)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='moderation_job', to='post.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='post_modera_status_668362_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0011_moderationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationVerdict',
+            fields=[
+                ('key', models.CharField(help_text='"<kind>:<hash>", e.g. image:<sha256>', max_length=80, primary_key=True, serialize=False)),
+                ('is_safe', models.BooleanField()),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='post_modera_last_us_ffca95_idx'), models.Index(fields=['expires_at'], name='post_modera_expires_e7136d_idx')],
+            },
+        ),
+    ]
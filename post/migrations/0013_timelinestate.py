@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_built_timelines(apps, schema_editor):
+    # Timelines that already have entries were built by the old "rebuild when empty" check
+    TimelineEntry = apps.get_model('post', 'TimelineEntry')
+    TimelineState = apps.get_model('post', 'TimelineState')
+    user_ids = TimelineEntry.objects.values_list('user_id', flat=True).distinct()
+    TimelineState.objects.bulk_create([TimelineState(user_id=user_id) for user_id in user_ids.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_alter_profile_options_profile_subcategories_and_more'),
+        ('post', '0012_moderationverdict'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(mark_built_timelines, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,34 @@
 from django.db import models
+from django.db.models import F, Q, Count, OuterRef, Subquery
+from django.db.models.functions import Greatest, Coalesce
 from django.conf import settings
+from django.utils import timezone
 from ckeditor.fields import RichTextField
 from community.models import *
 
 """ Post Models """
+def _related_count(model):
+    """Correlated COUNT subquery over a model with a `post` FK"""
+    counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(c=Count('pk')).values('c')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+class PostQuerySet(models.QuerySet):
+    def with_engagement(self):
+        """
+        Annotate live like/comment/share counts as correlated subqueries.
+        Unlike Count('likes') + Count('comments') + ..., this never joins the
+        reverse relations together, so rows don't multiply and counts aren't inflated.
+        """
+        return self.annotate(
+            live_likes=_related_count(Like),
+            live_comments=_related_count(Comment),
+            live_shares=_related_count(Share),
+        ).annotate(
+            live_engagement=F('live_likes') * 1 + F('live_comments') * 2 + F('live_shares') * 3
+        )
+
+
 class Post(models.Model):
     """ Post model for Posts """
     POST_TYPE_CHOICES = [
@@ -40,6 +65,21 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized engagement counters, kept in sync by adjust_counter()
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    shares_count = models.PositiveIntegerField(default=0)
+    engagement_score = models.PositiveIntegerField(default=0)
+
+    # Weight of each counter in engagement_score
+    ENGAGEMENT_WEIGHTS = {
+        'likes_count': 1,
+        'comments_count': 2,
+        'shares_count': 3,
+    }
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['-created_at', 'status']),
@@ -47,20 +87,26 @@ class Post(models.Model):
         ]
         # speeds up queries like,
         # Post.objects.filter(status='approved').order_by('-created_at')
-        
-    def likes_count(self):
-        return self.likes.count()
-    # Creates a reverse relationship from Post back to that model --> Like Model e 
-    # related name hisebe like use kora ache
 
-    def comments_count(self):
-        return self.comments.count()
+    @classmethod
+    def adjust_counter(cls, post_id, field, delta):
+        """Atomically shift a stored counter (and engagement_score) by delta"""
+        weight = cls.ENGAGEMENT_WEIGHTS[field]
+        cls.objects.filter(pk=post_id).update(**{
+            field: Greatest(F(field) + delta, 0),
+            'engagement_score': Greatest(F('engagement_score') + delta * weight, 0),
+        })
 
-    def shares_count(self):
-        return self.shares.count()
-    
-    def engagement_score(self):
-        return (self.likes.count() * 1) + (self.comments.count() * 2) + (self.shares.count() * 3)
+    def update_counters(self):
+        """Recount likes, comments and shares and store them"""
+        self.likes_count = self.likes.count()
+        self.comments_count = self.comments.count()
+        self.shares_count = self.shares.count()
+        self.engagement_score = self.compute_engagement_score()
+        self.save(update_fields=['likes_count', 'comments_count', 'shares_count', 'engagement_score'])
+
+    def compute_engagement_score(self):
+        return sum(getattr(self, field) * weight for field, weight in self.ENGAGEMENT_WEIGHTS.items())
 
     def __str__(self):
         return f"{self.title} by {self.user.username}"
@@ -85,6 +131,11 @@ class Like(models.Model):
 
 class Comment(models.Model):
     """ Comment model for Posts """
+    # Width of one path segment; paths sort comments depth-first in thread order
+    PATH_SEGMENT_WIDTH = 10
+    PATH_MAX_LENGTH = 255
+    MAX_DEPTH = (PATH_MAX_LENGTH + 1) // (PATH_SEGMENT_WIDTH + 1) - 1
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
@@ -92,16 +143,73 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Thread position, set on insert: top-level ancestor (itself for a root), nesting level,
+    # and the ancestors' zero-padded IDs joined by '/', ending with its own
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    depth = models.PositiveIntegerField(default=0)
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, default='')
+
     class Meta:
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['post', 'created_at']),
             models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['post', 'path']),
+            models.Index(fields=['parent', 'path']),
         ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.post.title}"
 
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        if creating and self.parent_id:
+            parent = self.parent
+            self.root_id = parent.root_id
+            self.depth = parent.depth + 1
+        super().save(*args, **kwargs)
+        if creating:
+            # The path ends with this comment's own ID, known only after the insert
+            self.root_id = self.root_id or self.pk
+            self.path = self.thread_path(self.parent.path if self.parent_id else '', self.pk)
+            Comment.objects.filter(pk=self.pk).update(root_id=self.root_id, path=self.path)
+
+    @classmethod
+    def thread_path(cls, parent_path, comment_id):
+        segment = str(comment_id).zfill(cls.PATH_SEGMENT_WIDTH)
+        return f"{parent_path}/{segment}" if parent_path else segment
+
+    @classmethod
+    def fill_thread_fields(cls, comments):
+        """Set root, depth and path on comments saved without them (e.g. by bulk_create)"""
+        comments = sorted(comments, key=lambda comment: comment.pk)
+        known = {}
+        missing_parents = {c.parent_id for c in comments if c.parent_id} - {c.pk for c in comments}
+        for parent in cls.objects.filter(pk__in=missing_parents).only('root_id', 'depth', 'path'):
+            known[parent.pk] = parent
+
+        # Parents always have lower IDs than their replies, so one pass in ID order sees them first
+        for comment in comments:
+            parent = known.get(comment.parent_id)
+            comment.root_id = parent.root_id if parent else comment.pk
+            comment.depth = parent.depth + 1 if parent else 0
+            comment.path = cls.thread_path(parent.path if parent else '', comment.pk)
+            known[comment.pk] = comment
+        cls.objects.bulk_update(comments, ['root', 'depth', 'path'], batch_size=1000)
+
+    def subtree_size(self):
+        """Number of comments removed when this one is deleted (itself plus all nested replies)"""
+        if self.path:
+            return Comment.objects.filter(
+                Q(pk=self.pk) | Q(post_id=self.post_id, path__startswith=f"{self.path}/")
+            ).count()
+        size = 1
+        frontier = [self.pk]
+        while frontier:
+            frontier = list(Comment.objects.filter(parent_id__in=frontier).values_list('id', flat=True))
+            size += len(frontier)
+        return size
+
 class Share(models.Model):
     """ Share model for Posts """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -154,6 +262,8 @@ class Notification(models.Model):
         ('community_join_approved', 'Join Approved'),
         ('community_post', 'New Community Post'),
         ('community_role_changed', 'Role Changed'),
+        ('post_approved', 'Post Approved'),
+        ('post_rejected', 'Post Rejected'),
     ]
 
     recipient = models.ForeignKey(
@@ -199,7 +309,8 @@ class PostView(models.Model):
     """ PostView model for Posts """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='post_views')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='views')
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered impressions keep the time they were shown, not the flush time
+    viewed_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ('user', 'post')
@@ -210,5 +321,108 @@ class PostView(models.Model):
 
     def __str__(self):
         return f"{self.user.username} viewed {self.post.title}"
-    
+
+
+class TimelineEntry(models.Model):
+    """ Materialized home-timeline row, written when a post is fanned out """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    score = models.FloatField(help_text='Sort key: the post creation time as a unix timestamp')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-score']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
+
+
+class TimelineState(models.Model):
+    """ Marks a user's home timeline as built, so an empty timeline isn't rebuilt on every read """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='timeline_state')
+    built_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Timeline of user {self.user_id} built at {self.built_at}"
+
+
+class PostScore(models.Model):
+    """ Precomputed hot score for recent approved posts, refreshed by refresh_trending """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending_score')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    community = models.ForeignKey('community.Community', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(help_text='Creation time of the post')
+    engagement_score = models.PositiveIntegerField(default=0)
+    hot_score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now, help_text='Start time of the refresh that wrote this row')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-hot_score']),
+            models.Index(fields=['community', '-hot_score']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} hot score {self.hot_score:.3f}"
+
+
+class ModerationJob(models.Model):
+    """ Queued content check for a new post; processed by the moderation worker pool """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    VERDICT_CHOICES = [
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+    ]
+
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='moderation_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    approved_status = models.CharField(
+        max_length=10, default='approved',
+        help_text='Post status to set when the content passes (private community posts stay pending)'
+    )
+    verdict = models.CharField(max_length=10, choices=VERDICT_CHOICES, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Moderation of post {self.post_id}: {self.status}"
+
+
+class ModerationVerdict(models.Model):
+    """ Cached classifier verdict for a piece of content, keyed by its content hash """
+    key = models.CharField(max_length=80, primary_key=True, help_text='"<kind>:<hash>", e.g. image:<sha256>')
+    is_safe = models.BooleanField()
+    reason = models.CharField(max_length=255, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_used_at']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {'safe' if self.is_safe else 'unsafe'}"
+
 """ End of Post Models """
\ No newline at end of file
@@ -1,14 +1,35 @@
 # posts/moderation.py
-from better_profanity import profanity
-import requests
-import base64
-from io import BytesIO
-from PIL import Image
-import tempfile
 import os
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .classifiers import ModerationUnavailable, RemoteClassifier, read_image
+from .verdict_cache import verdicts, text_key, image_key, perceptual_key
+from .profanity import contains_profanity
 
-# Initialize profanity filter
-profanity.load_censor_words()
+logger = logging.getLogger(__name__)
+
+# Image checks run concurrently, bounded by MODERATION_IMAGE_WORKERS, and a
+# post's checks all share one MODERATION_DEADLINE (seconds)
+IMAGE_WORKERS = getattr(settings, 'MODERATION_IMAGE_WORKERS', 10)
+DEADLINE = getattr(settings, 'MODERATION_DEADLINE', 30)
+
+_executor = None
+_classifiers = {}
+_lock = threading.Lock()
+_remote = RemoteClassifier()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image-check')
+    return _executor
 
 
 def check_text_content(text):
@@ -20,79 +41,152 @@ def check_text_content(text):
         return True, None
     
     # Check for profanity
-    if profanity.contains_profanity(text):
+    if contains_profanity(text):
         return False, "Text contains inappropriate language"
     
     return True, None
 
 
-def check_image_content(image_file):
+def check_image_content(image_file, timeout=30):
     """
     Check if image contains NSFW content using Hugging Face API (Free)
     Returns: (is_safe, reason)
+    Raises ModerationUnavailable when the API can't give an answer
+    """
+    return _remote(image_file, timeout)
+
+
+def stub_image_classifier(image_file, timeout=None):
+    """
+    Offline stand-in for check_image_content, for tests and local development.
+    Flags images whose file name or bytes contain "nsfw" (stored media is
+    content-addressed, so the uploaded name may be gone); everything else passes.
+    Returns: (is_safe, reason)
+    """
+    name = getattr(image_file, 'name', image_file) or ''
+    if 'nsfw' in os.path.basename(str(name)).lower() or b'nsfw' in read_image(image_file).lower():
+        return False, "Image contains inappropriate content"
+    return True, None
+
+
+def get_image_classifier():
+    """
+    The image check named by MODERATION_IMAGE_CLASSIFIER (a dotted path). Classes
+    are instantiated once with MODERATION_IMAGE_CLASSIFIER_OPTIONS (see post.classifiers).
+    """
+    path = getattr(settings, 'MODERATION_IMAGE_CLASSIFIER', 'post.moderation.check_image_content')
+    options = getattr(settings, 'MODERATION_IMAGE_CLASSIFIER_OPTIONS', {})
+    cache_key = (path, tuple(sorted(options.items())))
+    classifier = _classifiers.get(cache_key)
+    if classifier is None:
+        backend = import_string(path)
+        if isinstance(backend, type):
+            backend = backend(**options)
+        with _lock:
+            classifier = _classifiers.setdefault(cache_key, backend)
+    return classifier
+
+
+def cached_text_check(text):
+    """check_text_content through the verdict cache"""
+    if not text:
+        return True, None
+    key = text_key(text)
+    verdict = verdicts.get(key)
+    if verdict is None:
+        verdict = check_text_content(text)
+        verdicts.set(key, *verdict)
+    return verdict
+
+
+def _cached_image_verdict(media_file):
+    """(keys, verdict) for an image: its cache keys, and the cached verdict or None"""
+    data = read_image(media_file)
+    key = image_key(data)
+    phash = perceptual_key(data) if getattr(settings, 'MODERATION_CACHE_PHASH', True) else None
+    for lookup in filter(None, (key, phash)):
+        verdict = verdicts.get(lookup)
+        if verdict is not None:
+            return (key, phash), verdict
+    return (key, phash), None
+
+
+def _store_image_verdict(keys, is_safe, reason):
+    key, phash = keys
+    verdicts.set(key, is_safe, reason)
+    if phash and not is_safe:
+        verdicts.set(phash, is_safe, reason)
+
+
+def check_images(check_image, media_files, deadline=None, executor=None):
+    """
+    Check several images at once. Cache lookups and stores stay on the calling
+    thread; only classifier calls go to the shared pool, each given what's left
+    of the deadline as its timeout. The first unsafe verdict cancels the checks
+    still queued, and checks unfinished at the deadline are treated as
+    unavailable (allowed, not cached), like a single failed check.
+    Returns: (is_safe, reason)
     """
-    if not image_file:
+    deadline = time.monotonic() + (DEADLINE if deadline is None else deadline)
+
+    misses = []
+    for media_file in media_files:
+        keys, verdict = _cached_image_verdict(media_file)
+        if verdict is None:
+            misses.append((keys, media_file))
+        elif not verdict[0]:
+            return verdict
+    if not misses:
         return True, None
-    
+
+    def classify(media_file):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ModerationUnavailable("Moderation deadline passed before the check started")
+        return check_image(media_file, timeout=remaining)
+
+    executor = executor or get_executor()
+    pending = {executor.submit(classify, media_file): keys for keys, media_file in misses}
     try:
-        # Read image file
-        if hasattr(image_file, 'read'):
-            image_data = image_file.read()
-            image_file.seek(0)  # Reset file pointer
-        else:
-            with open(image_file, 'rb') as f:
-                image_data = f.read()
-        
-        # Use Hugging Face Inference API (Free, no API key needed for public models)
-        API_URL = "https://api-inference.huggingface.co/models/Falconsai/nsfw_image_detection"
-        
-        response = requests.post(
-            API_URL,
-            data=image_data,
-            headers={"Content-Type": "application/octet-stream"},
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            results = response.json()
-            
-            # Results format: [{"label": "nsfw", "score": 0.99}, {"label": "normal", "score": 0.01}]
-            for result in results:
-                if result.get('label') == 'nsfw' and result.get('score', 0) > 0.7:
-                    return False, "Image contains inappropriate content"
-            
-            return True, None
-        else:
-            # If API is loading or fails, allow the post (don't block due to service issues)
-            print(f"NSFW API response: {response.status_code}")
-            return True, None
-            
-    except Exception as e:
-        # If detection fails, log error but allow the post
-        print(f"NSFW detection error: {e}")
-        return True, None
+        while pending:
+            done, _ = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning("Image moderation deadline passed with %d checks pending, allowing", len(pending))
+                break
+            for future in done:
+                keys = pending.pop(future)
+                try:
+                    is_safe, reason = future.result()
+                except ModerationUnavailable as e:
+                    logger.warning("Image moderation unavailable, allowing: %s", e)
+                    continue
+                _store_image_verdict(keys, is_safe, reason)
+                if not is_safe:
+                    return False, reason
+    finally:
+        for future in pending:
+            future.cancel()
+    return True, None
 
 
-def moderate_post(title, content, media_files=None):
+def moderate_post(title, content, media_files=None, classifier=None, executor=None):
     """
-    Moderate entire post content
+    Moderate entire post content. classifier and executor default to the
+    configured image backend and the shared image-check pool.
     Returns: (is_approved, rejection_reason)
     """
     # Check title
-    is_safe, reason = check_text_content(title)
+    is_safe, reason = cached_text_check(title)
     if not is_safe:
         return False, reason
     
     # Check content
-    is_safe, reason = check_text_content(content)
+    is_safe, reason = cached_text_check(content)
     if not is_safe:
         return False, reason
     
     # Check images if present
     if media_files:
-        for media_file in media_files:
-            is_safe, reason = check_image_content(media_file)
-            if not is_safe:
-                return False, reason
+        return check_images(classifier or get_image_classifier(), media_files, executor=executor)
     
-    return True, None
\ No newline at end of file
+    return True, None
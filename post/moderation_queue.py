@@ -0,0 +1,163 @@
+# post/moderation_queue.py
+"""
+Asynchronous post moderation.
+
+New posts are saved as 'pending' with a ModerationJob row. Once the request's
+transaction commits, the job is handed to a process-wide worker pool
+(MODERATION_WORKERS threads), so the slow image checks never run in the
+request thread. A worker claims the job, runs moderate_post over the stored
+media, flips the post to approved (or the job's approved_status) or
+rejected, notifies the author, and fans approved posts out to timelines.
+
+A job that errors is queued again and re-submitted to the pool after
+MODERATION_RETRY_BACKOFF seconds, doubling with each attempt. After
+MODERATION_MAX_ATTEMPTS it is marked 'failed' and its post stays 'pending':
+a classifier outage is not a verdict. moderation_stats lists failed jobs;
+moderators either approve or reject those posts by hand or send them round
+again with process_moderation_queue --retry-failed.
+
+The job table is the source of truth: anything queued when the process dies
+is picked up by the process_moderation_queue command. Set
+MODERATION_ASYNC = False to run jobs inline on commit instead; retries are
+then left to process_moderation_queue --interval.
+"""
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ModerationJob, Notification, Post
+from .moderation import moderate_post
+from . import timeline
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'MODERATION_MAX_ATTEMPTS', 3)
+RETRY_BACKOFF = getattr(settings, 'MODERATION_RETRY_BACKOFF', 30)
+
+
+class ModerationPool:
+    """Lazily started thread pool that runs moderation jobs by ID"""
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, job_id):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='moderation')
+            return self._executor.submit(_run, job_id)
+
+    def submit_later(self, job_id, delay):
+        timer = threading.Timer(delay, self.submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+pool = ModerationPool(workers=getattr(settings, 'MODERATION_WORKERS', 4))
+atexit.register(pool.shutdown)
+
+
+def enqueue(post, approved_status='approved'):
+    """Queue a saved 'pending' post for moderation once the current transaction commits"""
+    job = ModerationJob.objects.create(post=post, approved_status=approved_status)
+    transaction.on_commit(lambda: dispatch(job.id))
+    return job
+
+
+def dispatch(job_id):
+    if getattr(settings, 'MODERATION_ASYNC', True):
+        pool.submit(job_id)
+    else:
+        process_job(job_id)
+
+
+def _run(job_id):
+    try:
+        process_job(job_id)
+    except Exception:
+        logger.exception("Moderation job %s crashed", job_id)
+    finally:
+        close_old_connections()
+
+
+def process_job(job_id):
+    """Claim a queued job and moderate its post; returns the job, or None if someone else has it"""
+    claimed = ModerationJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now(), attempts=F('attempts') + 1
+    )
+    if not claimed:
+        return None
+
+    job = ModerationJob.objects.select_related('post').get(pk=job_id)
+    post = job.post
+    try:
+        files = [default_storage.open(path, 'rb') for path in post.media_file or []]
+        try:
+            is_approved, reason = moderate_post(post.title, post.content, files)
+        finally:
+            for media_file in files:
+                media_file.close()
+    except Exception:
+        logger.exception("Moderation of post %s failed (attempt %d)", post.pk, job.attempts)
+        job.status = 'queued' if job.attempts < MAX_ATTEMPTS else 'failed'
+        job.save(update_fields=['status'])
+        if job.status == 'queued' and getattr(settings, 'MODERATION_ASYNC', True):
+            pool.submit_later(job.id, RETRY_BACKOFF * 2 ** (job.attempts - 1))
+        return job
+
+    apply_verdict(job, is_approved, reason)
+    return job
+
+
+def apply_verdict(job, is_approved, reason=None):
+    """Record the verdict, move the post out of 'pending' and tell the author"""
+    post = job.post
+    new_status = job.approved_status if is_approved else 'rejected'
+
+    with transaction.atomic():
+        # A post edited or removed by a moderator in the meantime is left alone
+        changed = Post.objects.filter(pk=post.pk, status='pending').update(status=new_status)
+        job.status = 'done'
+        job.verdict = 'approved' if is_approved else 'rejected'
+        job.reason = (reason or '')[:255]
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'verdict', 'reason', 'finished_at'])
+
+        if changed and new_status in ('approved', 'rejected'):
+            Notification.objects.create(
+                recipient_id=post.user_id,
+                sender_id=post.user_id,
+                notification_type='post_approved' if new_status == 'approved' else 'post_rejected',
+                post=post
+            )
+
+    if changed and new_status == 'approved':
+        post.status = new_status
+        timeline.fan_out_post(post)
+
+
+def retry_failed():
+    """Give failed jobs a fresh set of attempts; returns how many were queued"""
+    return ModerationJob.objects.filter(status='failed').update(status='queued', attempts=0)
+
+
+def requeue_stale(older_than=timedelta(minutes=10)):
+    """Put jobs stuck in 'running' (their worker died) back in the queue; returns how many"""
+    return ModerationJob.objects.filter(
+        status='running', started_at__lt=timezone.now() - older_than
+    ).update(status='queued')
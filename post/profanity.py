@@ -0,0 +1,155 @@
+# post/profanity.py
+"""
+Compiled profanity matcher.
+
+Gives the same answers as better_profanity's contains_profanity, without its
+per-token scan of the whole wordlist. The wordlist (with better_profanity's
+leetspeak substitutions, e.g. "4" or "@" for "a") is compiled once into a
+deterministic automaton: a trie of the words, turned into a DFA over text
+characters by subset construction, since one text character can stand for
+several pattern characters ("1" for "i" or "l", "*" for any vowel).
+
+Matching follows better_profanity's rules: the text is split into tokens
+(runs of its allowed characters), and a token is profane if it spells a word,
+alone or together with up to MAX_NUMBER_COMBINATIONS following tokens, joined
+either directly ("bull shit" as "bullshit") or with the separators between
+them kept ("blow job"). Each token start walks the DFA once, so a text costs
+O(length x longest word) dict lookups however long the wordlist is.
+
+The matcher is built lazily on first use and shared by every thread.
+"""
+import re
+import threading
+from better_profanity.constants import ALLOWED_CHARACTERS
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+# better_profanity's substitutions (Profanity.CHARS_MAPPING): text characters that may stand for each letter
+CHARS_MAPPING = {
+    "a": ("a", "@", "*", "4"),
+    "i": ("i", "*", "l", "1"),
+    "o": ("o", "*", "0", "@"),
+    "u": ("u", "*", "v"),
+    "v": ("v", "*", "u"),
+    "l": ("l", "1"),
+    "e": ("e", "*", "3"),
+    "s": ("s", "$", "5"),
+    "t": ("t", "7"),
+}
+
+
+class ProfanityMatcher:
+    """DFA over a wordlist and its character substitutions"""
+
+    def __init__(self, words, char_map=CHARS_MAPPING, allowed_characters=ALLOWED_CHARACTERS):
+        words = {word.lower() for word in words}
+        self.allowed_characters = allowed_characters
+        self.max_combinations = max(
+            [1] + [sum(char not in allowed_characters for char in word) for word in words]
+        )
+        self._token_re = re.compile(
+            '[%s]+' % ''.join(re.escape(char) for char in sorted(allowed_characters))
+        )
+
+        # Text characters each pattern character accepts
+        variants = {char: set(substitutes) | {char} for char, substitutes in char_map.items()}
+
+        # Trie of the words over pattern characters
+        children = [{}]
+        terminal = [False]
+        for word in words:
+            node = 0
+            for char in word:
+                if char not in children[node]:
+                    children[node][char] = len(children)
+                    children.append({})
+                    terminal.append(False)
+                node = children[node][char]
+            terminal[node] = True
+
+        # Subset construction: DFA state = set of trie nodes reachable by the text so far
+        start = frozenset([0])
+        state_ids = {start: 0}
+        self.transitions = [{}]
+        self.accepting = [False]
+        pending = [start]
+        while pending:
+            nodes = pending.pop()
+            moves = {}
+            for node in nodes:
+                for pattern_char, child in children[node].items():
+                    for text_char in variants.get(pattern_char, (pattern_char,)):
+                        moves.setdefault(text_char, set()).add(child)
+
+            state_id = state_ids[nodes]
+            for text_char, targets in moves.items():
+                targets = frozenset(targets)
+                if targets not in state_ids:
+                    state_ids[targets] = len(self.transitions)
+                    self.transitions.append({})
+                    self.accepting.append(any(terminal[node] for node in targets))
+                    pending.append(targets)
+                self.transitions[state_id][text_char] = state_ids[targets]
+
+    def _walk(self, state, text):
+        transitions = self.transitions
+        for char in text:
+            state = transitions[state].get(char)
+            if state is None:
+                return None
+        return state
+
+    def contains_profanity(self, text):
+        if not isinstance(text, str):
+            text = str(text)
+        tokens = [(match.start(), match.end()) for match in self._token_re.finditer(text)]
+        # better_profanity ignores a token that starts on the last character,
+        # both on its own and as the next word of a combination
+        last = len(text) - 1
+        if not tokens or tokens[0][0] >= last:
+            return False
+
+        words = [text[start:end].lower() for start, end in tokens]
+        separators = [text[tokens[i][1]:tokens[i + 1][0]].lower() for i in range(len(tokens) - 1)]
+        accepting = self.accepting
+
+        for i, word in enumerate(words):
+            state = self._walk(0, word)
+            if state is None:
+                continue
+            if accepting[state]:
+                return True
+
+            joined = spaced = state
+            for j in range(i + 1, min(len(words), i + 1 + self.max_combinations)):
+                if tokens[j][0] >= last:
+                    break
+                if joined is not None:
+                    joined = self._walk(joined, words[j])
+                    if joined is not None and accepting[joined]:
+                        return True
+                if spaced is not None:
+                    spaced = self._walk(spaced, separators[j - 1])
+                    spaced = self._walk(spaced, words[j]) if spaced is not None else None
+                    if spaced is not None and accepting[spaced]:
+                        return True
+                if joined is None and spaced is None:
+                    break
+        return False
+
+
+_matcher = None
+_lock = threading.Lock()
+
+
+def get_matcher():
+    """The matcher for better_profanity's default wordlist, built on first use"""
+    global _matcher
+    if _matcher is None:
+        with _lock:
+            if _matcher is None:
+                _matcher = ProfanityMatcher(read_wordlist(get_complete_path_of_file('profanity_wordlist.txt')))
+    return _matcher
+
+
+def contains_profanity(text):
+    return get_matcher().contains_profanity(text)
@@ -0,0 +1,96 @@
+# post/seen.py
+"""
+"Already seen" tracking for the news feed.
+
+Each user has a rotating pair of bloom filters of post IDs stored as bytes in
+the cache. A post counts as seen if either generation contains it, so an
+impression is remembered for between one and two rotation periods. Checking
+a post is O(1) with no queries; the only query is seeding from PostView when
+the cache has nothing for the user. Like feed snapshots, this needs the
+shared cache (CACHE_URL in app/settings.py) to work across worker processes.
+"""
+import time
+from datetime import timedelta
+from hashlib import blake2b
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import PostView
+
+ROTATION_SECONDS = getattr(settings, 'SEEN_FILTER_ROTATION_SECONDS', 6 * 60 * 60)
+FILTER_BITS = getattr(settings, 'SEEN_FILTER_BITS', 16384)
+FILTER_HASHES = 4
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over integers, serializable to bytes"""
+
+    def __init__(self, bits=FILTER_BITS, hashes=FILTER_HASHES, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data else bytearray(bits // 8)
+
+    def _positions(self, value):
+        digest = blake2b(str(value).encode(), digest_size=8).digest()
+        h1 = int.from_bytes(digest[:4], 'little')
+        h2 = int.from_bytes(digest[4:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.data[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.data[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def to_bytes(self):
+        return bytes(self.data)
+
+
+class SeenPosts:
+    """A user's two-generation seen filter"""
+
+    def __init__(self, user_id, epoch, current, previous):
+        self.user_id = user_id
+        self.epoch = epoch
+        self.current = current
+        self.previous = previous
+
+    @staticmethod
+    def _key(user_id):
+        return f'seen_posts:{user_id}'
+
+    @classmethod
+    def load(cls, user_id):
+        epoch = int(time.time() // ROTATION_SECONDS)
+        stored = cache.get(cls._key(user_id))
+
+        if stored is None:
+            seen = cls(user_id, epoch, BloomFilter(), BloomFilter())
+            # Cold cache: seed from recorded views so restarts don't reset the feed
+            since = timezone.now() - timedelta(seconds=ROTATION_SECONDS * 2)
+            for post_id in PostView.objects.filter(user_id=user_id, viewed_at__gte=since).values_list('post_id', flat=True):
+                seen.current.add(post_id)
+            return seen
+
+        current = BloomFilter(data=stored['current'])
+        previous = BloomFilter(data=stored['previous'])
+        if stored['epoch'] == epoch:
+            return cls(user_id, epoch, current, previous)
+        if stored['epoch'] == epoch - 1:
+            return cls(user_id, epoch, BloomFilter(), current)
+        return cls(user_id, epoch, BloomFilter(), BloomFilter())
+
+    def __contains__(self, post_id):
+        return post_id in self.current or post_id in self.previous
+
+    def add_many(self, post_ids):
+        for post_id in post_ids:
+            self.current.add(post_id)
+
+    def save(self):
+        cache.set(self._key(self.user_id), {
+            'epoch': self.epoch,
+            'current': self.current.to_bytes(),
+            'previous': self.previous.to_bytes(),
+        }, ROTATION_SECONDS * 2)
@@ -1,7 +1,14 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import *
 from django.core.files.storage import default_storage
 from accounts.models import Profile
+from api import blobs
+from api.models import UploadSession
+from api.uploads import claim
+from api.serializers import ImageVariantsField, SparseFieldsetMixin, ThumbnailURLField
+from .viewer_state import ViewerState
+from .comment_tree import CommentTree, comment_previews
 
 """ Serializers for Posts """
 class LikeSerializer(serializers.ModelSerializer):
@@ -20,7 +27,10 @@ class LikeSerializer(serializers.ModelSerializer):
         if post.status != 'approved':
             raise serializers.ValidationError("You can only like approved posts.")
         
-        like, created = Like.objects.get_or_create(user=user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=user, post=post)
+            if created:
+                Post.adjust_counter(post.id, 'likes_count', 1)
     
         if created and post.user != user:
             Notification.objects.create(
@@ -35,46 +45,38 @@ class LikeSerializer(serializers.ModelSerializer):
         means: give me the currently logged-in user making this request. """
 
 
-class RecursiveSerializer(serializers.Serializer):
-    """Serializer for recursive nested comments"""
-    def to_representation(self, instance):
-        serializer = self.parent.parent.__class__(instance, context=self.context)
-        return serializer.data
+def _comment_tree(serializer, post_ids):
+    request = serializer.context.get('request')
+    return CommentTree.for_posts(post_ids, request.user if request else None)
+
+
+class CommentListSerializer(serializers.ListSerializer):
+    """ Loads the comment trees of every post on the page in one query """
+
+    def to_representation(self, data):
+        comments = list(data.all() if hasattr(data, 'all') else data)
+        self.child.comment_tree = _comment_tree(self, {comment.post_id for comment in comments})
+        return super().to_representation(comments)
+
 
 class CommentSerializer(serializers.ModelSerializer):
-    """ Serializer for Comment """
+    """ Serializer for Comment, rendered with its replies from a CommentTree """
     user_name = serializers.CharField(source='user.username', read_only=True)
-    replies = RecursiveSerializer(many=True, read_only=True)
-    replies_count = serializers.SerializerMethodField()
-    can_edit = serializers.SerializerMethodField()
-    can_delete = serializers.SerializerMethodField()
-    avatar = serializers.SerializerMethodField(source='user.avatar', read_only=True)
 
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'user_name', 'avatar', 'post', 'parent', 'content', 'created_at', 'updated_at', 'replies', 'replies_count', 'can_edit', 'can_delete']
+        # Output also has avatar, replies, replies_count, can_edit and can_delete (see comment_tree.py)
+        fields = ['id', 'user', 'user_name', 'post', 'parent', 'content', 'created_at', 'updated_at']
         read_only_fields = ['user', 'created_at', 'updated_at']
+        list_serializer_class = CommentListSerializer
 
-    def get_avatar(self, obj):
-        try:
-            return obj.user.profile.avatar.url if obj.user.profile.avatar else None
-        except Profile.DoesNotExist:
-            return None
-
-    def get_replies_count(self, obj):
-        return obj.replies.count()
-
-    def get_can_edit(self, obj):
-        request = self.context.get('request')
-        if request and request.user:
-            return obj.user == request.user
-        return False
-
-    def get_can_delete(self, obj):
-        request = self.context.get('request')
-        if request and request.user:
-            return obj.user == request.user or obj.post.user == request.user
-        return False
+    def to_representation(self, instance):
+        tree = getattr(self, 'comment_tree', None)
+        if tree is None or instance.id not in tree.comments:
+            # One comment (create, retrieve, update): load its subtree, not the whole post
+            request = self.context.get('request')
+            tree = self.comment_tree = CommentTree.for_comment(instance, request.user if request else None)
+        return tree.render(instance.id)
 
     def validate(self, data):
         if data.get('post') and data['post'].status != 'approved':
@@ -83,12 +85,17 @@ class CommentSerializer(serializers.ModelSerializer):
         if data.get('parent') and data.get('post'):
             if data['parent'].post != data['post']:
                 raise serializers.ValidationError("Parent comment must belong to the same post.")
+
+        if data.get('parent') and data['parent'].depth >= Comment.MAX_DEPTH:
+            raise serializers.ValidationError(f"Replies can't be nested more than {Comment.MAX_DEPTH} levels deep.")
         
         return data
     
     def create(self, validated_data):
         user = self.context['request'].user
-        comment = Comment.objects.create(**validated_data)
+        with transaction.atomic():
+            comment = Comment.objects.create(**validated_data)
+            Post.adjust_counter(comment.post_id, 'comments_count', 1)
         
         # Notify post owner
         if comment.post.user != user:
@@ -132,7 +139,9 @@ class ShareSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         post = validated_data['post']
         
-        share = Share.objects.create(user=user, post=post)
+        with transaction.atomic():
+            share = Share.objects.create(user=user, post=post)
+            Post.adjust_counter(post.id, 'shares_count', 1)
 
         if post.user != user:
             Notification.objects.create(
@@ -144,34 +153,55 @@ class ShareSerializer(serializers.ModelSerializer):
         return share
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostPageSerializer(serializers.ListSerializer):
+    """ Resolves viewer state, comment trees and comment previews for the whole page, one query each """
+    viewer_fields = {'is_liked', 'is_shared', 'is_following_author'}
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        readable = {field.field_name for field in self.child._readable_fields}
+        if request and self.viewer_fields & readable:
+            self.child.viewer_state = ViewerState.resolve(request.user, posts)
+        if 'comments' in readable:
+            self.child.comment_tree = _comment_tree(self, {post.id for post in posts})
+        if 'comment_preview' in readable:
+            self.child.comment_previews = comment_previews(
+                {post.id for post in posts}, request.user if request else None
+            )
+        return super().to_representation(posts)
+
+
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """ Serializer for Post """
     user_name = serializers.CharField(source='user.username', read_only=True)
     avatar = serializers.SerializerMethodField(source='user.avatar', read_only=True)
 
-
-    likes_count = serializers.IntegerField(source='likes.count', read_only=True)
-    comments_count = serializers.IntegerField(source='comments.count', read_only=True)
-    shares_count = serializers.IntegerField(source='shares.count', read_only=True)
     comments = serializers.SerializerMethodField()
     can_edit = serializers.SerializerMethodField()
     can_delete = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
+    is_shared = serializers.SerializerMethodField()
+    is_following_author = serializers.SerializerMethodField()
+    media = ImageVariantsField(source='media_file')
 
     media_files = serializers.ListField(
         child=serializers.FileField(max_length=100000, allow_empty_file=False, use_url=True),
         write_only=True,
         required=False
     )
+    # Finalized chunked uploads (/api/uploads/), added after any media_files
+    upload_ids = serializers.ListField(child=serializers.UUIDField(), write_only=True, required=False)
     class Meta:
         model = Post
         fields = [
-            'id', 'user', 'user_name', 'avatar', 'title', 'post_type', 'content', 'media_file', 'media_files', 'link',
+            'id', 'user', 'user_name', 'avatar', 'title', 'post_type', 'content', 'media_file', 'media', 'media_files', 'upload_ids', 'link',
             'tags', 'status', 'created_at', 'updated_at',
             'likes_count', 'comments_count', 'shares_count', 'comments',
-            'can_edit', 'can_delete', 'is_liked', 'community',
+            'can_edit', 'can_delete', 'is_liked', 'is_shared', 'is_following_author', 'community',
         ]
         read_only_fields = ['user', 'likes_count', 'comments_count', 'shares_count', 'created_at', 'updated_at']
+        list_serializer_class = PostPageSerializer
 
     def get_avatar(self, obj):
         try:
@@ -179,74 +209,116 @@ class PostSerializer(serializers.ModelSerializer):
         except Profile.DoesNotExist:
             return None
         
-    def create(self, validated_data):
-        media_files = validated_data.pop('media_files', [])
-        post = Post.objects.create(**validated_data)
-
-        if media_files:
-            file_paths = []
-            for media_file in media_files:
-                file_path = default_storage.save(
-                    f'posts/{post.id}/{media_file.name}',
-                    media_file
-                )
-                file_paths.append(file_path)
-
-            post.media_file = file_paths
-            post.save()
+    def validate_upload_ids(self, value):
+        request = self.context.get('request')
+        sessions = UploadSession.objects.filter(
+            id__in=value, user=request.user, status='complete'
+        ).select_related('blob') if request else []
+        sessions = {session.id: session for session in sessions}
+        unknown = [str(upload_id) for upload_id in value if upload_id not in sessions]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown or unfinished uploads: {', '.join(unknown)}")
+        return [sessions[upload_id] for upload_id in dict.fromkeys(value)]
+
+    def _media_paths(self, validated_data):
+        """Blob paths for the uploaded media_files and upload_ids, or None if neither was sent"""
+        media_files = validated_data.pop('media_files', None)
+        uploads = validated_data.pop('upload_ids', None)
+        if media_files is None and uploads is None:
+            return None, []
+        # Content-addressed: a file someone already uploaded isn't written again
+        paths = [blobs.store(media_file).path for media_file in media_files or []]
+        return paths + [session.blob.path for session in uploads or []], uploads or []
 
+    def create(self, validated_data):
+        paths, uploads = self._media_paths(validated_data)
+        if paths:
+            validated_data['media_file'] = paths
+        with transaction.atomic():
+            post = Post.objects.create(**validated_data)
+            claim(uploads)
         return post
     
     def update(self, instance, validated_data):
-        media_files = validated_data.pop('media_files', None)
+        paths, uploads = self._media_paths(validated_data)
         
         # Update other fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        if media_files is not None:
-            # Delete old files if needed
-            if instance.media_file:
-                for old_file in instance.media_file:
-                    if default_storage.exists(old_file):
-                        default_storage.delete(old_file)
-            
-            # Save new files
-            file_paths = []
-            for media_file in media_files:
-                file_path = default_storage.save(
-                    f'posts/{instance.id}/{media_file.name}',
-                    media_file
-                )
-                file_paths.append(file_path)
-            
-            instance.media_file = file_paths
+        old_files = []
+        if paths is not None:
+            old_files = instance.media_file or []
+            instance.media_file = paths
         
-        instance.save()
+        # Saving releases the blobs the post no longer uses; gc_media deletes them once unreferenced
+        with transaction.atomic():
+            instance.save()
+            claim(uploads)
+
+        # Files from before blob storage belong to this post alone
+        for old_file in old_files:
+            if not blobs.is_blob_path(old_file) and old_file not in instance.media_file:
+                default_storage.delete(old_file)
         return instance
     
 
     def get_comments(self, obj):
-        top_level_comments = obj.comments.filter(parent=None)
-        return CommentSerializer(top_level_comments, many=True, context=self.context).data
+        tree = getattr(self, 'comment_tree', None)
+        if tree is None or not tree.covers(obj.id):
+            tree = self.comment_tree = _comment_tree(self, [obj.id])
+        return tree.render_post(obj.id)
 
     def get_can_edit(self, obj):
         request = self.context.get('request')
         if request and request.user:
-            return obj.user == request.user
+            return obj.user_id == request.user.id
         return False
 
     def get_can_delete(self, obj):
         request = self.context.get('request')
         if request and request.user:
-            return obj.user == request.user
+            return obj.user_id == request.user.id
         return False
     
+    def _viewer_state(self, obj):
+        """Viewer flags for obj, resolved by PostPageSerializer for lists or on demand for one post"""
+        state = getattr(self, 'viewer_state', None)
+        if state is None or not state.covers(obj):
+            request = self.context.get('request')
+            state = self.viewer_state = ViewerState.resolve(request.user if request else None, [obj])
+        return state
+
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Like.objects.filter(user=request.user, post=obj).exists()
-        return False
+        return self._viewer_state(obj).is_liked(obj)
+
+    def get_is_shared(self, obj):
+        return self._viewer_state(obj).is_shared(obj)
+
+    def get_is_following_author(self, obj):
+        return self._viewer_state(obj).is_following_author(obj)
+
+
+class PostListSerializer(PostSerializer):
+    """
+    Card serializer for post lists and feeds: the first few comments instead
+    of the comment tree, and image thumbnails instead of the originals
+    """
+    comment_preview = serializers.SerializerMethodField()
+    avatar = ThumbnailURLField(source='user.profile.avatar')
+
+    class Meta(PostSerializer.Meta):
+        fields = [name for name in PostSerializer.Meta.fields if name != 'media_file'] + ['comment_preview']
+        # ?expand=comments adds the tree back
+        expandable_fields = ['comments']
+
+    def get_comment_preview(self, obj):
+        previews = getattr(self, 'comment_previews', None)
+        if previews is None or obj.id not in previews:
+            request = self.context.get('request')
+            previews = self.comment_previews = comment_previews([obj.id], request.user if request else None)
+        return previews[obj.id]
+
     
 class FollowSerializer(serializers.ModelSerializer):
     """ Serializer for Follow """
@@ -279,6 +351,8 @@ class FollowSerializer(serializers.ModelSerializer):
         
         # Create notification when someone follows
         if created:
+            from .timeline import backfill_author
+            backfill_author(follower.id, following.id)
             Notification.objects.create(
                 recipient=following,
                 sender=follower,
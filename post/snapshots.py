@@ -0,0 +1,34 @@
+# post/snapshots.py
+"""
+Per-session news feed snapshots.
+
+The first news_feed request ranks and shuffles the feed once and stores the
+ordered post IDs in the cache under a random token. Later pages pass the token
+back and are sliced from the stored list, so paging is stable (no duplicates
+or gaps between pages) and costs one cache read plus one id__in query.
+The next page may be served by another worker, so with several workers set
+CACHE_URL to a shared Redis (app/settings.py) instead of per-process memory.
+"""
+import secrets
+from django.conf import settings
+from django.core.cache import cache
+
+SNAPSHOT_TTL = getattr(settings, 'FEED_SNAPSHOT_TTL', 60 * 30)
+
+
+def _key(user_id, token):
+    return f'feed_snapshot:{user_id}:{token}'
+
+
+def save_snapshot(user_id, post_ids):
+    """Store an ordered list of post IDs and return its token"""
+    token = secrets.token_urlsafe(12)
+    cache.set(_key(user_id, token), list(post_ids), SNAPSHOT_TTL)
+    return token
+
+
+def load_snapshot(user_id, token):
+    """Return the stored post IDs, or None if the token is unknown or expired"""
+    if not token:
+        return None
+    return cache.get(_key(user_id, token))
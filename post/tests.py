@@ -1,5 +1,955 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.db.models import Count
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from community.models import Community, CommunityMember
+from .models import Post, PostScore, PostView, Like, Comment, Share, Follow, Notification, TimelineEntry, TimelineState, ModerationVerdict
+from . import moderation_queue
+from .moderation_queue import process_job
+from .verdict_cache import VerdictCache, verdicts, text_key
+from .moderation import ModerationUnavailable, cached_text_check, check_images, get_image_classifier
+from .classifiers import FakeClassifier, ImageClassifier, LocalServerClassifier, RemoteClassifier
+from .profanity import ProfanityMatcher, get_matcher
+from .ranking import score_posts, top_candidates
+from .comment_tree import CommentTree, comment_previews
+from .trending import refresh_scores
+from . import timeline
+from .seen import ROTATION_SECONDS, BloomFilter, SeenPosts
+from .impressions import ImpressionBuffer
 
-# Create your tests here.
+User = get_user_model()
 
 
+def per_post_score(post, user, time_decay_hours=24):
+    """
+    Reference for score_posts: the feed's original per-post scorer, with its per-post queries.
+    Score = (likes * 1 + comments * 2 + shares * 3) * time_decay * personalization_boost
+    """
+    engagement = post.engagement_score
+    hours_old = (timezone.now() - post.created_at).total_seconds() / 3600
+    time_decay = max(0.1, 1 - (hours_old / time_decay_hours))
+
+    personalization = 1.0
+    if Follow.objects.filter(follower=user, following=post.user).exists():
+        personalization *= 2.0
+    if post.community:
+        if CommunityMember.objects.filter(user=user, community=post.community, is_approved=True).exists():
+            personalization *= 1.5
+    if Like.objects.filter(user=user, post__user=post.user).exists():
+        personalization *= 1.3
+    if post.is_pinned:
+        personalization *= 3.0
+    return engagement * time_decay * personalization
+
+
+class BatchScoringTests(TestCase):
+    """ score_posts must match the per-post reference scorer """
+
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer', 'viewer@example.com', 'pass12345')
+        self.followed = User.objects.create_user('followed', 'followed@example.com', 'pass12345')
+        self.stranger = User.objects.create_user('stranger', 'stranger@example.com', 'pass12345')
+        self.community = Community.objects.create(name='joined', title='Joined', created_by=self.stranger)
+        self.other_community = Community.objects.create(name='other', title='Other', created_by=self.stranger)
+
+        Follow.objects.create(follower=self.viewer, following=self.followed)
+        CommunityMember.objects.create(user=self.viewer, community=self.community, is_approved=True)
+
+        now = timezone.now()
+        specs = [
+            (self.followed, None, False, 3, 0),
+            (self.followed, self.community, True, 10, 5),
+            (self.stranger, self.community, False, 7, 30),
+            (self.stranger, self.other_community, True, 2, 2),
+            (self.stranger, None, False, 0, 48),
+            (self.viewer, None, False, 12, 1),
+        ]
+        self.posts = []
+        for i, (author, community, pinned, score, hours_old) in enumerate(specs):
+            post = Post.objects.create(
+                user=author, community=community, title=f'post {i}', post_type='text', is_pinned=pinned
+            )
+            Post.objects.filter(pk=post.pk).update(
+                engagement_score=score, created_at=now - timedelta(hours=hours_old)
+            )
+            self.posts.append(post)
+
+        # Viewer has liked something from stranger, so stranger gets the interaction boost
+        Like.objects.create(user=self.viewer, post=self.posts[4])
+        self.posts = list(Post.objects.filter(pk__in=[p.pk for p in self.posts]).order_by('pk'))
+
+    def test_scores_match_per_post_function(self):
+        expected = [per_post_score(post, self.viewer) for post in self.posts]
+        actual = score_posts(self.posts, self.viewer).tolist()
+        self.assertEqual(len(actual), len(expected))
+        for got, want in zip(actual, expected):
+            # Both read the clock, so allow for the few milliseconds between calls
+            self.assertAlmostEqual(got, want, places=3)
+
+    def test_queries_do_not_grow_with_candidates(self):
+        with self.assertNumQueries(3):
+            score_posts(self.posts, self.viewer)
+
+    def test_empty_candidates(self):
+        self.assertEqual(len(score_posts([], self.viewer)), 0)
+
+    def test_top_candidates_keeps_best_and_dedupes(self):
+        scores = score_posts(self.posts, self.viewer).tolist()
+        best = sorted(zip(scores, [p.id for p in self.posts]), reverse=True)[:3]
+
+        everything = Post.objects.all()
+        ranked = top_candidates([everything, everything], self.viewer, limit=3, chunk_size=2)
+        self.assertEqual([c.id for c in ranked], [post_id for _, post_id in best])
+
+
+class EngagementAggregationTests(TestCase):
+    """ with_engagement() must count exactly, without the JOIN row blowup of stacked Count()s """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass12345')
+        fans = [
+            User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'pass12345')
+            for i in range(10)
+        ]
+        self.post = Post.objects.create(user=self.author, title='busy', post_type='text')
+        Like.objects.bulk_create([Like(user=fan, post=self.post) for fan in fans])
+        Comment.objects.bulk_create([Comment(user=fan, post=self.post, content='hi') for fan in fans[:5]])
+        Share.objects.bulk_create([Share(user=fan, post=self.post) for fan in fans[:3]])
+
+    def test_joined_counts_blow_up(self):
+        joined = Post.objects.filter(pk=self.post.pk).values(
+            'id', 'likes__id', 'comments__id', 'shares__id'
+        ).count()
+        self.assertEqual(joined, 10 * 5 * 3)
+
+        inflated = Post.objects.filter(pk=self.post.pk).annotate(
+            score=Count('likes') + Count('comments') * 2 + Count('shares') * 3
+        ).get()
+        self.assertEqual(inflated.score, 150 + 150 * 2 + 150 * 3)
+
+    def test_with_engagement_counts_exactly(self):
+        with self.assertNumQueries(1):
+            post = Post.objects.filter(pk=self.post.pk).with_engagement().get()
+        self.assertEqual((post.live_likes, post.live_comments, post.live_shares), (10, 5, 3))
+        self.assertEqual(post.live_engagement, 10 + 5 * 2 + 3 * 3)
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class EngagementCounterTests(APITestCase):
+    """ Stored counters follow likes, comments and shares through the API """
+
+    def setUp(self):
+        self.author = User.objects.create_user('counted', 'counted@example.com', 'pass12345')
+        self.fan = User.objects.create_user('counter', 'counter@example.com', 'pass12345')
+        self.post = Post.objects.create(user=self.author, title='Counted', content='a', status='approved')
+        self.client.force_authenticate(user=self.fan)
+
+    def counters(self):
+        self.post.refresh_from_db()
+        return (self.post.likes_count, self.post.comments_count, self.post.shares_count, self.post.engagement_score)
+
+    def test_create_and_delete_adjust_counters(self):
+        like_id = self.client.post('/api/likes/', {'post': self.post.id}).data['data']['id']
+        # Liking twice doesn't count twice
+        self.client.post('/api/likes/', {'post': self.post.id})
+        comment_id = self.client.post('/api/comments/', {'post': self.post.id, 'content': 'hi'}).data['data']['id']
+        self.client.post('/api/comments/', {'post': self.post.id, 'parent': comment_id, 'content': 'reply'})
+        share_id = self.client.post('/api/shares/', {'post': self.post.id}).data['data']['id']
+        self.assertEqual(self.counters(), (1, 2, 1, 1 + 2 * 2 + 3))
+
+        self.client.delete(f'/api/likes/{like_id}/')
+        # Deleting a comment removes its replies from the count too
+        self.client.delete(f'/api/comments/{comment_id}/')
+        self.client.delete(f'/api/shares/{share_id}/')
+        self.assertEqual(self.counters(), (0, 0, 0, 0))
+
+    def test_counters_never_go_negative(self):
+        Post.adjust_counter(self.post.id, 'likes_count', 1)
+        Post.adjust_counter(self.post.id, 'shares_count', -5)
+        self.assertEqual(self.counters(), (1, 0, 0, 0))
+
+    def test_reconcile_fixes_drift(self):
+        Like.objects.create(user=self.fan, post=self.post)
+        Share.objects.create(user=self.fan, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7, engagement_score=99)
+
+        out = StringIO()
+        call_command('reconcile_post_counters', '--dry-run', stdout=out)
+        self.assertIn('would fix 1', out.getvalue())
+        self.assertEqual(self.counters()[1:], (7, 0, 99))
+
+        call_command('reconcile_post_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 0, 1, 4))
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='x')
+        self.post = Post.objects.create(user=self.user, title='Hello', content='Hi', status='approved')
+        Comment.objects.create(user=self.user, post=self.post, content='First')
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_has_no_comment_tree(self):
+        data = self.client.get('/api/posts/').data['results']
+        self.assertNotIn('comments', data[0])
+        self.assertEqual(data[0]['comments_count'], self.post.comments_count)
+
+    def test_expand_comments(self):
+        data = self.client.get('/api/posts/', {'expand': 'comments'}).data['results']
+        self.assertEqual([c['content'] for c in data[0]['comments']], ['First'])
+
+    def test_detail_keeps_comment_tree(self):
+        data = self.client.get(f'/api/posts/{self.post.id}/').data
+        self.assertEqual(len(data['comments']), 1)
+
+    def test_fields_limits_output(self):
+        data = self.client.get('/api/posts/', {'fields': 'id,title'}).data['results']
+        self.assertEqual(set(data[0]), {'id', 'title'})
+        data = self.client.get(f'/api/posts/{self.post.id}/', {'fields': 'id,comments'}).data
+        self.assertEqual(set(data), {'id', 'comments'})
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class ViewerStateTests(APITestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.followed = User.objects.create_user(username='followed', email='followed@example.com', password='x')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.liked = Post.objects.create(user=self.followed, title='Liked', content='a', status='approved')
+        self.shared = Post.objects.create(user=self.other, title='Shared', content='b', status='approved')
+        Like.objects.create(user=self.viewer, post=self.liked)
+        Like.objects.create(user=self.other, post=self.shared)
+        Share.objects.create(user=self.viewer, post=self.shared)
+        Follow.objects.create(follower=self.viewer, following=self.followed)
+        self.client.force_authenticate(user=self.viewer)
+
+    def flags(self, data):
+        return {
+            post['title']: (post['is_liked'], post['is_shared'], post['is_following_author'])
+            for post in data
+        }
+
+    def test_list_flags(self):
+        data = self.client.get('/api/posts/').data['results']
+        self.assertEqual(self.flags(data), {
+            'Liked': (True, False, True),
+            'Shared': (False, True, False),
+        })
+
+    def test_detail_flags(self):
+        data = self.client.get(f'/api/posts/{self.liked.id}/').data
+        self.assertEqual(self.flags([data]), {'Liked': (True, False, True)})
+
+    def test_one_query_per_page(self):
+        # posts, count, viewer state, comment previews
+        with self.assertNumQueries(4):
+            self.client.get('/api/posts/')
+        # viewer state and previews are skipped when ?fields= leaves them out
+        with self.assertNumQueries(2):
+            self.client.get('/api/posts/', {'fields': 'id,title'})
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class CommentTreeTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.post = Post.objects.create(user=self.owner, title='Thread', content='a', status='approved')
+        self.root = Comment.objects.create(user=self.viewer, post=self.post, content='root')
+        self.reply = Comment.objects.create(user=self.owner, post=self.post, parent=self.root, content='reply')
+        self.nested = Comment.objects.create(user=self.viewer, post=self.post, parent=self.reply, content='nested')
+        Comment.objects.create(user=self.owner, post=self.post, parent=self.root, content='reply 2')
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_post_detail_renders_tree(self):
+        with self.assertNumQueries(3):
+            comments = self.client.get(f'/api/posts/{self.post.id}/').data['comments']
+        self.assertEqual(len(comments), 1)
+        root = comments[0]
+        self.assertEqual(root['replies_count'], 2)
+        self.assertEqual([r['content'] for r in root['replies']], ['reply', 'reply 2'])
+        self.assertEqual(root['replies'][0]['replies'][0]['content'], 'nested')
+        self.assertEqual((root['can_edit'], root['can_delete']), (True, True))
+        self.assertEqual((root['replies'][0]['can_edit'], root['replies'][0]['can_delete']), (False, False))
+
+    def test_comment_detail_renders_subtree(self):
+        data = self.client.get(f'/api/comments/{self.reply.id}/').data['data']
+        self.assertEqual(data['parent'], self.root.id)
+        self.assertEqual([r['content'] for r in data['replies']], ['nested'])
+
+    def test_single_comment_loads_only_its_subtree(self):
+        tree = CommentTree.for_comment(self.reply, self.viewer)
+        self.assertEqual(set(tree.comments), {self.reply.id, self.nested.id})
+        self.assertEqual(tree.render(self.reply.id)['replies_count'], 1)
+
+        response = self.client.post('/api/comments/', {'post': self.post.id, 'parent': self.nested.id, 'content': 'deeper'})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['data']['replies'], [])
+
+    def test_depth_and_reply_limits(self):
+        tree = CommentTree.for_posts([self.post.id], self.viewer, max_depth=1, max_replies=1)
+        root = tree.render_post(self.post.id)[0]
+        self.assertEqual(root['replies_count'], 2)
+        self.assertEqual(len(root['replies']), 1)
+        self.assertEqual(root['replies'][0]['replies'], [])
+        self.assertEqual(root['replies'][0]['replies_count'], 1)
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='threads', email='threads@example.com', password='x')
+        self.post = Post.objects.create(user=self.user, title='Thread', content='a', status='approved')
+        self.first = Comment.objects.create(user=self.user, post=self.post, content='first')
+        self.reply = Comment.objects.create(user=self.user, post=self.post, parent=self.first, content='reply')
+        self.nested = Comment.objects.create(user=self.user, post=self.post, parent=self.reply, content='nested')
+        self.second = Comment.objects.create(user=self.user, post=self.post, content='second')
+        self.late_reply = Comment.objects.create(user=self.user, post=self.post, parent=self.first, content='late reply')
+        self.client.force_authenticate(user=self.user)
+
+    def test_thread_fields_set_on_save(self):
+        self.nested.refresh_from_db()
+        self.assertEqual(self.nested.root_id, self.first.id)
+        self.assertEqual(self.nested.depth, 2)
+        self.assertEqual(self.nested.path, Comment.thread_path(self.reply.path, self.nested.id))
+        self.assertEqual(self.first.subtree_size(), 4)
+
+    def test_fill_thread_fields_matches_save(self):
+        expected = list(Comment.objects.order_by('id').values_list('root_id', 'depth', 'path'))
+        Comment.objects.update(root=None, depth=0, path='')
+        Comment.fill_thread_fields(Comment.objects.all())
+        self.assertEqual(list(Comment.objects.order_by('id').values_list('root_id', 'depth', 'path')), expected)
+
+    def test_post_thread_pages_depth_first(self):
+        contents = []
+        url = f'/api/comments/thread/?post={self.post.id}&limit=2'
+        while url:
+            response = self.client.get(url)
+            contents += [comment['content'] for comment in response.data['results']['data']]
+            url = response.data['next']
+        self.assertEqual(contents, ['first', 'reply', 'nested', 'late reply', 'second'])
+
+    def test_parent_lists_direct_replies(self):
+        data = self.client.get('/api/comments/thread/', {'parent': self.first.id}).data['results']['data']
+        self.assertEqual([(c['content'], c['depth'], c['replies_count']) for c in data], [('reply', 1, 1), ('late reply', 1, 0)])
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class CommentPreviewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cards', email='cards@example.com', password='x')
+        self.posts = [
+            Post.objects.create(user=self.user, title=f'Card {i}', content='a', status='approved') for i in range(3)
+        ]
+        for post in self.posts[:2]:
+            for i in range(4):
+                root = Comment.objects.create(user=self.user, post=post, content=f'{post.title} root {i}')
+                Comment.objects.create(user=self.user, post=post, parent=root, content='reply')
+        self.client.force_authenticate(user=self.user)
+
+    def test_first_root_comments_per_post(self):
+        with self.assertNumQueries(1):
+            previews = comment_previews([post.id for post in self.posts], self.user, size=2)
+        self.assertEqual(
+            [c['content'] for c in previews[self.posts[0].id]], ['Card 0 root 0', 'Card 0 root 1']
+        )
+        self.assertEqual(previews[self.posts[1].id][0]['replies_count'], 1)
+        self.assertEqual(previews[self.posts[2].id], [])
+
+    def test_list_exposes_comment_preview(self):
+        data = self.client.get('/api/posts/').data['results']
+        previews = {post['title']: [c['content'] for c in post['comment_preview']] for post in data}
+        self.assertEqual(previews['Card 1'], ['Card 1 root 0', 'Card 1 root 1', 'Card 1 root 2'])
+        self.assertEqual(previews['Card 2'], [])
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class NewsFeedSnapshotTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user('paging', 'paging@example.com', 'pass12345')
+        self.author = User.objects.create_user('prolific', 'prolific@example.com', 'pass12345')
+        Post.objects.bulk_create([
+            Post(user=self.author, title=f'Fresh {i}', content='a', status='approved') for i in range(25)
+        ])
+        self.client.force_authenticate(user=self.reader)
+
+    def feed(self, url='/api/posts/news_feed/', **params):
+        results = self.client.get(url, params).data
+        return results, [post['id'] for post in results['results']['data']]
+
+    def test_pages_of_a_snapshot_do_not_overlap(self):
+        first, first_ids = self.feed()
+        token = first['results']['snapshot']
+        self.assertIn(f'snapshot={token}', first['next'])
+
+        second, second_ids = self.feed(first['next'])
+        self.assertEqual(second['results']['snapshot'], token)
+        self.assertIn(f'snapshot={token}', second['previous'])
+        third, third_ids = self.feed(second['next'])
+        self.assertIsNone(third['next'])
+        self.assertEqual(len(set(first_ids + second_ids + third_ids)), 25)
+
+    def test_unknown_or_foreign_token_builds_a_new_feed(self):
+        token = self.feed()[0]['results']['snapshot']
+        self.assertNotEqual(self.feed(snapshot='expired')[0]['results']['snapshot'], 'expired')
+
+        self.client.force_authenticate(user=self.author)
+        self.assertNotEqual(self.feed(snapshot=token)[0]['results']['snapshot'], token)
+
+    def test_impressions_cover_the_page_served(self):
+        _, page_ids = self.feed(page=3)
+        self.assertEqual(len(page_ids), 5)
+        viewed = set(PostView.objects.filter(user=self.reader).values_list('post_id', flat=True))
+        self.assertEqual(viewed, set(page_ids))
+        self.assertTrue(all(post_id in SeenPosts.load(self.reader.id) for post_id in page_ids))
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class SeenPostsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('seer', 'seer@example.com', 'pass12345')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter()
+        for post_id in range(0, 3000, 3):
+            bloom.add(post_id)
+        self.assertTrue(all(post_id in bloom for post_id in range(0, 3000, 3)))
+        self.assertEqual(BloomFilter(data=bloom.to_bytes()).to_bytes(), bloom.to_bytes())
+
+    def test_round_trip_through_the_cache(self):
+        seen = SeenPosts.load(self.user.id)
+        seen.add_many([1, 2, 3])
+        seen.save()
+        with self.assertNumQueries(0):
+            loaded = SeenPosts.load(self.user.id)
+        self.assertTrue(all(post_id in loaded for post_id in (1, 2, 3)))
+
+    def test_generations_rotate(self):
+        with mock.patch('post.seen.time.time', return_value=100 * ROTATION_SECONDS):
+            seen = SeenPosts.load(self.user.id)
+            seen.add_many([7])
+            seen.save()
+        # One rotation later the old generation still counts; two later it's gone
+        with mock.patch('post.seen.time.time', return_value=101 * ROTATION_SECONDS):
+            rotated = SeenPosts.load(self.user.id)
+            self.assertIn(7, rotated)
+            self.assertNotIn(7, rotated.current)
+            rotated.save()
+        with mock.patch('post.seen.time.time', return_value=102 * ROTATION_SECONDS):
+            self.assertNotIn(7, SeenPosts.load(self.user.id))
+
+    def test_cold_cache_seeds_from_views_in_one_query(self):
+        posts = Post.objects.bulk_create([
+            Post(user=self.user, title=f'Seen {i}', content='a', status='approved') for i in range(3)
+        ])
+        PostView.objects.bulk_create([PostView(user=self.user, post=post) for post in posts])
+        with self.assertNumQueries(1):
+            seen = SeenPosts.load(self.user.id)
+        self.assertTrue(all(post.id in seen for post in posts))
+
+    def test_feed_skips_seen_fresh_posts(self):
+        author = User.objects.create_user('fresh', 'fresh@example.com', 'pass12345')
+        posts = Post.objects.bulk_create([
+            Post(user=author, title=f'Fresh {i}', content='a', status='approved') for i in range(6)
+        ])
+        seen = SeenPosts.load(self.user.id)
+        seen.add_many([post.id for post in posts[:4]])
+        seen.save()
+
+        self.client.force_authenticate(user=self.user)
+        data = self.client.get('/api/posts/news_feed/').data['results']['data']
+        self.assertEqual({post['id'] for post in data}, {post.id for post in posts[4:]})
+
+
+class ImpressionBufferTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer2', 'viewer2@example.com', 'pass12345')
+        self.posts = Post.objects.bulk_create([
+            Post(user=self.user, title=f'Shown {i}', content='a', status='approved') for i in range(5)
+        ])
+        self.post_ids = [post.id for post in self.posts]
+
+    def buffer(self, **options):
+        buffer = ImpressionBuffer(**options)
+        # The flusher thread would use its own connection; these tests flush by hand
+        buffer._ensure_started = mock.Mock()
+        return buffer
+
+    def test_flush_is_requested_at_the_size_threshold(self):
+        buffer = self.buffer(flush_size=5)
+        buffer.record(self.user.id, self.post_ids[:4])
+        self.assertFalse(buffer._wakeup.is_set())
+        buffer.record(self.user.id, self.post_ids[4:])
+        self.assertTrue(buffer._wakeup.is_set())
+
+    def test_flusher_runs_every_interval(self):
+        buffer = ImpressionBuffer(flush_interval=0.01)
+        flushed = threading.Event()
+        buffer.flush = mock.Mock(side_effect=flushed.set)
+        buffer.record(self.user.id, self.post_ids[:1])
+        # Well below flush_size, so only the interval can trigger it
+        self.assertTrue(flushed.wait(2))
+        buffer._stopping = True
+        buffer._thread.join(2)
+
+    def test_drain_writes_everything_once_per_pair(self):
+        buffer = self.buffer()
+        buffer.record(self.user.id, self.post_ids)
+        buffer.record(self.user.id, self.post_ids[:2])
+        with mock.patch.object(PostView.objects, 'bulk_create', wraps=PostView.objects.bulk_create) as bulk_create:
+            buffer.drain()
+        self.assertTrue(bulk_create.call_args.kwargs['ignore_conflicts'])
+        self.assertEqual(PostView.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(buffer.stats()['queue_depth'], 0)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_stats_report_depth_and_latency(self):
+        buffer = self.buffer()
+        buffer.record(self.user.id, self.post_ids[:3])
+        self.assertEqual(buffer.stats()['queue_depth'], 3)
+        buffer.flush()
+        stats = buffer.stats()
+        self.assertEqual((stats['queue_depth'], stats['flushed_total'], stats['flush_count']), (0, 3, 1))
+        self.assertGreater(stats['max_flush_ms'], 0)
+        self.assertEqual(stats['avg_flush_ms'], stats['last_flush_ms'])
+
+        self.user.role = 'admin'
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.assertIn('queue_depth', self.client.get('/api/posts/impression_stats/').data['data'])
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class TimelineTests(APITestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pass12345')
+        self.author = User.objects.create_user('writer', 'writer@example.com', 'pass12345')
+        self.community = Community.objects.create(name='club', title='Club', created_by=self.author)
+        self.client.force_authenticate(user=self.reader)
+
+    def timeline_ids(self, user=None):
+        return set(TimelineEntry.objects.filter(user=user or self.reader).values_list('post_id', flat=True))
+
+    def test_fan_out_reaches_followers_members_and_author(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        member = User.objects.create_user('member', 'member@example.com', 'pass12345')
+        CommunityMember.objects.create(user=member, community=self.community)
+
+        personal = Post.objects.create(user=self.author, title='Mine', content='a', status='approved')
+        in_club = Post.objects.create(user=self.author, title='Club', content='a', status='approved', community=self.community)
+        pending = Post.objects.create(user=self.author, title='Wait', content='a', status='pending')
+        for post in (personal, in_club, pending):
+            timeline.fan_out_post(post)
+
+        self.assertEqual(self.timeline_ids(), {personal.id})
+        self.assertEqual(self.timeline_ids(member), {in_club.id})
+        self.assertEqual(self.timeline_ids(self.author), {personal.id, in_club.id})
+
+    def test_follow_and_join_backfill_and_leaving_removes(self):
+        personal = Post.objects.create(user=self.author, title='Mine', content='a', status='approved')
+        in_club = Post.objects.create(user=self.author, title='Club', content='a', status='approved', community=self.community)
+
+        self.client.post('/api/follows/toggle_follow/', {'following_id': self.author.id})
+        membership = CommunityMember.objects.create(user=self.reader, community=self.community)
+        self.assertEqual(self.timeline_ids(), {personal.id, in_club.id})
+
+        self.client.post('/api/follows/toggle_follow/', {'following_id': self.author.id})
+        self.assertEqual(self.timeline_ids(), {in_club.id})
+        membership.delete()
+        self.assertEqual(self.timeline_ids(), set())
+
+    def test_read_timeline_merges_high_fanout_authors(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        older = Post.objects.create(user=self.author, title='Older', content='a', status='approved')
+        timeline.fan_out_post(older)
+        newer = Post.objects.create(user=self.reader, title='Newer', content='a', status='approved')
+        timeline.fan_out_post(newer)
+        self.assertEqual(timeline.read_timeline(self.reader), [newer.id, older.id])
+
+        # Past the limit the author isn't fanned out to, but still shows up on read
+        TimelineEntry.objects.filter(post=older).delete()
+        with mock.patch('post.timeline.FANOUT_FOLLOWER_LIMIT', 0):
+            self.assertEqual(timeline.read_timeline(self.reader), [newer.id, older.id])
+
+    def test_empty_timeline_is_built_once(self):
+        timeline.ensure_timeline(self.reader)
+        self.assertTrue(TimelineState.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.timeline_ids(), set())
+        with self.assertNumQueries(1):
+            timeline.ensure_timeline(self.reader)
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class TrendingRefreshTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('trendy', 'trendy@example.com', 'pass12345')
+        self.fan = User.objects.create_user('fan', 'fan@example.com', 'pass12345')
+        self.post = Post.objects.create(user=self.author, title='Hot', content='a', status='approved')
+        self.client.force_authenticate(user=self.fan)
+
+    def test_unlike_lowers_score_on_incremental_refresh(self):
+        like_id = self.client.post('/api/likes/', {'post': self.post.id}).data['data']['id']
+        Comment.objects.create(user=self.fan, post=self.post, content='hi')
+        Post.adjust_counter(self.post.id, 'comments_count', 1)
+        refresh_scores(full=True)
+        before = PostScore.objects.get(post=self.post)
+        self.assertEqual(before.engagement_score, 3)
+
+        self.client.delete(f'/api/likes/{like_id}/')
+        self.assertEqual(refresh_scores(), (1, 0))
+        after = PostScore.objects.get(post=self.post)
+        self.assertEqual(after.engagement_score, 2)
+        self.assertLess(after.hot_score, before.hot_score)
+
+        # Nothing moved since: nothing to rescore
+        self.assertEqual(refresh_scores(), (0, 0))
+
+    def test_deleted_post_leaves_trending(self):
+        refresh_scores(full=True)
+        self.post.delete()
+        self.assertFalse(PostScore.objects.exists())
+
+
+
+@override_settings(IMPRESSION_BUFFER_ENABLED=False)
+class BenchmarkCommandTests(TestCase):
+    def test_seed_then_benchmark(self):
+        out = StringIO()
+        call_command(
+            'seed_social_graph', users=12, avg_follows=3, communities=2, avg_memberships=1, posts=30,
+            likes=40, comments=15, shares=5, views=20, notifications=10, stdout=out,
+        )
+        self.assertIn('Seeding complete', out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='seed').count(), 12)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        first, second = f'{directory}/first.json', f'{directory}/second.json'
+        call_command('benchmark_feed', users=2, repeat=1, output=first, stdout=out, stderr=out)
+        call_command('benchmark_feed', users=2, repeat=1, output=second, compare=first, stdout=out, stderr=out)
+
+        with open(second) as f:
+            report = json.load(f)
+        self.assertEqual(report['dataset']['posts'], 30)
+        self.assertEqual(report['results']['news_feed']['requests'], 2)
+        self.assertIn('Compared with', out.getvalue())
+        self.assertNotIn('returned', out.getvalue())
+
+@override_settings(
+    IMPRESSION_BUFFER_ENABLED=False,
+    MODERATION_ASYNC=False,
+    IMAGE_DERIVATIVES_ASYNC=False,
+    MODERATION_IMAGE_CLASSIFIER='post.moderation.stub_image_classifier',
+)
+class ModerationQueueTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='x')
+        self.client.force_authenticate(user=self.author)
+        verdicts.clear_memory()
+
+    def create_post(self, **data):
+        data = {'title': 'Hello', 'post_type': 'text', 'content': 'A friendly post', **data}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['data']['status'], 'pending')
+        return Post.objects.get(pk=response.data['data']['id'])
+
+    def notification_types(self):
+        return list(Notification.objects.filter(recipient=self.author).values_list('notification_type', flat=True))
+
+    def test_clean_post_is_approved(self):
+        post = self.create_post()
+        self.assertEqual(post.status, 'approved')
+        self.assertEqual(post.moderation_job.verdict, 'approved')
+        self.assertEqual(self.notification_types(), ['post_approved'])
+        self.assertTrue(TimelineEntry.objects.filter(user=self.author, post=post).exists())
+
+    def test_profanity_is_rejected(self):
+        post = self.create_post(content='What the shit')
+        self.assertEqual(post.status, 'rejected')
+        self.assertEqual(post.moderation_job.reason, 'Text contains inappropriate language')
+        self.assertEqual(self.notification_types(), ['post_rejected'])
+
+    def test_flagged_image_is_rejected(self):
+        image = SimpleUploadedFile('holiday.png', b'nsfw, not really a png', content_type='image/png')
+        post = self.create_post(post_type='media', media_files=[image])
+        self.assertEqual(post.status, 'rejected')
+
+    def test_private_community_post_stays_pending(self):
+        community = Community.objects.create(name='private-club', title='Club', visibility='private', created_by=self.author)
+        CommunityMember.objects.create(user=self.author, community=community, role='admin', is_approved=True)
+        post = self.create_post(community=community.id)
+        self.assertEqual(post.status, 'pending')
+        self.assertEqual(post.moderation_job.verdict, 'approved')
+        self.assertEqual(self.notification_types(), [])
+
+    def test_failing_job_retries_with_backoff_then_waits_for_a_moderator(self):
+        down = mock.patch('post.moderation_queue.moderate_post', side_effect=RuntimeError('classifier down'))
+        with down, self.assertLogs('post.moderation_queue', 'ERROR'):
+            post = self.create_post()
+            job = post.moderation_job
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+
+            with self.settings(MODERATION_ASYNC=True), mock.patch.object(moderation_queue.pool, 'submit_later') as later:
+                process_job(job.id)
+                process_job(job.id)
+            later.assert_called_once_with(job.id, moderation_queue.RETRY_BACKOFF * 2)
+
+        job.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, post.status), ('failed', 3, 'pending'))
+
+        self.author.role = 'moderator'
+        self.author.save()
+        stats = self.client.get('/api/posts/moderation_stats/').data['data']
+        self.assertEqual(stats['queue']['failed'], 1)
+        self.assertEqual([failed['post_id'] for failed in stats['failed_jobs']], [post.id])
+
+        call_command('process_moderation_queue', '--retry-failed', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.status, 'approved')
+
+    def test_job_runs_once(self):
+        post = self.create_post()
+        self.assertIsNone(process_job(post.moderation_job.id))
+        self.assertEqual(post.moderation_job.attempts, 1)
+
+
+class VerdictCacheTests(TestCase):
+    def setUp(self):
+        verdicts.clear_memory()
+
+    def image(self, size, fmt='PNG', flip=False):
+        image = Image.new('L', (size, size), 0)
+        image.paste(255, (0, 0, size // 2, size) if flip else (size // 2, 0, size, size))
+        data = BytesIO()
+        image.save(data, fmt)
+        data.seek(0)
+        data.name = f'image.{fmt.lower()}'
+        return data
+
+    def test_repeat_image_skips_classifier(self):
+        classifier = mock.Mock(return_value=(True, None))
+        self.assertEqual(check_images(classifier, [self.image(64)]), (True, None))
+        self.assertEqual(check_images(classifier, [self.image(64)]), (True, None))
+        verdicts.clear_memory()
+        self.assertEqual(check_images(classifier, [self.image(64)]), (True, None))
+        self.assertEqual(classifier.call_count, 1)
+        verdicts.flush_hits()
+        self.assertEqual(ModerationVerdict.objects.get(key__startswith='image:').hits, 1)
+
+    def test_table_hits_are_written_in_batches(self):
+        cache = VerdictCache()
+        cache.set('text:hot', True)
+        for _ in range(3):
+            cache.clear_memory()
+            # A row used recently is only read
+            with self.assertNumQueries(1):
+                self.assertEqual(cache.get('text:hot'), (True, None))
+        self.assertEqual(ModerationVerdict.objects.get(key='text:hot').hits, 0)
+
+        ModerationVerdict.objects.filter(key='text:hot').update(last_used_at=timezone.now() - timedelta(hours=2))
+        cache.clear_memory()
+        with self.assertNumQueries(2):
+            cache.get('text:hot')
+        self.assertEqual(ModerationVerdict.objects.get(key='text:hot').hits, 4)
+
+    def test_lookalike_of_unsafe_image_is_blocked(self):
+        classifier = mock.Mock(return_value=(False, 'Image contains inappropriate content'))
+        check_images(classifier, [self.image(64)])
+        self.assertEqual(check_images(classifier, [self.image(40, 'JPEG')])[0], False)
+        self.assertEqual(classifier.call_count, 1)
+
+    def test_lookalike_of_safe_image_is_still_checked(self):
+        classifier = mock.Mock(return_value=(True, None))
+        check_images(classifier, [self.image(64)])
+        check_images(classifier, [self.image(40, 'JPEG')])
+        self.assertEqual(classifier.call_count, 2)
+
+    def test_unavailable_classifier_is_not_cached(self):
+        classifier = mock.Mock(side_effect=ModerationUnavailable('down'))
+        self.assertEqual(check_images(classifier, [self.image(64)]), (True, None))
+        self.assertFalse(ModerationVerdict.objects.exists())
+
+    def test_text_is_normalized(self):
+        self.assertEqual(text_key('Hello   World\n'), text_key('hello world'))
+        cached_text_check('What the shit')
+        self.assertEqual(cached_text_check('what  the SHIT'), (False, 'Text contains inappropriate language'))
+        self.assertGreaterEqual(verdicts.stats()['memory_hits'], 1)
+
+    def test_expired_and_least_recently_used_are_pruned(self):
+        cache = VerdictCache(max_entries=2)
+        for i in range(3):
+            cache.set(f'text:{i}', True)
+            ModerationVerdict.objects.filter(key=f'text:{i}').update(
+                last_used_at=timezone.now() - timedelta(minutes=10 - i)
+            )
+        cache.set('text:old', True)
+        ModerationVerdict.objects.filter(key='text:old').update(expires_at=timezone.now())
+        cache.clear_memory()
+
+        self.assertIsNone(cache.get('text:old'))
+        self.assertEqual(cache.prune(), 2)
+        self.assertEqual(set(ModerationVerdict.objects.values_list('key', flat=True)), {'text:1', 'text:2'})
+
+
+class ParallelImageCheckTests(TestCase):
+    """ check_images fans classifier calls out and stops at the first unsafe verdict """
+
+    def setUp(self):
+        verdicts.clear_memory()
+
+    def image(self, shade):
+        buffer = BytesIO()
+        Image.new('RGB', (32, 32), (shade, 255 - shade, shade // 2)).save(buffer, 'PNG')
+        return SimpleUploadedFile(f'photo{shade}.png', buffer.getvalue(), content_type='image/png')
+
+    def test_checks_run_concurrently(self):
+        def slow(media_file, timeout=None):
+            time.sleep(0.3)
+            return True, None
+
+        started = time.monotonic()
+        self.assertEqual(check_images(slow, [self.image(i * 20) for i in range(10)]), (True, None))
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(ModerationVerdict.objects.count(), 10)
+
+    def test_unsafe_verdict_cancels_the_rest(self):
+        calls = []
+
+        def classifier(media_file, timeout=None):
+            calls.append(media_file.name)
+            if media_file.name == 'photo0.png':
+                return False, 'Image contains inappropriate content'
+            time.sleep(0.2)
+            return True, None
+
+        images = [self.image(i) for i in range(40)]
+        self.assertEqual(check_images(classifier, images), (False, 'Image contains inappropriate content'))
+        self.assertLess(len(calls), len(images))
+
+    def test_deadline_allows_unfinished_checks(self):
+        release = threading.Event()
+
+        def hanging(media_file, timeout=None):
+            release.wait(2)
+            return False, 'late'
+
+        started = time.monotonic()
+        self.assertEqual(check_images(hanging, [self.image(1), self.image(2)], deadline=0.2), (True, None))
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        self.assertFalse(ModerationVerdict.objects.exists())
+
+    def test_cached_unsafe_skips_the_classifier(self):
+        unsafe = self.image(7)
+        check_images(mock.Mock(return_value=(False, 'bad')), [unsafe])
+        classifier = mock.Mock(return_value=(True, None))
+        self.assertEqual(check_images(classifier, [self.image(9), unsafe]), (False, 'bad'))
+        classifier.assert_not_called()
+
+
+class ClassifierBackendTests(TestCase):
+    """ The stand-in backends answer like the remote one """
+
+    def images(self, count):
+        return [SimpleUploadedFile(f'img{i}.png', f'image {i}'.encode()) for i in range(count)]
+
+    def test_fake_and_stub_server_agree(self):
+        fake = FakeClassifier(unsafe_rate=0.5)
+        local = LocalServerClassifier(latency=0, unsafe_rate=0.5)
+        self.addCleanup(local.server.stop)
+        verdicts_seen = [fake(image) for image in self.images(12)]
+        self.assertEqual([local(image, timeout=5) for image in self.images(12)], verdicts_seen)
+        self.assertIn((True, None), verdicts_seen)
+        self.assertIn((False, 'Image contains inappropriate content'), verdicts_seen)
+
+    def test_backend_without_classify_fails_on_instantiation(self):
+        class Incomplete(ImageClassifier):
+            pass
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_fake_gives_up_at_the_timeout(self):
+        with self.assertRaises(ModerationUnavailable):
+            FakeClassifier(latency=1)(self.images(1)[0], timeout=0.01)
+
+    def test_remote_errors_are_unavailable(self):
+        with self.assertRaises(ModerationUnavailable):
+            RemoteClassifier(url='http://127.0.0.1:9/')(self.images(1)[0], timeout=1)
+
+    @override_settings(
+        MODERATION_IMAGE_CLASSIFIER='post.classifiers.FakeClassifier',
+        MODERATION_IMAGE_CLASSIFIER_OPTIONS={'unsafe_rate': 1.0},
+    )
+    def test_backend_class_is_built_from_settings(self):
+        classifier = get_image_classifier()
+        self.assertIsInstance(classifier, FakeClassifier)
+        self.assertIs(get_image_classifier(), classifier)
+        self.assertFalse(classifier(self.images(1)[0])[0])
+
+
+class ProfanityMatcherTests(TestCase):
+    """ The compiled matcher must agree with better_profanity """
+
+    def test_known_cases(self):
+        matcher = get_matcher()
+        for text in ['what a b1tch', 'sh1t happens', 'this is bull shit ok', '2 girls 1 cup', 'F*CK that', 'shit']:
+            self.assertTrue(matcher.contains_profanity(text), text)
+        for text in ['', 'hello world', 'Scunthorpe glass class', 'what a b!tch']:
+            self.assertFalse(matcher.contains_profanity(text), text)
+
+    def test_custom_wordlist(self):
+        matcher = ProfanityMatcher(['darn', 'heck off'])
+        self.assertTrue(matcher.contains_profanity('oh d4rn it'))
+        self.assertTrue(matcher.contains_profanity('just h3ck off please'))
+        self.assertFalse(matcher.contains_profanity('just heck, off please'))
+        self.assertFalse(matcher.contains_profanity('heckle darning'))
+
+    def test_matches_better_profanity(self):
+        import random
+        from better_profanity import profanity
+        profanity.load_censor_words()
+
+        rng = random.Random(20)
+        words = sorted(profanity.CENSOR_WORDSET, key=str)
+        leet = {'a': '@4*', 'i': '1!l', 'o': '0@', 'e': '3*', 's': '$5', 't': '7', 'u': 'v'}
+        filler = ['the', 'post', 'glass', 'assassin', 'bass', 'hello', 'a', 'is']
+        samples = []
+        for _ in range(150):
+            parts = []
+            for _ in range(rng.randint(1, 6)):
+                word = str(rng.choice(words)) if rng.random() < 0.4 else rng.choice(filler)
+                word = ''.join(rng.choice(leet[c]) if c in leet and rng.random() < 0.3 else c for c in word)
+                parts.append(word)
+                parts.append(rng.choice([' ', ' ', ', ', '-', '  ', '.']))
+            samples.append(''.join(parts).rstrip(rng.choice(['', ' ', '.'])))
+
+        matcher = get_matcher()
+        for text in samples:
+            self.assertEqual(matcher.contains_profanity(text), profanity.contains_profanity(text), text)
@@ -0,0 +1,154 @@
+# post/timeline.py
+"""
+Fan-out-on-write home timelines.
+
+When a post is approved it is pushed into the TimelineEntry rows of the
+author's followers (personal posts) or the community's members (community
+posts). Reading a feed is then a single range scan on (user, score).
+
+A user's timeline is built from scratch on their first feed read (a
+TimelineState row records that it was), so one that is legitimately empty
+isn't rebuilt again on every request.
+
+Authors with more than TIMELINE_FANOUT_FOLLOWER_LIMIT followers are not
+fanned out to their followers; their posts are pulled at read time instead.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from .models import Post, Follow, TimelineEntry, TimelineState
+
+FANOUT_FOLLOWER_LIMIT = getattr(settings, 'TIMELINE_FANOUT_FOLLOWER_LIMIT', 5000)
+TIMELINE_WINDOW = timedelta(days=getattr(settings, 'TIMELINE_WINDOW_DAYS', 30))
+BATCH_SIZE = 1000
+
+
+def _score(post):
+    return post.created_at.timestamp()
+
+
+def _write(user_ids, posts):
+    """Bulk insert timeline rows for every (user, post) pair"""
+    entries = [
+        TimelineEntry(user_id=user_id, post_id=post.id, score=_score(post))
+        for user_id in user_ids
+        for post in posts
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def is_high_fanout(author_id):
+    return Follow.objects.filter(following_id=author_id).count() > FANOUT_FOLLOWER_LIMIT
+
+
+def fan_out_post(post):
+    """Push an approved post into its audience's timelines (and the author's own)"""
+    if post.status != 'approved':
+        return
+
+    from community.models import CommunityMember
+
+    if post.community_id:
+        recipients = CommunityMember.objects.filter(
+            community_id=post.community_id, is_approved=True
+        ).values_list('user_id', flat=True)
+    elif is_high_fanout(post.user_id):
+        # Followers pull this author's posts on read
+        recipients = []
+    else:
+        recipients = Follow.objects.filter(following_id=post.user_id).values_list('follower_id', flat=True)
+
+    user_ids = set(recipients)
+    user_ids.add(post.user_id)
+    _write(user_ids, [post])
+
+
+def _recent_posts(**filters):
+    return list(Post.objects.filter(
+        status='approved',
+        created_at__gte=timezone.now() - TIMELINE_WINDOW,
+        **filters
+    ).only('id', 'created_at'))
+
+
+def backfill_author(user_id, author_id):
+    """Copy an author's recent personal posts into a new follower's timeline"""
+    if is_high_fanout(author_id):
+        return
+    _write([user_id], _recent_posts(user_id=author_id, community__isnull=True))
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, post__user_id=author_id, post__community__isnull=True).delete()
+
+
+def backfill_community(user_id, community_id):
+    """Copy a community's recent posts into a new member's timeline"""
+    _write([user_id], _recent_posts(community_id=community_id))
+
+
+def remove_community(user_id, community_id):
+    TimelineEntry.objects.filter(user_id=user_id, post__community_id=community_id).delete()
+
+
+def read_timeline(user, limit=500):
+    """
+    Return post IDs for the user's home timeline, newest first.
+    Combines the materialized entries with a pull of high-fanout authors the user follows.
+    """
+    since = (timezone.now() - TIMELINE_WINDOW).timestamp()
+    rows = list(
+        TimelineEntry.objects.filter(user=user, score__gte=since)
+        .order_by('-score')
+        .values_list('post_id', 'score')[:limit]
+    )
+
+    following_ids = Follow.objects.filter(follower=user).values_list('following_id', flat=True)
+    high_fanout_ids = list(
+        Follow.objects.filter(following_id__in=following_ids)
+        .values('following_id')
+        .annotate(followers=Count('id'))
+        .filter(followers__gt=FANOUT_FOLLOWER_LIMIT)
+        .values_list('following_id', flat=True)
+    )
+    if high_fanout_ids:
+        pulled = Post.objects.filter(
+            user_id__in=high_fanout_ids,
+            community__isnull=True,
+            status='approved',
+            created_at__gte=timezone.now() - TIMELINE_WINDOW,
+        ).order_by('-created_at').values_list('id', 'created_at')[:limit]
+        rows.extend((post_id, created_at.timestamp()) for post_id, created_at in pulled)
+        rows.sort(key=lambda row: row[1], reverse=True)
+
+    seen = set()
+    post_ids = []
+    for post_id, _ in rows:
+        if post_id not in seen:
+            seen.add(post_id)
+            post_ids.append(post_id)
+    return post_ids[:limit]
+
+
+def rebuild_timeline(user):
+    """Build a user's timeline from scratch from their follows and memberships"""
+    from community.models import CommunityMember
+
+    TimelineEntry.objects.filter(user=user).delete()
+    following_ids = list(Follow.objects.filter(follower=user).values_list('following_id', flat=True))
+    community_ids = list(CommunityMember.objects.filter(
+        user=user, is_approved=True
+    ).values_list('community_id', flat=True))
+
+    posts = _recent_posts(user_id__in=following_ids, community__isnull=True)
+    posts += _recent_posts(community_id__in=community_ids)
+    posts += _recent_posts(user=user)
+    _write([user.id], posts)
+    TimelineState.objects.update_or_create(user=user, defaults={'built_at': timezone.now()})
+
+
+def ensure_timeline(user):
+    """Build the user's timeline the first time it's read; later fan-outs keep it current"""
+    if not TimelineState.objects.filter(user=user).exists():
+        rebuild_timeline(user)
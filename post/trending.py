@@ -0,0 +1,78 @@
+# post/trending.py
+"""
+Precomputed trending scores.
+
+Hot scores use the log-engagement + creation-time form, so a post's score
+only changes when its engagement changes. That lets refresh_trending update
+just the posts whose engagement moved (up or down) since the last run
+instead of rescoring everything. Deleted posts take their rows with them.
+"""
+import math
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Max, Q
+from django.utils import timezone
+from .models import Post, PostScore
+
+TRENDING_WINDOW = timedelta(days=getattr(settings, 'TRENDING_WINDOW_DAYS', 30))
+# Seconds of age that cost the same as a 10x drop in engagement
+DECAY_SECONDS = getattr(settings, 'TRENDING_DECAY_SECONDS', 45000)
+BATCH_SIZE = 500
+
+
+def hot_score(engagement, created_at):
+    return math.log10(max(engagement, 1)) + created_at.timestamp() / DECAY_SECONDS
+
+
+def refresh_scores(full=False, batch_size=BATCH_SIZE):
+    """
+    Upsert PostScore rows for recent approved posts.
+    Incremental by default: only posts created or edited since the previous run, or whose
+    engagement_score no longer matches their row (likes, comments and shares added or removed).
+    Returns (updated, pruned) row counts.
+    """
+    started = timezone.now()
+    window_start = started - TRENDING_WINDOW
+    last_run = None if full else PostScore.objects.aggregate(last=Max('updated_at'))['last']
+
+    posts = Post.objects.filter(status='approved', created_at__gte=window_start)
+    if last_run:
+        # Counters move through Post.adjust_counter, which leaves updated_at alone, so compare scores instead
+        posts = posts.filter(
+            Q(updated_at__gte=last_run) | Q(created_at__gte=last_run)
+            | ~Q(trending_score__engagement_score=F('engagement_score'))
+        )
+    rows = posts.order_by('id').values_list('id', 'user_id', 'community_id', 'created_at', 'engagement_score')
+
+    updated = 0
+    batch = []
+    for post_id, user_id, community_id, created_at, engagement in rows.iterator(chunk_size=batch_size):
+        batch.append(PostScore(
+            post_id=post_id,
+            user_id=user_id,
+            community_id=community_id,
+            created_at=created_at,
+            engagement_score=engagement,
+            hot_score=hot_score(engagement, created_at),
+            updated_at=started,
+        ))
+        if len(batch) >= batch_size:
+            updated += _upsert(batch)
+            batch = []
+    if batch:
+        updated += _upsert(batch)
+
+    pruned, _ = PostScore.objects.filter(
+        Q(created_at__lt=window_start) | ~Q(post__status='approved')
+    ).delete()
+    return updated, pruned
+
+
+def _upsert(batch):
+    PostScore.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['post'],
+        update_fields=['user', 'community', 'created_at', 'engagement_score', 'hot_score', 'updated_at'],
+    )
+    return len(batch)
@@ -0,0 +1,183 @@
+# post/verdict_cache.py
+"""
+Moderation verdict cache.
+
+Verdicts are keyed by content hash:
+
+- image:<sha256 of the bytes> for exact reposts
+- phash:<64-bit average hash> for resized/recompressed copies; only unsafe
+  verdicts are stored under it, so a hash collision can block a lookalike
+  but never wave an unsafe image through
+- text:<sha256 of the lowercased, whitespace-collapsed text>
+
+Lookups go to a per-process LRU (MODERATION_CACHE_MEMORY_SIZE entries, kept
+MODERATION_CACHE_MEMORY_TTL seconds) and then to the ModerationVerdict table,
+which survives restarts. Rows expire after MODERATION_CACHE_TTL seconds and the
+least recently used are pruned beyond MODERATION_CACHE_MAX_ENTRIES.
+
+Table hits are tallied in memory rather than written one UPDATE per lookup.
+A row's hits and last_used_at are written when a hit finds last_used_at older
+than MODERATION_CACHE_TOUCH_INTERVAL seconds, and for every row before a
+prune, so LRU pruning still sees them.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from io import BytesIO
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+from .models import ModerationVerdict
+
+# Stores between two prunes of the table
+PRUNE_EVERY = 500
+
+
+def text_key(text):
+    normalized = re.sub(r'\s+', ' ', text or '').strip().lower()
+    return 'text:' + hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def image_key(data):
+    return 'image:' + hashlib.sha256(data).hexdigest()
+
+
+def perceptual_key(data):
+    """8x8 average hash of the image, or None if the bytes aren't a readable image"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            pixels = list(image.convert('L').resize((8, 8)).getdata())
+    except Exception:
+        return None
+    mean = sum(pixels) / len(pixels)
+    bits = sum(1 << i for i, pixel in enumerate(pixels) if pixel > mean)
+    return f'phash:{bits:016x}'
+
+
+class VerdictCache:
+    """Memory LRU in front of the ModerationVerdict table, with hit/miss counters"""
+
+    def __init__(self, memory_size=10000, memory_ttl=600, ttl=30 * 24 * 3600, max_entries=100000, touch_interval=3600):
+        self.memory_size = memory_size
+        self.memory_ttl = memory_ttl
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = timedelta(seconds=touch_interval)
+        self._entries = OrderedDict()
+        self._pending_hits = Counter()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.pruned_total = 0
+
+    def get(self, key):
+        """(is_safe, reason) for a cached key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0], entry[1]
+
+        row = ModerationVerdict.objects.filter(key=key, expires_at__gt=timezone.now()).values_list(
+            'is_safe', 'reason', 'last_used_at'
+        ).first()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        verdict = (row[0], row[1] or None)
+        stale = row[2] <= timezone.now() - self.touch_interval
+        with self._lock:
+            self.db_hits += 1
+            self._remember(key, verdict)
+            self._pending_hits[key] += 1
+            hits = self._pending_hits.pop(key) if stale else 0
+        if hits:
+            ModerationVerdict.objects.filter(key=key).update(hits=F('hits') + hits, last_used_at=timezone.now())
+        return verdict
+
+    def set(self, key, is_safe, reason=None):
+        now = timezone.now()
+        # One upsert statement rather than update_or_create's read-then-write
+        # transaction, which SQLite refuses ("database is locked") when several
+        # moderation workers store at once
+        ModerationVerdict.objects.bulk_create([ModerationVerdict(
+            key=key,
+            is_safe=is_safe,
+            reason=(reason or '')[:255],
+            last_used_at=now,
+            expires_at=now + timedelta(seconds=self.ttl),
+        )], update_conflicts=True, unique_fields=['key'], update_fields=['is_safe', 'reason', 'last_used_at', 'expires_at'])
+        with self._lock:
+            self._remember(key, (is_safe, reason))
+            self.stores += 1
+            prune = self.stores % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def _remember(self, key, verdict):
+        self._entries[key] = (verdict[0], verdict[1], time.monotonic() + self.memory_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.memory_size:
+            self._entries.popitem(last=False)
+
+    def flush_hits(self):
+        """Write the hits tallied in memory to their rows"""
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, Counter()
+        by_count = {}
+        for key, count in pending.items():
+            by_count.setdefault(count, []).append(key)
+        now = timezone.now()
+        for count, keys in by_count.items():
+            ModerationVerdict.objects.filter(key__in=keys).update(hits=F('hits') + count, last_used_at=now)
+
+    def prune(self):
+        """Delete expired rows, then the least recently used beyond max_entries; returns rows deleted"""
+        self.flush_hits()
+        deleted, _ = ModerationVerdict.objects.filter(expires_at__lte=timezone.now()).delete()
+        cutoff = ModerationVerdict.objects.order_by('-last_used_at').values_list(
+            'last_used_at', flat=True
+        )[self.max_entries:self.max_entries + 1].first()
+        if cutoff is not None:
+            deleted += ModerationVerdict.objects.filter(last_used_at__lte=cutoff).delete()[0]
+        with self._lock:
+            self.pruned_total += deleted
+        return deleted
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'memory_entries': len(self._entries),
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'pruned_total': self.pruned_total,
+            }
+
+
+verdicts = VerdictCache(
+    memory_size=getattr(settings, 'MODERATION_CACHE_MEMORY_SIZE', 10000),
+    memory_ttl=getattr(settings, 'MODERATION_CACHE_MEMORY_TTL', 600),
+    ttl=getattr(settings, 'MODERATION_CACHE_TTL', 30 * 24 * 3600),
+    max_entries=getattr(settings, 'MODERATION_CACHE_MAX_ENTRIES', 100000),
+    touch_interval=getattr(settings, 'MODERATION_CACHE_TOUCH_INTERVAL', 3600),
+)
@@ -1,23 +1,35 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, MethodNotAllowed
 from django.db.models import Q, Count, Exists, OuterRef, Prefetch, Case, When, IntegerField, F
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 from .models import *
 from .serializers import *
-from django.core.files.storage import default_storage
 from rest_framework import parsers
 from community.models import *
 from community.serializers import *
 import random
-from .moderation import moderate_post
-from rest_framework import serializers 
+from . import moderation_queue
+from .verdict_cache import verdicts
+from . import timeline
+from .ranking import top_candidates
+from .comment_tree import comment_data, with_render_fields
+from .snapshots import save_snapshot, load_snapshot
+from .seen import SeenPosts
+from . import impressions
+from accounts.permissions import IsAdminOrModerator
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.pagination import CursorPagination
 
 User = get_user_model()
 
+# Max candidates taken from each trending discovery pool
+TRENDING_POOL_SIZE = 200
+
 
 """ Viewset for Posts """
 class PostViewSet(viewsets.ModelViewSet):
@@ -27,27 +39,29 @@ class PostViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser]
 
+    # Actions that return many posts render them as cards (no comment tree)
+    list_actions = ['list', 'news_feed', 'trending', 'community_posts', 'profile_posts', 'my_posts', 'user_posts']
+
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return PostListSerializer
+        return PostSerializer
+
     def get_queryset(self):
         user = self.request.user
         if self.action == 'list':
-            return Post.objects.filter(status='approved').order_by('-created_at')
+            return Post.objects.filter(
+                status='approved'
+            ).select_related('user__profile', 'community').order_by('-created_at')
         else:
             return Post.objects.filter(
                 Q(status='approved') | Q(user=user)
-            ).order_by('-created_at')
+            ).select_related('user__profile', 'community').order_by('-created_at')
 
     def perform_create(self, serializer):
-        """Create post with community validation and content moderation"""
+        """Create post with community validation; content moderation runs in the background"""
         community = serializer.validated_data.get('community')
         
-        # CONTENT MODERATION
-        title = serializer.validated_data.get('title', '')
-        content = serializer.validated_data.get('content', '')
-        media_files = serializer.validated_data.get('media_files', [])
-        
-        # Check content for inappropriate material
-        is_approved, rejection_reason = moderate_post(title, content, media_files)
-        
         # If posting to a community, verify membership
         if community:
             membership = CommunityMember.objects.filter(
@@ -58,28 +72,14 @@ class PostViewSet(viewsets.ModelViewSet):
             
             if not membership:
                 raise PermissionDenied("You must be a member to post in this community.")
-            
-            # Determine post status based on moderation and community settings
-            if not is_approved:
-                # Auto-reject if moderation fails
-                serializer.save(user=self.request.user, status='rejected')
-                raise serializers.ValidationError({
-                    "content_moderation": rejection_reason
-                })
-            elif community.visibility == 'private':
-                serializer.save(user=self.request.user, status='pending')
-            else:
-                serializer.save(user=self.request.user)
-        else:
-            # Personal post - apply moderation
-            if not is_approved:
-                serializer.save(user=self.request.user, status='rejected')
-                raise serializers.ValidationError({
-                    "content_moderation": rejection_reason
-                })
-            else:
-                serializer.save(user=self.request.user)
 
+        # CONTENT MODERATION
+        # Saved as pending; a moderation worker approves or rejects it and notifies the author.
+        # Private community posts that pass stay pending for the community's moderators.
+        with transaction.atomic():
+            serializer.save(user=self.request.user, status='pending')
+            approved_status = 'pending' if community and community.visibility == 'private' else 'approved'
+            moderation_queue.enqueue(serializer.instance, approved_status)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -88,48 +88,10 @@ class PostViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response({
             "success": True,
-            "message": "Post created successfully",
+            "message": "Post submitted for review",
             "data": serializer.data
         }, status=status.HTTP_201_CREATED, headers=headers)
 
-    def _calculate_post_score(self, post, user, time_decay_hours=24):
-        """
-        Calculate engagement score for a post with time decay and personalization
-        Score = (likes * 1 + comments * 2 + shares * 3) * time_decay * personalization_boost
-        """
-        # Base engagement
-        engagement = (
-            post.likes.count() * 1 + 
-            post.comments.count() * 2 + 
-            post.shares.count() * 3
-        )
-        
-        # Time decay: newer posts get higher scores
-        hours_old = (timezone.now() - post.created_at).total_seconds() / 3600
-        time_decay = max(0.1, 1 - (hours_old / time_decay_hours))
-        
-        # Personalization boost
-        personalization = 1.0
-        
-        # Boost if from followed user
-        if Follow.objects.filter(follower=user, following=post.user).exists():
-            personalization *= 2.0
-        
-        # Boost if from joined community
-        if post.community:
-            if CommunityMember.objects.filter(user=user, community=post.community, is_approved=True).exists():
-                personalization *= 1.5
-        
-        # Boost if user has interacted with similar content
-        if Like.objects.filter(user=user, post__user=post.user).exists():
-            personalization *= 1.3
-        
-        # Pinned posts get extra boost
-        if post.is_pinned:
-            personalization *= 3.0
-        
-        return engagement * time_decay * personalization
-
     @action(detail=False, methods=['get'])
     def news_feed(self, request):
         """
@@ -147,9 +109,67 @@ class PostViewSet(viewsets.ModelViewSet):
         - 30% Medium engagement posts (for discovery)
         - 20% Fresh/new posts (time-based)
         - 10% Random picks (serendipity)
+
+        The ranked list is stored as a snapshot; pass ?snapshot=<token> with
+        ?page=N to page through the same feed instead of drawing a new one.
         """
         user = request.user
-        
+        token = request.query_params.get('snapshot')
+        post_ids = load_snapshot(user.id, token)
+
+        seen = None
+        if post_ids is None:
+            seen = SeenPosts.load(user.id)
+            post_ids = self._build_news_feed(user, seen)
+            token = save_snapshot(user.id, post_ids)
+
+        if not post_ids:
+            return Response({
+                "success": True,
+                "message": "News feed retrieved successfully",
+                "data": []
+            })
+
+        # Paginate the ID list, then hydrate only this page's posts
+        page_ids = self.paginate_queryset(post_ids)
+
+        # Record impressions for the posts actually served, whichever page that is
+        shown_ids = page_ids if page_ids is not None else post_ids
+        seen = seen or SeenPosts.load(user.id)
+        seen.add_many(shown_ids)
+        seen.save()
+        impressions.record_impressions(user.id, shown_ids)
+
+        if page_ids is not None:
+            serializer = self.get_serializer(self._hydrate_posts(page_ids), many=True)
+            response = self.get_paginated_response({
+                "success": True,
+                "message": "News feed retrieved successfully",
+                "snapshot": token,
+                "data": serializer.data
+            })
+            for link in ('next', 'previous'):
+                if response.data.get(link):
+                    response.data[link] = replace_query_param(response.data[link], 'snapshot', token)
+            return response
+
+        serializer = self.get_serializer(self._hydrate_posts(post_ids), many=True)
+        return Response({
+            "success": True,
+            "message": "News feed retrieved successfully",
+            "snapshot": token,
+            "data": serializer.data
+        })
+
+    def _hydrate_posts(self, post_ids):
+        """Load posts for the given IDs, keeping their order and dropping any no longer approved"""
+        posts = Post.objects.filter(
+            id__in=post_ids, status='approved'
+        ).select_related('user__profile', 'community').in_bulk()
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    def _build_news_feed(self, user, seen):
+        """Rank, sample and shuffle the candidate pools into an ordered list of post IDs"""
         # Time windows
         recent_date = timezone.now() - timedelta(days=7)
         fresh_date = timezone.now() - timedelta(hours=24)
@@ -160,13 +180,6 @@ class PostViewSet(viewsets.ModelViewSet):
             user=user, is_approved=True
         ).values_list('community_id', flat=True))
         
-        # Get recently viewed posts
-        recent_views_date = timezone.now() - timedelta(hours=12)
-        recently_viewed_ids = list(PostView.objects.filter(
-            user=user,
-            viewed_at__gte=recent_views_date
-        ).values_list('post_id', flat=True))
-        
         # Get public community IDs separately to avoid LIMIT in subquery
         public_community_query = Community.objects.filter(
             visibility='public'
@@ -181,105 +194,69 @@ class PostViewSet(viewsets.ModelViewSet):
         base_posts = Post.objects.filter(
             status='approved',
             created_at__gte=timezone.now() - timedelta(days=30)
-        ).select_related('user', 'community').prefetch_related(
-            'likes', 'comments', 'shares'
         )
         
-        # POOL 1: Posts from followed users (personal posts)
-        followed_posts = base_posts.filter(
-            user_id__in=following_ids,
-            community__isnull=True
-        ) if following_ids else Post.objects.none()
-        
-        # POOL 2: Posts from joined communities
-        community_posts = base_posts.filter(
-            community_id__in=joined_community_ids
-        ) if joined_community_ids else Post.objects.none()
+        # POOL 1 + 2: Materialized home timeline (followed users + joined communities)
+        timeline.ensure_timeline(user)
+        timeline_ids = timeline.read_timeline(user)
+        timeline_posts = base_posts.filter(id__in=timeline_ids).exclude(
+            user=user, community__isnull=True
+        ) if timeline_ids else Post.objects.none()
         
+        # Discovery pools read the precomputed PostScore table (see refresh_trending),
+        # capped at the top-scored rows so they don't scale with total post volume
+        trending = PostScore.objects.filter(created_at__gte=recent_date).order_by('-hot_score')
+
         # POOL 3: High engagement posts from public communities (discovery)
-        discovery_community_posts = base_posts.filter(
+        discovery_community_ids = list(trending.filter(
             community_id__in=public_community_ids,
-            created_at__gte=recent_date
-        ).annotate(
-            engagement_score=Count('likes') + Count('comments') * 2 + Count('shares') * 3
-        ).filter(engagement_score__gte=5) if public_community_ids else Post.objects.none()
+            engagement_score__gte=5
+        ).values_list('post_id', flat=True)[:TRENDING_POOL_SIZE]) if public_community_ids else []
+        discovery_community_posts = base_posts.filter(id__in=discovery_community_ids)
         
         # POOL 4: Trending personal posts from non-followed users (discovery)
-        discovery_personal_posts = base_posts.filter(
+        discovery_personal = trending.filter(
             community__isnull=True,
-            created_at__gte=recent_date
+            engagement_score__gte=10
         ).exclude(
             user=user
-        ).annotate(
-            engagement_score=Count('likes') + Count('comments') * 2 + Count('shares') * 3
-        ).filter(engagement_score__gte=10)
+        )
         
         # Exclude followed users if we have any
         if following_ids:
-            discovery_personal_posts = discovery_personal_posts.exclude(user_id__in=following_ids)
+            discovery_personal = discovery_personal.exclude(user_id__in=following_ids)
+        discovery_personal_ids = list(discovery_personal.values_list('post_id', flat=True)[:TRENDING_POOL_SIZE])
+        discovery_personal_posts = base_posts.filter(id__in=discovery_personal_ids)
         
         # POOL 5: Fresh posts (last 24 hours) - for timeliness
         fresh_posts = base_posts.filter(
             created_at__gte=fresh_date
         )
         
-        # Exclude recently viewed if we have any
-        if recently_viewed_ids:
-            fresh_posts = fresh_posts.exclude(id__in=recently_viewed_ids)
-        
-        # Annotate all querysets with engagement score
-        followed_posts = followed_posts.annotate(
-            engagement_score=Count('likes') + Count('comments') * 2 + Count('shares') * 3
-        )
-        community_posts = community_posts.annotate(
-            engagement_score=Count('likes') + Count('comments') * 2 + Count('shares') * 3
-        )
-        fresh_posts = fresh_posts.annotate(
-            engagement_score=Count('likes') + Count('comments') * 2 + Count('shares') * 3
-        )
-        
-        # Combine all pools - execute queries and convert to lists
-        all_candidate_posts = (
-            list(followed_posts) + 
-            list(community_posts) + 
-            list(discovery_community_posts) + 
-            list(discovery_personal_posts) +
-            list(fresh_posts)
+        # Stream all pools as compact Candidate records, dedupe, score in chunks and
+        # keep only the top-scored candidates (sorted by score, highest first)
+        candidates = top_candidates(
+            [
+                timeline_posts,
+                discovery_community_posts,
+                discovery_personal_posts,
+                (fresh_posts, seen),  # skip recently seen fresh posts
+            ],
+            user
         )
         
-        # Remove duplicates by post ID
-        seen_ids = set()
-        unique_posts = []
-        for post in all_candidate_posts:
-            if post.id not in seen_ids:
-                seen_ids.add(post.id)
-                unique_posts.append(post)
-        
-        # Calculate personalized scores for all posts
-        scored_posts = []
-        for post in unique_posts:
-            score = self._calculate_post_score(post, user)
-            scored_posts.append((post, score))
-        
-        # Sort by score
-        scored_posts.sort(key=lambda x: x[1], reverse=True)
-        
         # DIVERSITY SAMPLING: Split into score tiers
-        total_posts = len(scored_posts)
+        total_posts = len(candidates)
         if total_posts == 0:
-            return Response({
-                "success": True,
-                "message": "News feed retrieved successfully",
-                "data": []
-            })
+            return []
         
         # Define tier boundaries
         high_tier_end = max(1, int(total_posts * 0.3))
         medium_tier_end = max(high_tier_end + 1, int(total_posts * 0.6))
         
-        high_engagement = scored_posts[:high_tier_end]
-        medium_engagement = scored_posts[high_tier_end:medium_tier_end]
-        low_engagement = scored_posts[medium_tier_end:]
+        high_engagement = candidates[:high_tier_end]
+        medium_engagement = candidates[high_tier_end:medium_tier_end]
+        low_engagement = candidates[medium_tier_end:]
         
         # Sample from each tier with randomization
         feed_size = 50  # Target feed size
@@ -291,61 +268,81 @@ class PostViewSet(viewsets.ModelViewSet):
         random_count = min(total_posts, int(feed_size * 0.1))
         
         # Random sampling within each tier (KEY FOR REFRESH VARIATION)
-        selected_posts = []
-        
-        # High engagement (but randomized selection)
-        if high_engagement:
-            selected_high = random.sample(high_engagement, min(high_count, len(high_engagement)))
-            selected_posts.extend([post for post, score in selected_high])
-        
-        # Medium engagement
-        if medium_engagement:
-            selected_medium = random.sample(medium_engagement, min(medium_count, len(medium_engagement)))
-            selected_posts.extend([post for post, score in selected_medium])
-        
-        # Fresh/Low engagement
-        if low_engagement:
-            selected_fresh = random.sample(low_engagement, min(fresh_count, len(low_engagement)))
-            selected_posts.extend([post for post, score in selected_fresh])
-        
-        # Random serendipity picks
-        remaining_posts = [p for p, s in scored_posts if p not in selected_posts]
-        if remaining_posts:
-            random_picks = random.sample(remaining_posts, min(random_count, len(remaining_posts)))
-            selected_posts.extend(random_picks)
+        # High engagement (but randomized selection), medium, then fresh/low engagement
+        selected = []
+        for tier, count in (
+            (high_engagement, high_count),
+            (medium_engagement, medium_count),
+            (low_engagement, fresh_count),
+        ):
+            if tier:
+                selected.extend(random.sample(tier, min(count, len(tier))))
+        
+        # Random serendipity picks (ID set keeps this linear)
+        selected_ids = {c.id for c in selected}
+        remaining = [c for c in candidates if c.id not in selected_ids]
+        if remaining:
+            selected.extend(random.sample(remaining, min(random_count, len(remaining))))
         
         # Shuffle the final selection for unpredictability
-        random.shuffle(selected_posts)
+        random.shuffle(selected)
         
         # Ensure pinned posts from joined communities appear at top
-        pinned_posts = [p for p in selected_posts if p.is_pinned and p.community_id in joined_community_ids]
-        non_pinned = [p for p in selected_posts if not (p.is_pinned and p.community_id in joined_community_ids)]
-        
-        final_feed = pinned_posts + non_pinned
-        
-        # Record views for the posts being shown
-        views_to_create = [
-            PostView(user=user, post=post)
-            for post in final_feed[:20]  # Record views for first 20 posts
-            if not PostView.objects.filter(user=user, post=post).exists()
-        ]
-        if views_to_create:
-            PostView.objects.bulk_create(views_to_create, ignore_conflicts=True)
-        
-        # Paginate
-        page = self.paginate_queryset(final_feed)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
+        joined = set(joined_community_ids)
+        pinned_ids = [c.id for c in selected if c.is_pinned and c.community_id in joined]
+        other_ids = [c.id for c in selected if not (c.is_pinned and c.community_id in joined)]
+        
+        return pinned_ids + other_ids
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrModerator])
+    def impression_stats(self, request):
+        """Queue depth and flush latency of this process's impression buffer"""
+        return Response({
+            "success": True,
+            "message": "Impression buffer stats retrieved successfully",
+            "data": impressions.buffer.stats()
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrModerator])
+    def moderation_stats(self, request):
+        """
+        Moderation queue depth by status, the oldest failed jobs (their posts are
+        still pending and need a moderator) and this process's verdict cache counters
+        """
+        queue = dict(ModerationJob.objects.values_list('status').annotate(count=Count('id')).order_by())
+        failed = ModerationJob.objects.filter(status='failed').order_by('created_at').values(
+            'id', 'post_id', 'attempts', 'created_at'
+        )[:50] if queue.get('failed') else []
+        return Response({
+            "success": True,
+            "message": "Moderation stats retrieved successfully",
+            "data": {
+                "queue": {status_name: queue.get(status_name, 0) for status_name, _ in ModerationJob.STATUS_CHOICES},
+                "failed_jobs": list(failed),
+                "verdict_cache": verdicts.stats(),
+            }
+        })
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Get trending posts (personal and public community) ranked by precomputed hot score"""
+        post_ids = PostScore.objects.filter(
+            Q(community__isnull=True) | Q(community__visibility='public')
+        ).order_by('-hot_score').values_list('post_id', flat=True)
+
+        page_ids = self.paginate_queryset(post_ids)
+        if page_ids is not None:
+            serializer = self.get_serializer(self._hydrate_posts(page_ids), many=True)
             return self.get_paginated_response({
                 "success": True,
-                "message": "News feed retrieved successfully",
+                "message": "Trending posts retrieved successfully",
                 "data": serializer.data
             })
-        
-        serializer = self.get_serializer(final_feed, many=True)
+
+        serializer = self.get_serializer(self._hydrate_posts(list(post_ids[:TRENDING_POOL_SIZE])), many=True)
         return Response({
             "success": True,
-            "message": "News feed retrieved successfully",
+            "message": "Trending posts retrieved successfully",
             "data": serializer.data
         })
 
@@ -385,9 +382,7 @@ class PostViewSet(viewsets.ModelViewSet):
         posts = Post.objects.filter(
             community=community,
             status='approved'
-        ).select_related('user', 'community').prefetch_related(
-            'likes', 'comments', 'shares'
-        ).order_by('-is_pinned', '-created_at')
+        ).select_related('user__profile', 'community').order_by('-is_pinned', '-created_at')
         
         page = self.paginate_queryset(posts)
         if page is not None:
@@ -471,7 +466,7 @@ class PostViewSet(viewsets.ModelViewSet):
         posts = Post.objects.filter(
             user=request.user, 
             status='approved'
-        ).select_related('community').order_by('-created_at')
+        ).select_related('user__profile', 'community').order_by('-created_at')
         
         page = self.paginate_queryset(posts)
         if page is not None:
@@ -491,7 +486,7 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_posts(self, request):
         """Get all posts created by current user (any status)"""
-        posts = Post.objects.filter(user=request.user).select_related('community').order_by('-created_at')
+        posts = Post.objects.filter(user=request.user).select_related('user__profile', 'community').order_by('-created_at')
         page = self.paginate_queryset(posts)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -521,9 +516,7 @@ class PostViewSet(viewsets.ModelViewSet):
         posts = Post.objects.filter(
             user_id=user_id,
             status='approved'
-        ).select_related('user', 'community').prefetch_related(
-            'likes', 'comments', 'shares'
-        ).order_by('-created_at')
+        ).select_related('user__profile', 'community').order_by('-created_at')
         
         page = self.paginate_queryset(posts)
         if page is not None:
@@ -550,7 +543,7 @@ class LikeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Filter likes based on query params or show user's likes"""
-        queryset = Like.objects.all()
+        queryset = Like.objects.select_related('user')
         post_id = self.request.query_params.get('post', None)
         if post_id:
             queryset = queryset.filter(post_id=post_id)
@@ -561,6 +554,11 @@ class LikeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            Post.adjust_counter(instance.post_id, 'likes_count', -1)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -611,6 +609,14 @@ class LikeViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
 
 
+class CommentThreadPagination(CursorPagination):
+    """Keyset pagination over Comment.path: depth-first thread order, constant cost per page"""
+    ordering = 'path'
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
 class CommentViewSet(viewsets.ModelViewSet):
     """ Viewset for Comment """
     queryset = Comment.objects.all()
@@ -633,6 +639,41 @@ class CommentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['get'], pagination_class=CommentThreadPagination)
+    def thread(self, request):
+        """
+        Comments in thread order, a page at a time.
+        ?post=<id> walks a post's whole discussion depth-first; ?parent=<id> lists one
+        comment's direct replies ("load more replies"). Follow the next link: its cursor
+        is a position in the path index, so deep pages cost the same as the first.
+        Comments come flat, with depth and replies_count instead of nested replies.
+        """
+        post_id = request.query_params.get('post')
+        parent_id = request.query_params.get('parent')
+
+        if parent_id:
+            comments = Comment.objects.filter(parent_id=parent_id)
+        elif post_id:
+            comments = Comment.objects.filter(post_id=post_id)
+        else:
+            return Response({
+                "success": False,
+                "error": "post or parent parameter is required"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        page = self.paginate_queryset(with_render_fields(comments))
+        return self.get_paginated_response({
+            "success": True,
+            "message": "Comments retrieved successfully",
+            "data": [comment_data(comment, request.user.id, [], comment.replies_total) for comment in page]
+        })
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            removed = instance.subtree_size()
+            instance.delete()
+            Post.adjust_counter(instance.post_id, 'comments_count', -removed)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -722,7 +763,7 @@ class ShareViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Filter shares based on query params or show user's shares"""
-        queryset = Share.objects.all()
+        queryset = Share.objects.select_related('user', 'post')
         post_id = self.request.query_params.get('post', None)
         if post_id:
             queryset = queryset.filter(post_id=post_id)
@@ -733,6 +774,11 @@ class ShareViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            Post.adjust_counter(instance.post_id, 'shares_count', -1)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -815,6 +861,10 @@ class FollowViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(follower=self.request.user)
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        timeline.remove_author(instance.follower_id, instance.following_id)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -897,6 +947,7 @@ class FollowViewSet(viewsets.ModelViewSet):
         if follow:
             # Unfollow
             follow.delete()
+            timeline.remove_author(request.user.id, following_user.id)
             return Response({
                 "success": True,
                 "message": "User unfollowed successfully",
@@ -908,6 +959,7 @@ class FollowViewSet(viewsets.ModelViewSet):
                 follower=request.user,
                 following=following_user
             )
+            timeline.backfill_author(request.user.id, following_user.id)
             # Create notification
             Notification.objects.create(
                 recipient=following_user,
@@ -970,7 +1022,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    http_method_names = ['get', 'patch', 'delete', 'head', 'options']
+    # POST is only for the mark_read/mark_all_read actions; notifications are created server-side
+    http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
     
     def get_queryset(self):
         """Get notifications for current user"""
@@ -978,6 +1031,9 @@ class NotificationViewSet(viewsets.ModelViewSet):
             recipient=self.request.user
         ).select_related('sender', 'post', 'comment').order_by('-created_at')
     
+    def create(self, request, *args, **kwargs):
+        raise MethodNotAllowed(request.method)
+
     def list(self, request, *args, **kwargs):
         """Get all notifications for current user"""
         queryset = self.get_queryset()